@@ -62,7 +62,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "reversion.middleware.RevisionMiddleware",
+    "core.middleware.RevisionMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -165,3 +165,35 @@ CORS_ALLOWED_ORIGINS = [
 ]
 CORS_ALLOWED_ORIGIN_REGEXES = [r"^https://\w+\.ngrok\.io$"]
 ADD_REVERSION_ADMIN = True
+
+# Validated VK launch params are cached per process to skip the sign check
+VK_AUTH_CACHE_SIZE = 10000
+VK_AUTH_CACHE_TTL = 60 * 5
+
+# Ticket codes indexed per event for the gate scan endpoint
+TICKET_INDEX_CACHE_SIZE = 32
+TICKET_INDEX_TTL = 60 * 10
+# seconds between reloads of an index for codes missing in it
+TICKET_INDEX_RELOAD_INTERVAL = 5
+
+# Background jobs (manage.py run_jobs): running jobs refresh their heartbeat
+# every JOB_HEARTBEAT seconds and are requeued once it is JOB_TIMEOUT old
+JOB_TIMEOUT = 60 * 30
+JOB_HEARTBEAT = 60
+REPORTS_SPREADSHEET_KEY = os.environ.get(
+    "REPORTS_SPREADSHEET_KEY", "1s_NVTmYxG5GloDaOOw4d7eh7P_zAcobTmIRseYHsg3g"
+)
+SHEETS_SERVICE_FILE = os.environ.get(
+    "SHEETS_SERVICE_FILE", "striking-ensign-271319-aa930e7c5b50.json"
+)
+
+# Server side VK API calls (core.utils.vk)
+VK_SERVICE_TOKEN = os.environ.get("VK_CLIENT_SERVICE")
+VK_API_URL = os.environ.get("VK_API_URL", "https://api.vk.com/method")
+VK_API_VERSION = "5.131"
+# requests per second allowed for the service token
+VK_API_RATE = 20
+
+# Cached notification permissions are re-checked after this many seconds
+NOTIFICATIONS_CHECK_INTERVAL = 60 * 60 * 24
+NOTIFICATIONS_CHECK_WORKERS = 4
@@ -169,6 +169,18 @@ class WarningAdmin(CompareVersionAdmin, admin.ModelAdmin):
     pass
 
 
+class BrigadeRatingCellAdmin(admin.ModelAdmin):
+    list_display = ["event", "brigade", "column", "value", "updated_at"]
+    list_filter = (("event", RelatedDropdownFilter), ("brigade", RelatedDropdownFilter))
+    readonly_fields = ("event", "brigade", "column", "value", "updated_at")
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["name", "state", "attempts", "created_at", "finished_at"]
+    list_filter = ("state", "name")
+    readonly_fields = ("started_at", "finished_at", "heartbeat_at", "worker", "error")
+
+
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Shtab, ShtabAdmin)
 admin.site.register(models.Area, AreaAdmin)
@@ -188,3 +200,5 @@ admin.site.register(models.Achievement, AchievementsAdmin)
 admin.site.register(models.Activity, ActivityAdmin)
 admin.site.register(models.Warning, WarningAdmin)
 admin.site.register(models.EventQuota, EventQuotaAdmin)
+admin.site.register(models.BrigadeRatingCell, BrigadeRatingCellAdmin)
+admin.site.register(models.Job, JobAdmin)
@@ -1,9 +1,13 @@
+import copy
 import os
 from base64 import b64encode
 from hashlib import sha256
 from hmac import HMAC
 from urllib.parse import parse_qsl, urlencode, urlparse
 
+from core.utils.cache import LRUCache
+from core.utils.notifications import remember_permission
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import exceptions
@@ -12,6 +16,25 @@ from rest_framework.authentication import BaseAuthentication, get_authorization_
 # Защищённый ключ из настроек вашего приложения
 client_secret = os.environ.get("VK_CLIENT_SECRET")
 
+# Raw "Authorization" headers that already passed the sign check, mapped to
+# the (user id, vk_user_id) pair they authenticate, and the users by id.
+# Users are looked up by id so invalidating one is a single delete, and
+# every request gets its own copy. The caches are per process, so entries
+# invalidated in another worker still live until their TTL expires.
+verified_headers = LRUCache(
+    max_size=getattr(settings, "VK_AUTH_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "VK_AUTH_CACHE_TTL", 300),
+)
+cached_users = LRUCache(
+    max_size=getattr(settings, "VK_AUTH_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "VK_AUTH_CACHE_TTL", 300),
+)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Forget the cached user, e.g. after deactivation"""
+    cached_users.delete(user_id)
+
 
 def is_valid(query: dict, secret: str) -> bool:
     """
@@ -62,6 +85,15 @@ class VKAuthentication(BaseAuthentication):
             msg = _("Invalid token header")
             raise exceptions.AuthenticationFailed(msg)
 
+        credentials = verified_headers.get(auth[0])
+        if credentials is not None:
+            user_id, vk_user_id = credentials
+            user = self.get_user(user_id)
+            if user is not None:
+                return (user, vk_user_id)
+            # the user was deleted, authenticate the header again
+            verified_headers.delete(auth[0])
+
         try:
             query_params = dict(
                 parse_qsl(urlparse(auth[0].decode()).path, keep_blank_values=True)
@@ -73,7 +105,23 @@ class VKAuthentication(BaseAuthentication):
             )
             raise exceptions.AuthenticationFailed(msg)
 
-        return self.authenticate_credentials(query_params)
+        user, vk_user_id = self.authenticate_credentials(query_params)
+        verified_headers.set(auth[0], (user.pk, vk_user_id))
+        cached_users.set(user.pk, copy.copy(user))
+        return (user, vk_user_id)
+
+    def get_user(self, user_id: int):
+        """Copy of the cached user, None if it doesn't exist anymore"""
+        user = cached_users.get(user_id)
+        if user is None:
+            try:
+                user = get_user_model().objects.get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            cached_users.set(user_id, user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return copy.copy(user)
 
     def authenticate_credentials(self, query_params):
         is_sign_validated = is_valid(query=query_params, secret=client_secret)
@@ -86,6 +134,10 @@ class VKAuthentication(BaseAuthentication):
         except get_user_model().DoesNotExist:
             user = get_user_model().objects.create(vk_id=query_params.get("vk_user_id"))
 
+        notifications = query_params.get("vk_are_notifications_enabled")
+        if notifications in ("0", "1"):
+            remember_permission(user, notifications == "1")
+
         return (user, query_params.get("vk_user_id"))
 
     def authenticate_header(self, request):
@@ -0,0 +1,207 @@
+"""
+Database-backed background jobs.
+
+Handlers are registered with the `job` decorator and enqueued with
+`handler.delay(**kwargs)`, which only inserts a `Job` row, so a job
+enqueued inside a request is committed (or rolled back) together with it.
+`manage.py run_jobs` claims queued jobs and runs them with bounded
+concurrency. A job is retried with exponential backoff until it succeeds
+or runs out of attempts. A running job refreshes its heartbeat every
+JOB_HEARTBEAT seconds. A job left running by a crashed worker goes back to
+the queue once its heartbeat is older than JOB_TIMEOUT, so every job runs
+at least once, and long jobs of live workers don't run twice.
+"""
+import datetime
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+from core.models import Job
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+registry: Dict[str, Callable[..., Any]] = {}
+
+# delay before the first retry, doubled on each next attempt
+RETRY_DELAY = datetime.timedelta(seconds=30)
+
+
+def job(name: str, max_attempts: int = 3):
+    """Register a function as a background job handler"""
+
+    def decorator(func):
+        registry[name] = func
+
+        def delay(**kwargs) -> Job:
+            return enqueue(name, kwargs, max_attempts=max_attempts)
+
+        func.delay = delay
+        return func
+
+    return decorator
+
+
+def enqueue(
+    name: str,
+    kwargs: Optional[dict] = None,
+    max_attempts: int = 3,
+    run_after: Optional[datetime.datetime] = None,
+    unique: bool = False,
+) -> Job:
+    """
+    Queue a job. With `unique` an already queued job with the same arguments
+    is returned instead of adding a duplicate.
+    """
+    kwargs = kwargs or {}
+    if unique:
+        queued = Job.objects.filter(
+            name=name, kwargs=kwargs, state=Job.JobState.QUEUED
+        ).first()
+        if queued is not None:
+            return queued
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def claim(worker: str) -> Optional[Job]:
+    """Atomically take the oldest due job, None if the queue is empty"""
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(state=Job.JobState.QUEUED, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        # only one worker can move the job out of the queued state
+        claimed = Job.objects.filter(id=job_id, state=Job.JobState.QUEUED).update(
+            state=Job.JobState.RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+            finished_at=None,
+            worker=worker,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+class Heartbeat:
+    """Refresh the heartbeat of a running job from a thread until stopped"""
+
+    def __init__(self, job: Job, interval: float) -> None:
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self) -> None:
+        try:
+            while not self.stopped.wait(self.interval):
+                Job.objects.filter(
+                    id=self.job.id, state=Job.JobState.RUNNING, worker=self.job.worker
+                ).update(heartbeat_at=timezone.now())
+        except Exception:
+            logger.exception("Heartbeat of job %s failed", self.job)
+        finally:
+            connection.close()
+
+    def __enter__(self) -> "Heartbeat":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+def run(job: Job) -> None:
+    handler = registry.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name}")
+        with Heartbeat(job, settings.JOB_HEARTBEAT):
+            handler(**job.kwargs)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.state = Job.JobState.QUEUED
+            job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+        else:
+            job.state = Job.JobState.FAILED
+    else:
+        job.state = Job.JobState.DONE
+        job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["state", "error", "run_after", "finished_at"])
+
+
+def requeue_stale() -> int:
+    """Return jobs of crashed workers to the queue or fail them"""
+    now = timezone.now()
+    stale = Job.objects.filter(
+        state=Job.JobState.RUNNING,
+        heartbeat_at__lt=now - datetime.timedelta(seconds=settings.JOB_TIMEOUT),
+    )
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        state=Job.JobState.FAILED, finished_at=now, error="Worker timed out"
+    )
+    return stale.update(state=Job.JobState.QUEUED, run_after=now)
+
+
+def run_in_thread(job: Job) -> None:
+    try:
+        run(job)
+    finally:
+        # every thread has its own connection, don't leave it open
+        connection.close()
+
+
+def work(
+    worker: str, concurrency: int = 1, once: bool = False, poll_interval: float = 1
+) -> int:
+    """
+    Run queued jobs until interrupted, or until the queue is drained when
+    `once` is set. Returns the number of jobs run.
+    """
+    processed = 0
+    if concurrency <= 1:
+        while True:
+            close_old_connections()
+            requeue_stale()
+            job = claim(worker)
+            if job is not None:
+                run(job)
+                processed += 1
+            elif once:
+                return processed
+            else:
+                time.sleep(poll_interval)
+
+    running: Set[Any] = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            running = {future for future in running if not future.done()}
+            close_old_connections()
+            requeue_stale()
+
+            job = claim(worker) if len(running) < concurrency else None
+            if job is not None:
+                running.add(executor.submit(run_in_thread, job))
+                processed += 1
+            elif once and not running:
+                return processed
+            else:
+                time.sleep(poll_interval)
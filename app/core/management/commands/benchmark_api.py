@@ -0,0 +1,310 @@
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.utils.factories import seed
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import URLResolver, get_resolver
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APIClient
+
+PREFIX = "api/"
+
+# path converters of django routes and named groups of router regexes
+ROUTE_KWARG = re.compile(r"<(?:\w+:)?(\w+)>")
+REGEX_KWARG = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+# timings of fast endpoints are noisy, allow this much on top of the tolerance
+TIME_SLACK_MS = 5
+
+# query counts per endpoint don't depend on the machine, so they are
+# committed and checked by the test suite
+QUERY_BASELINE = os.path.join(settings.BASE_DIR, "benchmark_queries.json")
+
+# paginated lists are requested with both page sizes, a list doing more
+# queries for the larger page has a query per row
+PAGE_SIZES = (5, 20)
+
+
+def url_template(pattern) -> str:
+    """Turn a route or router regex into `event/{event_pk}/` form"""
+    route = str(pattern.pattern)
+    route = REGEX_KWARG.sub(r"{\1}", route)
+    route = ROUTE_KWARG.sub(r"{\1}", route)
+    return route.lstrip("^").rstrip("$")
+
+
+def get_endpoints(patterns=None, prefix="") -> Iterator[Tuple[str, type]]:
+    """Yield url templates and view classes of every GET endpoint of the API"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        template = prefix + url_template(pattern)
+        if isinstance(pattern, URLResolver):
+            yield from get_endpoints(pattern.url_patterns, template)
+            continue
+        view = getattr(pattern.callback, "cls", None)
+        if not template.startswith(PREFIX) or view is None:
+            continue
+        actions = getattr(pattern.callback, "actions", None)
+        if (actions is None and hasattr(view, "get")) or "get" in (actions or {}):
+            yield template, view
+
+
+def get_view_model(view):
+    if getattr(view, "queryset", None) is not None:
+        return view.queryset.model
+    serializer = getattr(view, "serializer_class", None)
+    return serializer.Meta.model if serializer else None
+
+
+def get_url(template: str, view, samples: Dict[str, int]) -> Optional[str]:
+    """Fill url kwargs with seeded objects, None if there is no fitting one"""
+    kwargs = {}
+    for name in re.findall(r"{(\w+)}", template):
+        if name != "pk":
+            kwargs[name] = samples.get(name[: -len("_pk")])
+    if "{pk}" in template:
+        model = get_view_model(view)
+        queryset = model.objects.order_by("id") if model else None
+        if queryset is not None:
+            field_names = {field.name for field in model._meta.get_fields()}
+            for name, value in kwargs.items():
+                parent = name[: -len("_pk")]
+                if parent in field_names:
+                    queryset = queryset.filter(**{parent: value})
+        kwargs["pk"] = (
+            queryset.values_list("id", flat=True).first()
+            if queryset is not None
+            else None
+        )
+    if any(value is None for value in kwargs.values()):
+        return None
+    return "/" + template.format(**kwargs)
+
+
+def measure(client: APIClient, url: str, repeat: int) -> Dict[str, int]:
+    response = client.get(url)  # warm up caches shared by all requests
+    if response.streaming:
+        b"".join(response.streaming_content)
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            # streamed responses run their queries while being consumed
+            content = (
+                b"".join(response.streaming_content)
+                if response.streaming
+                else response.content
+            )
+            timings.append(time.perf_counter() - started)
+    return {
+        "status": response.status_code,
+        "queries": len(queries),
+        "time_ms": round(min(timings) * 1000, 1),
+        "bytes": len(content),
+    }
+
+
+def is_paginated(view) -> bool:
+    pagination_class = getattr(view, "pagination_class", None)
+    return pagination_class is not None and issubclass(
+        pagination_class, LimitOffsetPagination
+    )
+
+
+def page_queries(client: APIClient, url: str) -> List[int]:
+    """Queries of the list at every page size of PAGE_SIZES"""
+    separator = "&" if "?" in url else "?"
+    return [
+        measure(client, f"{url}{separator}limit={limit}", 1)["queries"]
+        for limit in PAGE_SIZES
+    ]
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float
+) -> List[str]:
+    """Describe every endpoint that got worse than its baseline"""
+    regressions = []
+    for endpoint, result in results.items():
+        if result["status"] != 200:
+            regressions.append(f"{endpoint}: HTTP {result['status']}")
+        expected = baseline.get(endpoint)
+        if expected is None:
+            continue
+        if result["queries"] > expected["queries"]:
+            regressions.append(
+                f"{endpoint}: {result['queries']} queries, "
+                f"baseline {expected['queries']}"
+            )
+        if result["time_ms"] > expected["time_ms"] * (1 + tolerance) + TIME_SLACK_MS:
+            regressions.append(
+                f"{endpoint}: {result['time_ms']}ms, baseline {expected['time_ms']}ms"
+            )
+        if result["bytes"] > expected["bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{endpoint}: {result['bytes']} bytes, baseline {expected['bytes']}"
+            )
+    return regressions
+
+
+def compare_queries(results: Dict[str, Dict], baseline: Dict[str, int]) -> List[str]:
+    """
+    Describe every endpoint doing more queries than the committed baseline,
+    or more queries for a larger page
+    """
+    regressions = []
+    for endpoint, result in results.items():
+        counts = result.get("page_queries")
+        if counts and counts[-1] > counts[0]:
+            regressions.append(
+                f"{endpoint}: {counts[-1]} queries at limit={PAGE_SIZES[-1]}, "
+                f"{counts[0]} at limit={PAGE_SIZES[0]}"
+            )
+        expected = baseline.get(endpoint)
+        if expected is None:
+            regressions.append(
+                f"{endpoint}: not in the query baseline, "
+                "run benchmark_api --update-query-baseline"
+            )
+        elif result["queries"] > expected:
+            regressions.append(
+                f"{endpoint}: {result['queries']} queries, baseline {expected}"
+            )
+    return regressions
+
+
+class Command(BaseCommand):
+    """
+    Seed a test database with a realistic dataset, request every GET
+    endpoint of the API and compare query count, time and response size
+    with the stored baseline
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help="Dataset size multiplier, 1 is about 20000 boecs",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmark_baseline.json"),
+            help="Path of the baseline file",
+        )
+        parser.add_argument(
+            "--update-baseline",
+            action="store_true",
+            help="Store the results as the new baseline",
+        )
+        parser.add_argument(
+            "--update-query-baseline",
+            action="store_true",
+            help=f"Store the query counts in {os.path.basename(QUERY_BASELINE)}",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed relative growth of time and response size",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Requests per endpoint, the fastest one is reported",
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as file:
+                stored = json.load(file)
+            if stored["scale"] != options["scale"]:
+                raise CommandError(
+                    f"Baseline was recorded with --scale {stored['scale']}"
+                )
+            baseline = stored["endpoints"]
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = self.run_benchmark(options["scale"], options["repeat"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        for endpoint, result in results.items():
+            expected = baseline.get(endpoint, {})
+            self.stdout.write(
+                f"{endpoint:<60} {result['status']:>4} "
+                f"{result['queries']:>4}q ({expected.get('queries', '-')}) "
+                f"{result['time_ms']:>8}ms ({expected.get('time_ms', '-')}) "
+                f"{result['bytes']:>8}b ({expected.get('bytes', '-')})"
+            )
+
+        if options["update_query_baseline"]:
+            with open(QUERY_BASELINE, "w") as file:
+                json.dump(
+                    {
+                        "scale": options["scale"],
+                        "queries": {
+                            endpoint: result["queries"]
+                            for endpoint, result in results.items()
+                        },
+                    },
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+                file.write("\n")
+            self.stdout.write(self.style.SUCCESS("Query baseline updated"))
+
+        if options["update_baseline"]:
+            with open(options["baseline"], "w") as file:
+                json.dump(
+                    {"scale": options["scale"], "endpoints": results},
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+            self.stdout.write(self.style.SUCCESS("Baseline updated"))
+            return
+
+        regressions = compare(results, baseline, options["tolerance"])
+        if regressions:
+            raise CommandError("Regressions found:\n" + "\n".join(regressions))
+        if not baseline:
+            self.stdout.write("No baseline stored, run with --update-baseline")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def run_benchmark(self, scale: float, repeat: int) -> Dict[str, Dict]:
+        samples = seed(scale)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.get(id=samples["user"]))
+
+        results = {}
+        for template, view in get_endpoints():
+            url = get_url(template, view, samples)
+            if url is None:
+                self.stdout.write(f"{template}: no seeded object, skipped")
+                continue
+            results[template] = measure(client, url, repeat)
+            if is_paginated(view):
+                results[template]["page_queries"] = page_queries(client, url)
+        return results
@@ -1,42 +1,133 @@
-import json
+from typing import Dict, List, Optional, Tuple
 
 from core.models import Boec, Brigade, Season
-from django.core.management.base import BaseCommand
+from core.utils.loaders import Rejects, batches, iter_json_array, unique_map
+from core.utils.search import index_boecs
+from core.utils.seasons import refresh_boec_seasons
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+# last, first and middle name
+NameKey = Tuple[str, str, str]
+
+
+def parse_name(name) -> Optional[NameKey]:
+    fio = name.split() if isinstance(name, str) else []
+    if len(fio) < 2:
+        return None
+    return (fio[0], fio[1], fio[2] if len(fio) > 2 else "")
 
 
 class Command(BaseCommand):
-    """Parse JSON file and load data to DB"""
+    """Load seasons of boecs from a JSON array of {name, brigade, year} rows"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default="data.json", help="JSON file to load")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows written per batch"
+        )
+        parser.add_argument(
+            "--rejects",
+            default="seasons_rejects.jsonl",
+            help="Write rows that weren't loaded here, with the reason",
+        )
 
     def handle(self, *args, **options):
-        with open("data.json", encoding="utf-8") as json_file:
-            data = json.load(json_file)
-        for item in data:
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        self.brigades, self.ambiguous_brigades = unique_map(
+            Brigade.objects.values_list("title", "id")
+        )
+        self.boecs_created = self.seasons_created = 0
+
+        with open(options["file"], encoding="utf-8") as json_file, Rejects(
+            options["rejects"]
+        ) as rejects:
+            for batch in batches(iter_json_array(json_file), options["batch_size"]):
+                self.load_batch(batch, rejects)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{self.boecs_created} boecs and {self.seasons_created} seasons "
+                f"created, {rejects.count} rows rejected"
+            )
+        )
+
+    @transaction.atomic
+    def load_batch(self, rows: List[dict], rejects: Rejects) -> None:
+        parsed = []
+        for row in rows:
+            name = parse_name(row.get("name")) if isinstance(row, dict) else None
+            if name is None:
+                rejects.add(row, "invalid name")
+                continue
+            brigade = row.get("brigade")
+            if isinstance(brigade, str) and brigade in self.ambiguous_brigades:
+                rejects.add(row, "ambiguous brigade")
+                continue
+            brigade_id = (
+                self.brigades.get(brigade) if isinstance(brigade, str) else None
+            )
+            if brigade_id is None:
+                rejects.add(row, "unknown brigade")
+                continue
             try:
-                fio = item["name"].split()
-
-                middleName = fio[2] if len(fio) > 2 else ""
-                lastName = fio[0] if len(fio) > 1 else ""
-                firstName = fio[1] if len(fio) > 1 else ""
-
-                boecList = Boec.objects.filter(
-                    firstName=firstName, lastName=lastName, middleName=middleName
-                )
-
-                if not boecList.exists():
-                    Boec.objects.create(
-                        firstName=firstName, lastName=lastName, middleName=middleName
-                    )
-
-                brigade = Brigade.objects.get(title=item["brigade"])
-                boec = Boec.objects.get(
-                    firstName=firstName, lastName=lastName, middleName=middleName
-                )
-
-                if not Season.objects.filter(
-                    boec=boec, brigade=brigade, year=int(item["year"])
-                ).exists():
-                    Season.objects.create(
-                        boec=boec, brigade=brigade, year=int(item["year"])
-                    )
-            except Exception:
-                print(item)
+                year = int(row.get("year"))
+            except (TypeError, ValueError):
+                rejects.add(row, "invalid year")
+                continue
+            parsed.append((row, name, brigade_id, year))
+
+        boecs, ambiguous_boecs = self.resolve_boecs({name for _, name, _, _ in parsed})
+
+        seasons = set()
+        for row, name, brigade_id, year in parsed:
+            if name in ambiguous_boecs:
+                rejects.add(row, "ambiguous boec")
+                continue
+            seasons.add((boecs[name], brigade_id, year))
+
+        existing = set(
+            Season.objects.filter(
+                boec_id__in={boec_id for boec_id, _, _ in seasons}
+            ).values_list("boec_id", "brigade_id", "year")
+        )
+        new_seasons = [
+            Season(boec_id=boec_id, brigade_id=brigade_id, year=year)
+            for boec_id, brigade_id, year in seasons - existing
+        ]
+        Season.objects.bulk_create(new_seasons)
+        # bulk_create skips the signals keeping the latest season of boecs
+        refresh_boec_seasons({season.boec_id for season in new_seasons})
+        self.seasons_created += len(new_seasons)
+
+    def resolve_boecs(self, names: set) -> Tuple[Dict[NameKey, int], set]:
+        """Ids of boecs by name, creating the missing ones"""
+
+        def lookup() -> Tuple[Dict[NameKey, int], set]:
+            last_names = {last_name for last_name, _, _ in names}
+            rows = Boec.objects.filter(last_name__in=last_names).values_list(
+                "last_name", "first_name", "middle_name", "id"
+            )
+            return unique_map(
+                ((last, first, middle), id)
+                for last, first, middle, id in rows
+                if (last, first, middle) in names
+            )
+
+        boecs, ambiguous = lookup()
+        missing = names - set(boecs) - ambiguous
+        if not missing:
+            return boecs, ambiguous
+
+        Boec.objects.bulk_create(
+            Boec(last_name=last_name, first_name=first_name, middle_name=middle_name)
+            for last_name, first_name, middle_name in missing
+        )
+        self.boecs_created += len(missing)
+        # bulk_create doesn't return ids on MySQL
+        boecs, ambiguous = lookup()
+        # nor sends the signals indexing names for the search
+        index_boecs(boecs[name] for name in missing if name in boecs)
+        return boecs, ambiguous
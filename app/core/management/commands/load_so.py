@@ -1,44 +1,118 @@
-import json
+from typing import Dict, Tuple
 
 from core.models import Area, Brigade, Shtab
+from core.utils.loaders import Rejects, iter_json_array, unique_map
 from django.core.management.base import BaseCommand
-from django.utils.encoding import force_str
-from django.utils.translation import ugettext_lazy as _
+from django.db import transaction
+
+SHORT_TITLE_LENGTH = Area._meta.get_field("short_title").max_length
 
 
 class Command(BaseCommand):
-    """Parse JSON file and load data to DB"""
+    """Load brigades from a JSON array of {name, direction, shtab} rows"""
 
-    area = None
-    shtab = None
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default="brigades.json", help="JSON file to load")
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Move existing brigades to the area and shtab given in the file",
+        )
+        parser.add_argument(
+            "--rejects",
+            default="so_rejects.jsonl",
+            help="Write rows that weren't loaded here, with the reason",
+        )
 
-    def findArea(self, area):
-        areaList = Area.objects.filter(shortTitle=area)
-        if not areaList.exists():
-            Area.objects.create(title=force_str(""), shortTitle=_(area))
+    @transaction.atomic
+    def handle(self, *args, **options):
+        with open(
+            options["file"], encoding="utf-8", errors="surrogateescape"
+        ) as json_file, Rejects(options["rejects"]) as rejects:
+            brigades = self.parse(iter_json_array(json_file), rejects)
 
-        self.area = Area.objects.get(shortTitle=_(area))
+            areas = self.create_missing(
+                Area,
+                "short_title",
+                {area for area, _ in brigades.values()},
+                lambda short_title: Area(title="", short_title=short_title),
+            )
+            shtabs = self.create_missing(
+                Shtab,
+                "title",
+                {shtab for _, shtab in brigades.values()},
+                lambda title: Shtab(title=title),
+            )
 
-    def findShtab(self, shtab):
-        shtabList = Shtab.objects.filter(title=shtab)
+            existing, ambiguous = unique_map(
+                (title, (id, area_id, shtab_id))
+                for title, id, area_id, shtab_id in Brigade.objects.values_list(
+                    "title", "id", "area_id", "shtab_id"
+                )
+            )
 
-        if not shtabList.exists():
-            Shtab.objects.create(title=shtab)
+            new_brigades = []
+            moved_brigades = []
+            for title, (area, shtab) in brigades.items():
+                area_id, shtab_id = areas[area], shtabs[shtab]
+                if title in ambiguous:
+                    if options["update"]:
+                        rejects.add({"name": title}, "ambiguous brigade")
+                    continue
+                if title not in existing:
+                    new_brigades.append(
+                        Brigade(title=title, area_id=area_id, shtab_id=shtab_id)
+                    )
+                    continue
+                id, current_area_id, current_shtab_id = existing[title]
+                if options["update"] and (current_area_id, current_shtab_id) != (
+                    area_id,
+                    shtab_id,
+                ):
+                    moved_brigades.append(
+                        Brigade(id=id, area_id=area_id, shtab_id=shtab_id)
+                    )
 
-        self.shtab = Shtab.objects.get(title=shtab)
+            Brigade.objects.bulk_create(new_brigades)
+            Brigade.objects.bulk_update(moved_brigades, ["area", "shtab"])
 
-    def handle(self, *args, **options):
-        with open(
-            "brigades.json", encoding="utf-8", errors="surrogateescape"
-        ) as json_file:
-            data = json.load(json_file)
-        for item in data:
-            self.findArea(item["direction"])
-            self.findShtab(item["shtab"])
-
-            brigade = Brigade.objects.filter(title=item["name"])
-
-            if not brigade.exists():
-                Brigade.objects.create(
-                    title=item["name"], area=self.area, shtab=self.shtab
-                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(new_brigades)} brigades created, {len(moved_brigades)} "
+                f"moved, {rejects.count} rows rejected"
+            )
+        )
+
+    def parse(self, rows, rejects: Rejects) -> Dict[str, Tuple[str, str]]:
+        """Area short title and shtab title by brigade title"""
+        brigades: Dict[str, Tuple[str, str]] = {}
+        for row in rows:
+            fields = (
+                [row.get("name"), row.get("direction"), row.get("shtab")]
+                if isinstance(row, dict)
+                else []
+            )
+            if len(fields) != 3 or not all(
+                isinstance(field, str) and field.strip() for field in fields
+            ):
+                rejects.add(row, "missing name, direction or shtab")
+                continue
+            title, area, shtab = (field.strip() for field in fields)
+            if len(area) > SHORT_TITLE_LENGTH:
+                rejects.add(row, "direction is too long")
+                continue
+            if brigades.get(title, (area, shtab)) != (area, shtab):
+                rejects.add(row, "brigade listed with another direction or shtab")
+                continue
+            brigades[title] = (area, shtab)
+        return brigades
+
+    def create_missing(self, model, field: str, keys: set, build) -> Dict[str, int]:
+        """Ids of the objects by the natural key, creating the missing ones"""
+        ids = dict(model.objects.values_list(field, "id"))
+        missing = keys - set(ids)
+        if missing:
+            model.objects.bulk_create(build(key) for key in sorted(missing))
+            # bulk_create doesn't return ids on MySQL
+            ids = dict(model.objects.values_list(field, "id"))
+        return ids
@@ -0,0 +1,28 @@
+from core.utils.seasons import refresh_boec_seasons, stale_boecs
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Recompute the latest season cached on every boec"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report boecs whose cache differs from their seasons",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            stale = list(stale_boecs())
+            for boec_id, year, brigade_id in stale[:20]:
+                self.stdout.write(
+                    f"boec {boec_id}: expected year {year}, brigade {brigade_id}"
+                )
+            if stale:
+                raise CommandError(f"{len(stale)} boecs have a stale last season")
+            self.stdout.write(self.style.SUCCESS("Last seasons are up to date"))
+            return
+
+        updated = refresh_boec_seasons()
+        self.stdout.write(self.style.SUCCESS(f"Last season of {updated} boecs rebuilt"))
@@ -0,0 +1,18 @@
+from core.utils.search import index_boecs
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Rebuild the name tokens boecs are searched by"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=2000, help="Tokens written per batch"
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        written = index_boecs(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{written} search tokens written"))
@@ -1,18 +1,87 @@
-from core.models import Boec, User
-from django.core.management.base import BaseCommand
-from so.views import refresh_boec_achievements
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from core.models import Achievement, Boec
+from core.utils.achievements import award_achievements, collect_progress
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def refresh_range(id_range: Tuple[int, int], chunk_size: int) -> int:
+    """Award achievements to boecs with ids in [start, end] chunk by chunk"""
+    start, end = id_range
+    achievements = list(Achievement.objects.all())
+    awarded = 0
+
+    boec_ids = list(
+        Boec.objects.filter(id__gte=start, id__lte=end)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    for offset in range(0, len(boec_ids), chunk_size):
+        progress = collect_progress(boec_ids[offset : offset + chunk_size])
+        awarded += award_achievements(progress, achievements)
+    return awarded
+
+
+def refresh_range_in_worker(id_range: Tuple[int, int], chunk_size: int) -> int:
+    try:
+        return refresh_range(id_range, chunk_size)
+    finally:
+        connections.close_all()
+
+
+def split_ids(boec_ids: List[int], parts: int) -> List[Tuple[int, int]]:
+    """Split sorted ids into at most `parts` contiguous ranges of similar size"""
+    size = -(-len(boec_ids) // parts)
+    return [
+        (boec_ids[offset], boec_ids[min(offset + size, len(boec_ids)) - 1])
+        for offset in range(0, len(boec_ids), size)
+    ]
 
 
 class Command(BaseCommand):
-    """Parse JSON file and load data to DB"""
+    """Recompute achievements of every boec and award the missing ones"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of boecs whose progress is aggregated per query batch",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Split boecs by id ranges between this many processes",
+        )
 
     def handle(self, *args, **options):
-        users = User.objects.all()
+        chunk_size = options["chunk_size"]
+        workers = options["workers"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+
+        boec_ids = list(Boec.objects.order_by("id").values_list("id", flat=True))
+        if not boec_ids:
+            return
 
-        for user in users:
-            try:
-                boec = Boec.objects.get(vk_id=user.vk_id)
-            except (Boec.DoesNotExist):
-                continue
+        if workers > 1:
+            ranges = split_ids(boec_ids, workers)
+            # forked workers must not share the parent's connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                awarded = sum(
+                    executor.map(
+                        refresh_range_in_worker, ranges, [chunk_size] * len(ranges)
+                    )
+                )
+        else:
+            awarded = refresh_range((boec_ids[0], boec_ids[-1]), chunk_size)
 
-            refresh_boec_achievements(boec=boec)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{awarded} achievements awarded to {len(boec_ids)} boecs"
+            )
+        )
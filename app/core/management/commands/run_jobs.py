@@ -0,0 +1,40 @@
+import os
+import socket
+
+from core import tasks
+from core.jobs import work
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Run queued background jobs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=2,
+            help="Maximum number of jobs running at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        tasks.schedule_periodic_jobs()
+        processed = work(
+            worker,
+            concurrency=options["concurrency"],
+            once=options["once"],
+            poll_interval=options["poll_interval"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{processed} jobs processed"))
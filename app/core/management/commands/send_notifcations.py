@@ -1,13 +1,18 @@
+import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
-import requests
-from core.models import User
-from django.core.management.base import BaseCommand
+from core.models import Boec, User
+from core.utils.vk import VKClient, VKError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
 
 logger = logging.getLogger(__name__)
 
-secret = os.environ.get("VK_CLIENT_SERVICE")
+# notifications.sendMessage accepts at most 100 users per call
+CHUNK_SIZE = 100
 
 
 def chunks(lst, n):
@@ -16,29 +21,133 @@ def chunks(lst, n):
         yield lst[i : i + n]
 
 
+def audience(
+    brigade_id: Optional[int] = None,
+    shtab_id: Optional[int] = None,
+    event_id: Optional[int] = None,
+):
+    """Active app users matching every given filter"""
+    users = User.objects.filter(vk_id__isnull=False, is_active=True)
+    filters = Q()
+    if brigade_id is not None:
+        filters &= Q(seasons__brigade_id=brigade_id)
+    if shtab_id is not None:
+        filters &= Q(seasons__brigade__shtab_id=shtab_id)
+    if event_id is not None:
+        filters &= Q(
+            event_participation__event_id=event_id,
+            event_participation__is_approved=True,
+        )
+    if filters:
+        users = users.filter(
+            vk_id__in=Boec.objects.filter(filters, vk_id__isnull=False).values("vk_id")
+        )
+    return users
+
+
+class Progress:
+    """Notified users, saved to a file to resume interrupted runs"""
+
+    def __init__(self, path: Optional[str], message: str) -> None:
+        self.path = path
+        self.message = message
+        self.sent: set = set()
+
+        if path and os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            if state["message"] != message:
+                raise CommandError(f"{path} belongs to a different message")
+            self.sent = set(state["sent"])
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with open(f"{self.path}.tmp", "w") as file:
+            json.dump({"message": self.message, "sent": sorted(self.sent)}, file)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
 class Command(BaseCommand):
-    """Parse JSON file and load data to DB"""
+    """
+    Send a VK notification to the app users allowing them, as cached by
+    the refresh_notification_permissions job
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--message", required=True, help="Notification text")
+        parser.add_argument("--brigade", type=int, help="Only boecs of the brigade")
+        parser.add_argument("--shtab", type=int, help="Only boecs of the shtab")
+        parser.add_argument(
+            "--event", type=int, help="Only approved participants of the event"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the recipients without sending anything",
+        )
+        parser.add_argument(
+            "--state-file", help="Save progress here and resume from it when rerun"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Concurrent VK requests, still limited by VK_API_RATE",
+        )
 
     def handle(self, *args, **options):
-        users = User.objects.filter(vk_id__isnull=False)
-
-        vk_ids = []
-
-        for user in users:
-            check_url = f"https://api.vk.com/method/apps.isNotificationsAllowed?user_id={user.vk_id}&access_token={secret}&v=5.131"
-            r = requests.get(check_url)
-            if r.status_code == 200:
-                data = r.json()
-                if data["response"].get("is_allowed", False) == True:
-                    vk_ids.append(str(user.vk_id))
-
-        if len(vk_ids) > 0:
-            list = chunks(vk_ids, 100)
-            for ids_chunk in list:
-                ids = ",".join(ids_chunk)
-
-                message = "Поздравляем, Ваш коллектив прошел отбор на фестиваль!"
-                url = f"https://api.vk.com/method/notifications.sendMessage?message={message}&user_ids={ids}=&access_token={secret}&v=5.131"
-                r = requests.get(url)
-                data = r.json()
-                logger.error(data)
+        users = audience(options["brigade"], options["shtab"], options["event"])
+        progress = Progress(
+            None if options["dry_run"] else options["state_file"], options["message"]
+        )
+
+        recipients = [
+            vk_id
+            for vk_id in users.filter(notifications_allowed=True)
+            .order_by("vk_id")
+            .values_list("vk_id", flat=True)
+            .distinct()
+            if vk_id not in progress.sent
+        ]
+        unknown = users.filter(notifications_allowed__isnull=True).count()
+        self.stdout.write(
+            f"{len(recipients)} users to notify, "
+            f"{unknown} users not checked yet"
+            f"{' (dry run)' if options['dry_run'] else ''}"
+        )
+        if options["dry_run"]:
+            return
+
+        client = VKClient(pool_size=options["workers"])
+        ids_chunks = list(chunks(recipients, CHUNK_SIZE))
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for ids_chunk, sent in zip(
+                ids_chunks,
+                executor.map(
+                    self.send,
+                    [client] * len(ids_chunks),
+                    ids_chunks,
+                    [options["message"]] * len(ids_chunks),
+                ),
+            ):
+                if not sent:
+                    failed += len(ids_chunk)
+                    continue
+                progress.sent.update(ids_chunk)
+                progress.save()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(recipients) - failed} users notified")
+        )
+        if failed:
+            raise CommandError(f"{failed} users weren't notified, rerun to retry")
+
+    def send(self, client: VKClient, ids_chunk: List[int], message: str) -> bool:
+        try:
+            client.send_notification(ids_chunk, message)
+        except VKError as e:
+            logger.error("Sending to %s failed: %s", ids_chunk, e)
+            return False
+        return True
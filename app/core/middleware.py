@@ -0,0 +1,30 @@
+from reversion.middleware import RevisionMiddleware as BaseRevisionMiddleware
+from reversion.views import create_revision
+
+
+class RevisionMiddleware(BaseRevisionMiddleware):
+    """
+    Wrap unsafe requests in a revision unless the view class sets
+    `creates_revision = False`, e.g. for hot endpoints writing raw queries.
+    The revision wraps the view in `process_view`, once Django has resolved it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def request_creates_revision(self, request):
+        if not super().request_creates_revision(request):
+            return False
+        view = getattr(request.resolver_match.func, "cls", None)
+        return getattr(view, "creates_revision", True)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.request_creates_revision(request):
+            return None
+        view = create_revision(
+            manage_manually=self.manage_manually,
+            using=self.using,
+            atomic=self.atomic,
+            request_creates_revision=lambda request: True,
+        )(view_func)
+        return view(request, *view_args, **view_kwargs)
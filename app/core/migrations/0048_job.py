@@ -0,0 +1,79 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0047_auto_20210815_1314"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, verbose_name="Задача")),
+                (
+                    "kwargs",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Параметры"
+                    ),
+                ),
+                (
+                    "state",
+                    models.IntegerField(
+                        choices=[
+                            (0, "В очереди"),
+                            (1, "Выполняется"),
+                            (2, "Выполнена"),
+                            (3, "Ошибка"),
+                        ],
+                        default=0,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0, verbose_name="Попыток")),
+                (
+                    "max_attempts",
+                    models.IntegerField(default=3, verbose_name="Максимум попыток"),
+                ),
+                (
+                    "run_after",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Не раньше"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "worker",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Обработчик"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+            ],
+            options={
+                "verbose_name": "Фоновая задача",
+                "verbose_name_plural": "Фоновые задачи",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["state", "run_after"], name="core_job_state_fe7b60_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0048_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticketscan",
+            name="scanned_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Время сканирования"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0049_ticketscan_scanned_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="notifications_allowed",
+            field=models.BooleanField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="notifications_checked_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0050_user_notifications_allowed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BrigadeRatingCell",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("column", models.IntegerField(verbose_name="Колонка")),
+                ("value", models.IntegerField(verbose_name="Баллы")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "brigade",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_cells",
+                        to="core.brigade",
+                        verbose_name="Отряд",
+                    ),
+                ),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_cells",
+                        to="core.event",
+                        verbose_name="Мероприятие",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Рейтинг отряда",
+                "verbose_name_plural": "Рейтинг отрядов",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="brigaderatingcell",
+            constraint=models.UniqueConstraint(
+                fields=("event", "brigade", "column"), name="unique_rating_cell"
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_last_season(apps, schema_editor):
+    Boec = apps.get_model("core", "Boec")
+    Season = apps.get_model("core", "Season")
+    seasons = Season.objects.filter(boec=models.OuterRef("id")).order_by("-year", "-id")
+    Boec.objects.update(
+        last_season_year=models.Subquery(seasons.values("year")[:1]),
+        last_season_brigade=models.Subquery(seasons.values("brigade_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0051_brigaderatingcell"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="boec",
+            name="last_season_brigade",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="core.brigade",
+                verbose_name="Отряд последнего выезда",
+            ),
+        ),
+        migrations.AddField(
+            model_name="boec",
+            name="last_season_year",
+            field=models.IntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Год последнего выезда",
+            ),
+        ),
+        migrations.RunPython(fill_last_season, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:39
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# the normal form of core.utils.search as of this migration, copied so later
+# changes of the module don't change what the migration does
+TOKEN_LENGTH = 64
+
+NAME_FIELDS = ("last_name", "first_name", "middle_name")
+
+CYRILLIC = dict(
+    zip(
+        "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+        [
+            *("a", "b", "v", "g", "d", "e", "e", "zh", "z", "i", "i", "k", "l"),
+            *("m", "n", "o", "p", "r", "s", "t", "u", "f", "kh", "ts", "ch", "sh"),
+            *("shch", "", "y", "", "e", "iu", "ia"),
+        ],
+    )
+)
+
+VARIANTS = [
+    (re.compile("[jy]"), "i"),
+    (re.compile("ii+"), "i"),
+    (re.compile("(?<![zkcs])h"), "kh"),
+]
+
+SEPARATOR = re.compile("[^a-z0-9]+")
+
+
+def normalize(text):
+    latin = "".join(CYRILLIC.get(char, char) for char in text.lower())
+    latin = unicodedata.normalize("NFKD", latin).encode("ascii", "ignore").decode()
+    words = []
+    for word in SEPARATOR.split(latin):
+        for pattern, replacement in VARIANTS:
+            word = pattern.sub(replacement, word)
+        if word:
+            words.append(word[:TOKEN_LENGTH])
+    return words
+
+
+def name_tokens(*name):
+    tokens = []
+    for field, value in enumerate(name):
+        for token in normalize(value or ""):
+            if (field, token) not in tokens:
+                tokens.append((field, token))
+    return tokens
+
+
+def fill_search_tokens(apps, schema_editor):
+    Boec = apps.get_model("core", "Boec")
+    BoecSearchToken = apps.get_model("core", "BoecSearchToken")
+    batch = []
+    for boec_id, *name in Boec.objects.values_list("id", *NAME_FIELDS).iterator():
+        batch += [
+            BoecSearchToken(boec_id=boec_id, field=field, token=token)
+            for field, token in name_tokens(*name)
+        ]
+        if len(batch) >= 2000:
+            BoecSearchToken.objects.bulk_create(batch)
+            batch = []
+    BoecSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0052_boec_last_season"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoecSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "field",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Фамилия"), (1, "Имя"), (2, "Отчество")]
+                    ),
+                ),
+                ("token", models.CharField(max_length=64)),
+                (
+                    "boec",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="core.boec",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Слово поиска бойца",
+                "verbose_name_plural": "Слова поиска бойцов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="boecsearchtoken",
+            index=models.Index(
+                fields=["token", "boec"], name="core_boecse_token_590942_idx"
+            ),
+        ),
+        migrations.RunPython(fill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0053_boec_search_token"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="activity",
+            index=models.Index(
+                fields=["boec", "seen", "created_at", "id"],
+                name="core_activi_boec_id_ba1180_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="boec",
+            index=models.Index(
+                fields=["last_name", "id"], name="core_boec_last_na_07b42b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="season",
+            index=models.Index(
+                fields=["year", "id"], name="core_season_year_b4469f_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:57
+
+from django.db import migrations, models
+
+
+def fill_heartbeat(apps, schema_editor):
+    Job = apps.get_model("core", "Job")
+    Job.objects.update(heartbeat_at=models.F("started_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0054_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
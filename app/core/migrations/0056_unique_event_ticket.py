@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:59
+
+from django.db import migrations, models
+
+
+def merge_duplicate_tickets(apps, schema_editor):
+    """Keep the first ticket of a boec per event, with the scans of the rest"""
+    Ticket = apps.get_model("core", "Ticket")
+    TicketScan = apps.get_model("core", "TicketScan")
+    duplicates = (
+        Ticket.objects.values("event_id", "boec_id")
+        .annotate(count=models.Count("id"), first_id=models.Min("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        extra = Ticket.objects.filter(
+            event_id=duplicate["event_id"], boec_id=duplicate["boec_id"]
+        ).exclude(id=duplicate["first_id"])
+        TicketScan.objects.filter(ticket__in=extra).update(
+            ticket_id=duplicate["first_id"]
+        )
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0055_job_heartbeat"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tickets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="ticket",
+            constraint=models.UniqueConstraint(
+                fields=("event", "boec"), name="unique_event_ticket"
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-17 05:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def mark_final_scans(apps, schema_editor):
+    """Keep the earliest final scan of every ticket final and mark it"""
+    TicketScan = apps.get_model("core", "TicketScan")
+    finals = (
+        TicketScan.objects.filter(is_final=True)
+        .annotate(time=Coalesce("scanned_at", "created_at"))
+        .order_by("ticket_id", "time", "id")
+        .values_list("id", "ticket_id")
+    )
+    kept, demoted = {}, []
+    for scan_id, ticket_id in finals.iterator():
+        if ticket_id in kept:
+            demoted.append(scan_id)
+        else:
+            kept[ticket_id] = scan_id
+    for offset in range(0, len(demoted), 1000):
+        TicketScan.objects.filter(id__in=demoted[offset : offset + 1000]).update(
+            is_final=False
+        )
+    kept_ids = list(kept.values())
+    for offset in range(0, len(kept_ids), 1000):
+        TicketScan.objects.filter(id__in=kept_ids[offset : offset + 1000]).update(
+            final_ticket_id=models.F("ticket_id")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0056_unique_event_ticket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticketscan",
+            name="final_ticket",
+            field=models.OneToOneField(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="core.ticket",
+            ),
+        ),
+        migrations.RunPython(mark_final_scans, migrations.RunPython.noop),
+    ]
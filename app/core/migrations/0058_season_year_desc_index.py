@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-17 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0057_ticketscan_final_ticket"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="season",
+            name="core_season_year_b4469f_idx",
+        ),
+        migrations.AddIndex(
+            model_name="season",
+            index=models.Index(
+                fields=["-year", "id"], name="core_season_year_73a64a_idx"
+            ),
+        ),
+    ]
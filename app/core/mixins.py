@@ -0,0 +1,20 @@
+from core.serializers import query_plan
+
+
+class QueryPlanMixin:
+    """
+    Select and prefetch exactly the relations the view's serializer reads.
+
+    Applied in `filter_queryset`, so it covers list and detail actions
+    of views that override `get_queryset`.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        select, prefetch = query_plan(self.get_serializer())
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
@@ -3,17 +3,18 @@ import functools
 import os
 import uuid
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import reversion
+from core.utils.quotas import apportion
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.contrib.humanize.templatetags.humanize import naturaltime
-from django.db import models
-from django.db.models import Count, Q, TextChoices
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q, Sum, TextChoices
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django_fsm import FSMField, FSMIntegerField, transition
@@ -76,6 +77,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     created_at = models.DateField(default=timezone.now)
     updated_at = AutoDateTimeField(default=timezone.now)
     password = models.CharField(max_length=128, blank=True)
+    # whether the user allows notifications from the app, None until checked
+    notifications_allowed = models.BooleanField(null=True, db_index=True)
+    notifications_checked_at = models.DateTimeField(
+        null=True, blank=True, db_index=True
+    )
 
     objects = UserManager()
 
@@ -85,6 +91,13 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f"{self.vk_id}"
 
 
+def target_season_year() -> int:
+    # Starting from september target year = current year
+    # Previous year otherwise
+    today = datetime.date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+
 @reversion.register()
 class Shtab(models.Model):
     """Shtab object"""
@@ -129,6 +142,8 @@ class Boec(models.Model):
     class Meta:
         verbose_name = "Боец"
         verbose_name_plural = "Бойцы"
+        # keyset pages of the boec list
+        indexes = [models.Index(fields=["last_name", "id"])]
 
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
@@ -144,6 +159,34 @@ class Boec(models.Model):
         verbose_name="Telegram ID", null=True, unique=True, blank=True
     )
 
+    # latest season, kept by core.utils.seasons.refresh_boec_seasons
+    last_season_year = models.IntegerField(
+        verbose_name="Год последнего выезда", null=True, blank=True, editable=False
+    )
+    last_season_brigade = models.ForeignKey(
+        "Brigade",
+        on_delete=models.SET_NULL,
+        verbose_name="Отряд последнего выезда",
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+
+    # (last, first, middle) name the boec was loaded with, the search index
+    # is only rebuilt when it changes
+    loaded_name: Optional[Tuple[str, str, str]] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        boec = super().from_db(db, field_names, values)
+        name = tuple(
+            boec.__dict__.get(field)
+            for field in ("last_name", "first_name", "middle_name")
+        )
+        boec.loaded_name = None if None in name else name
+        return boec
+
     @property
     def full_name(self):
         return f"{self.last_name} {self.first_name} {self.middle_name}"
@@ -152,6 +195,29 @@ class Boec(models.Model):
         return self.full_name
 
 
+class BoecSearchToken(models.Model):
+    """Normalized word of a boec name, see core.utils.search"""
+
+    class Meta:
+        verbose_name = "Слово поиска бойца"
+        verbose_name_plural = "Слова поиска бойцов"
+        indexes = [models.Index(fields=["token", "boec"])]
+
+    class FieldEnum(models.IntegerChoices):
+        LAST_NAME = 0, _("Фамилия")
+        FIRST_NAME = 1, _("Имя")
+        MIDDLE_NAME = 2, _("Отчество")
+
+    boec = models.ForeignKey(
+        Boec, on_delete=models.CASCADE, related_name="search_tokens"
+    )
+    field = models.PositiveSmallIntegerField(choices=FieldEnum.choices)
+    token = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"{self.boec_id}: {self.token}"
+
+
 @reversion.register()
 class Brigade(models.Model):
     """Brigade object"""
@@ -209,15 +275,8 @@ class Brigade(models.Model):
         pass
 
     def last_season_people_count(self) -> int:
-        # Starting from september target year = current year
-        # Previous year otherwise
-        target_year = (
-            datetime.date.today().year
-            if datetime.date.today().month >= 9
-            else datetime.date.today().year - 1
-        )
         return self.seasons.filter(
-            is_accepted=True, is_candidate=False, year=target_year
+            is_accepted=True, is_candidate=False, year=target_season_year()
         ).count()
 
 
@@ -278,41 +337,91 @@ class Event(models.Model):
     def __str__(self):
         return self.title
 
-    def quotas_match_participants(self) -> bool:
-        if not self.is_ticketed:
-            return True
-        approved_participants_by_brigade = Brigade.objects.annotate(
-            approved_count=Count(
-                "event_participants",
-                filter=Q(
-                    event_participants__is_approved=True,
-                    event_participants__worth=Participant.WorthEnum.DEFAULT,
-                    event_participants__event_id=self.id,
-                ),
+    def quota_violations(self) -> List[Dict[str, Any]]:
+        """
+        Brigades with more approved participants than their quota allows,
+        only brigades having participants are looked at
+        """
+        approved_by_brigade = (
+            Participant.objects.filter(
+                event=self,
+                is_approved=True,
+                worth=Participant.WorthEnum.DEFAULT,
+                brigade__isnull=False,
             )
+            .values("brigade_id", "brigade__title")
+            .annotate(approved=Count("id"))
+            .order_by("brigade_id")
+        )
+        allowed_by_brigade = dict(
+            self.quotas.values("brigade_id")
+            .annotate(allowed=Sum("count"))
+            .values_list("brigade_id", "allowed")
         )
 
-        errors: List[Dict[str, Any]] = list()
-        for brigade in approved_participants_by_brigade:
-            approved_count = approved_participants_by_brigade.approved_count
-            allowed_count = self.quotas.filter(bridage_id=brigade.id).count
-            if allowed_count < approved_count:
-                errors.append(
+        violations = []
+        for row in approved_by_brigade:
+            allowed = allowed_by_brigade.get(row["brigade_id"]) or 0
+            if row["approved"] > allowed:
+                violations.append(
                     {
-                        "brigade": brigade,
-                        "allowed": allowed_count,
-                        "approved": approved_count,
-                        "items": approved_participants_by_brigade,
+                        "brigade_id": row["brigade_id"],
+                        "brigade_title": row["brigade__title"],
+                        "allowed": allowed,
+                        "approved": row["approved"],
                     }
                 )
-        if len(errors) == 0:
+        return violations
+
+    def issue_tickets(self, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Create tickets for approved participants without one and give every
+        ticket of the event a code, in bulk
+        """
+        with transaction.atomic():
+            # concurrent calls for the event wait here, the unique constraint
+            # backs it up for tickets created elsewhere
+            Event.objects.select_for_update().filter(id=self.id).values_list("id").get()
+            ticketed_boec_ids = set(self.tickets.values_list("boec_id", flat=True))
+            approved_boec_ids = (
+                Participant.objects.filter(event=self, is_approved=True)
+                .values_list("boec_id", flat=True)
+                .distinct()
+            )
+            Ticket.objects.bulk_create(
+                (
+                    Ticket(event=self, boec_id=boec_id, uuid=uuid.uuid4())
+                    for boec_id in approved_boec_ids
+                    if boec_id not in ticketed_boec_ids
+                ),
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            ticket_count = self.tickets.count()
+
+            # bulk_update skips auto_now, so updated_at is set explicitly
+            now = timezone.now()
+            uncoded = list(
+                Ticket.objects.filter(event=self, uuid__isnull=True).only("id")
+            )
+            for ticket in uncoded:
+                ticket.uuid = uuid.uuid4()
+                ticket.updated_at = now
+            Ticket.objects.bulk_update(
+                uncoded, ["uuid", "updated_at"], batch_size=batch_size
+            )
+
+        return {
+            # ignored conflicts are not in the table, count what is
+            "created_count": ticket_count - len(ticketed_boec_ids),
+            "coded_count": len(uncoded),
+            "ticket_count": ticket_count,
+        }
+
+    def quotas_match_participants(self) -> bool:
+        if not self.is_ticketed:
             return True
-        else:
-            for error in errors:
-                print(
-                    f"Brigade {error['brigade']} has {error['allowed']} quotas and {error['approved']} approved requests"
-                )
-            return False
+        return not self.quota_violations()
 
     @transition(
         field=state, source=EventState.CREATED, target=EventState.QUOTA_CALCULATION
@@ -341,7 +450,7 @@ class Event(models.Model):
         field=state,
         source=EventState.REGISTRATION_COMPLETE,
         target=EventState.TICKETS_GENERATED,
-        conditions=[is_ticketed],
+        conditions=[lambda event: event.is_ticketed],
     )
     def generate_tickets(self):
         pass
@@ -378,31 +487,43 @@ class Event(models.Model):
         if shtab_id is not None and area_id is not None:
             raise ValueError("Can't limit quotas to Shtab and Area simultaneously")
 
+        if total_count < 0:
+            raise ValueError("total_count can't be negative")
+
         allowed_brigade_states = [Brigade.BrigadeState.MEMBER]
         if candidates_accepted:
             allowed_brigade_states.append(Brigade.BrigadeState.CANDIDATE)
 
+        brigades = Brigade.objects.filter(state__in=allowed_brigade_states)
         if shtab_id is not None:
-            brigades = Brigade.objects.get(
-                shtab_id=shtab_id, state__in=[allowed_brigade_states]
-            )
+            brigades = brigades.filter(shtab_id=shtab_id)
         elif area_id is not None:
-            brigades = Brigade.objects.get(
-                area_id=area_id, state__in=[allowed_brigade_states]
+            brigades = brigades.filter(area_id=area_id)
+
+        people_counts = dict(
+            brigades.values("id")
+            .annotate(
+                people_count=Count(
+                    "seasons",
+                    filter=Q(
+                        seasons__is_accepted=True,
+                        seasons__is_candidate=False,
+                        seasons__year=target_season_year(),
+                    ),
+                )
             )
-        else:
-            brigades = Brigade.objects.all(state__in=[allowed_brigade_states])
-
-        total_season_people_count = sum(
-            [brigade.last_season_people_count() for brigade in brigades]
+            .values_list("id", "people_count")
         )
-        ratio = total_count / total_season_people_count
+        if not any(people_counts.values()):
+            raise ValueError("No brigade has boecs in the last season")
 
-        self.quotas.delete()
+        quotas = apportion(total_count, people_counts)
 
-        for brigade in brigades:
-            self.quotas.create(
-                brigade=brigade, count=brigade.last_season_people_count() * ratio
+        with transaction.atomic():
+            self.quotas.all().delete()
+            EventQuota.objects.bulk_create(
+                EventQuota(event=self, brigade_id=brigade_id, count=count)
+                for brigade_id, count in quotas.items()
             )
 
 
@@ -417,6 +538,11 @@ class Ticket(models.Model):
     class Meta:
         verbose_name = "Билет"
         verbose_name_plural = "Билеты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "boec"], name="unique_event_ticket"
+            )
+        ]
 
     boec = models.ForeignKey(
         Boec, on_delete=models.CASCADE, verbose_name="ФИО", related_name="tickets"
@@ -453,7 +579,12 @@ class Ticket(models.Model):
     def scan(self):
         if self.is_used:
             raise UsedTicketScanException("Ticket has already been used")
-        self.ticket_scans.create(is_final=True)
+        try:
+            with transaction.atomic():
+                self.ticket_scans.create(is_final=True)
+        except IntegrityError:
+            # another gate scanned the ticket in the meantime
+            raise UsedTicketScanException("Ticket has already been used")
 
     def __str__(self) -> str:
         return f"{self.boec} - {self.event}"
@@ -475,10 +606,28 @@ class TicketScan(models.Model):
     )
 
     is_final = models.BooleanField(default=True, verbose_name="Проверен")
+    # the ticket while the scan is final, NULL otherwise: being unique it lets
+    # the database keep a single final scan per ticket
+    final_ticket = models.OneToOneField(
+        Ticket,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+    # time of the scan on an offline gate device, created_at otherwise
+    scanned_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Время сканирования"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.final_ticket_id = self.ticket_id if self.is_final else None
+        super().save(*args, **kwargs)
+
     @property
     def is_final_str(self) -> str:
         return "Проверен" if self.is_final else "Предъявлен"
@@ -497,6 +646,8 @@ class Season(models.Model):
     class Meta:
         verbose_name = "Выезжавший на сезон"
         verbose_name_plural = "Выезжавшие на сезон"
+        # keyset pages of the season list, ordered by ("-year", "id")
+        indexes = [models.Index(fields=["-year", "id"])]
 
     boec = models.ForeignKey(
         Boec, on_delete=models.CASCADE, verbose_name="ФИО", related_name="seasons"
@@ -509,6 +660,16 @@ class Season(models.Model):
     is_accepted = models.BooleanField(default=False, verbose_name="Подтвержден")
     is_candidate = models.BooleanField(default=True, verbose_name="Не стал бойцом")
 
+    # boec the season was loaded with, whose last season also changes when
+    # the season is moved to another boec
+    loaded_boec_id: Optional[int] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        season = super().from_db(db, field_names, values)
+        season.loaded_boec_id = season.__dict__.get("boec_id")
+        return season
+
     def __str__(self):
         return f"{self.year} - {self.brigade.title} {self.boec.last_name}"
 
@@ -644,6 +805,70 @@ class EventQuota(models.Model):
         return f"{self.brigade} - {self.event}, {quote_count}"
 
 
+class BrigadeRatingCell(models.Model):
+    """Rating points of a brigade in one column of an event, see core.utils.rating"""
+
+    class Meta:
+        verbose_name = "Рейтинг отряда"
+        verbose_name_plural = "Рейтинг отрядов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "brigade", "column"], name="unique_rating_cell"
+            )
+        ]
+
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        verbose_name="Мероприятие",
+        related_name="rating_cells",
+    )
+    brigade = models.ForeignKey(
+        Brigade,
+        on_delete=models.CASCADE,
+        verbose_name="Отряд",
+        related_name="rating_cells",
+    )
+    column = models.IntegerField(verbose_name="Колонка")
+    value = models.IntegerField(verbose_name="Баллы")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.brigade} - {self.event}, {self.column}: {self.value}"
+
+
+class CompetitionQuerySet(models.QuerySet):
+    def with_counters(self):
+        """Annotate participant counters of every competition in one query"""
+        involvement = Q(
+            competition_participation__worth=CompetitionParticipant.WorthEnum.INVOLVEMENT
+        )
+        nomination = "competition_participation__nomination"
+        return self.annotate(
+            participant_count=Count(
+                "competition_participation",
+                filter=Q(
+                    competition_participation__worth=(
+                        CompetitionParticipant.WorthEnum.DEFAULT
+                    )
+                ),
+                distinct=True,
+            ),
+            involvement_count=Count(
+                "competition_participation", filter=involvement, distinct=True
+            ),
+            # one per owned nomination, like filtering over the relation does
+            winner_count=Count(
+                nomination, filter=involvement & Q(**{f"{nomination}__is_rated": True})
+            ),
+            notwinner_count=Count(
+                nomination,
+                filter=involvement & Q(**{f"{nomination}__is_rated": False}),
+            ),
+        )
+
+
 @reversion.register()
 class Competition(models.Model):
     """Competition  model"""
@@ -652,6 +877,8 @@ class Competition(models.Model):
         verbose_name = "Конкурс мероприятия"
         verbose_name_plural = "Конкурсы мероприятий"
 
+    objects = CompetitionQuerySet.as_manager()
+
     event = models.ForeignKey(
         Event,
         on_delete=models.CASCADE,
@@ -841,6 +1068,8 @@ class Activity(models.Model):
     class Meta:
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
+        # pages of the activities of a boec, ordered by ("-created_at", "-id")
+        indexes = [models.Index(fields=["boec", "seen", "created_at", "id"])]
 
     class ActivityEnum(models.IntegerChoices):
         INFO = 0, _("Информация")
@@ -884,3 +1113,46 @@ class Activity(models.Model):
 
     def __str__(self):
         return f"{self.get_type_display()} | {self.boec} | {self.warning or self.achievement} "
+
+
+class Job(models.Model):
+    """Background job model"""
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [models.Index(fields=["state", "run_after"])]
+
+    class JobState(models.IntegerChoices):
+        QUEUED = 0, _("В очереди")
+        RUNNING = 1, _("Выполняется")
+        DONE = 2, _("Выполнена")
+        FAILED = 3, _("Ошибка")
+
+    name = models.CharField(max_length=255, verbose_name="Задача")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    state = models.IntegerField(
+        choices=JobState.choices, default=JobState.QUEUED, verbose_name="Статус"
+    )
+
+    attempts = models.IntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.IntegerField(default=3, verbose_name="Максимум попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # refreshed while the job runs, the job is stale once it is JOB_TIMEOUT old
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    worker = models.CharField(max_length=255, blank=True, verbose_name="Обработчик")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"{self.name} #{self.id} | {self.get_state_display()}"
@@ -1,7 +1,119 @@
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StyledPagination(pagination.LimitOffsetPagination):
     def get_paginated_response(self, data):
         return Response({"count": self.count, "items": data})
+
+
+class KeysetPagination(StyledPagination):
+    """
+    Limit/offset pagination which switches to keyset pagination when the
+    request has a `cursor` parameter, empty for the first page.
+
+    Pages are then ordered by the view's `keyset_ordering`, e.g.
+    `("last_name", "id")`, which must end with a unique non null field, and
+    the next page starts after the last row of the previous one instead of
+    skipping `offset` rows. The response keeps the `count` and `items`
+    envelope with a `next` link, `count` is only computed with `count=true`.
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, "keyset_ordering", None)
+        if not ordering or self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.count = (
+            self.get_count(queryset)
+            if request.query_params.get(self.count_query_param) == "true"
+            else None
+        )
+
+        fields = [field.lstrip("-") for field in ordering]
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            try:
+                queryset = queryset.filter(
+                    self.after(ordering, self.decode(cursor, fields))
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # one more row tells whether there is a next page
+        rows = list(queryset.order_by(*ordering)[: self.limit + 1])
+        page = rows[: self.limit]
+        self.next_cursor = (
+            self.encode([getattr(page[-1], field) for field in fields])
+            if len(rows) > self.limit
+            else None
+        )
+        return page
+
+    def after(self, ordering, values) -> Q:
+        """Rows ordered after the key values, for mixed directions as well"""
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                key.lstrip("-"): value
+                for key, value in zip(ordering[:index], values[:index])
+            }
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": values[index]}))
+        return reduce(or_, conditions)
+
+    def encode(self, values) -> str:
+        data = json.dumps(
+            [
+                value.isoformat()
+                if isinstance(value, (datetime.date, datetime.time))
+                else value
+                for value in values
+            ],
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode(self, cursor: str, fields):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {"count": self.count, "next": self.get_next_link(), "items": data}
+        )
@@ -1,3 +1,4 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
 
 
@@ -20,3 +21,96 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
             existing = set(self.fields)
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
+
+
+def is_single_valued(model, path: str) -> bool:
+    """Whether every hop of a `__` separated relation path is a forward FK"""
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if not (field.many_to_one or field.one_to_one):
+            return False
+        model = field.related_model
+    return True
+
+
+def split_paths(model, paths, prefix: str, joinable: bool):
+    """Relation paths as (select_related, prefetch_related) lookups"""
+    select, prefetch = set(), set()
+    for path in paths:
+        if joinable and is_single_valued(model, path):
+            select.add(prefix + path)
+        else:
+            prefetch.add(prefix + path)
+    return select, prefetch
+
+
+def related_serializer(field):
+    """
+    (nested serializer or None, many) of a field reading a relation, None
+    for other fields
+    """
+    if isinstance(field, serializers.ListSerializer):
+        return field.child, True
+    if isinstance(field, serializers.ManyRelatedField):
+        return None, True
+    if isinstance(field, serializers.ModelSerializer):
+        return field, False
+    return None
+
+
+def source_relation(model, field):
+    """Model relation a field reads directly from its source, if any"""
+    if len(field.source_attrs) != 1:
+        return None
+    try:
+        relation = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    return relation if relation.is_relation else None
+
+
+def query_plan(serializer, prefix: str = "", joinable: bool = True):
+    """
+    Collect the relations a serializer reads as (select_related,
+    prefetch_related) lookups.
+
+    Nested model serializers and many-related fields are followed
+    automatically. Relations read by methods or properties are declared
+    in `Meta.prefetch`, a mapping of field name to relation paths, so a
+    relation is only loaded when its field survives `fields=` pruning.
+    """
+    select, prefetch = set(), set()
+    model = serializer.Meta.model
+    hints = getattr(serializer.Meta, "prefetch", {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        hinted_select, hinted_prefetch = split_paths(
+            model, hints.get(name, ()), prefix, joinable
+        )
+        select |= hinted_select
+        prefetch |= hinted_prefetch
+
+        related = related_serializer(field)
+        relation = source_relation(model, field) if related else None
+        if relation is None:
+            continue
+
+        nested, many = related
+        path = prefix + field.source_attrs[0]
+        single = not many and (relation.many_to_one or relation.one_to_one)
+        if joinable and single:
+            select.add(path)
+        else:
+            prefetch.add(path)
+
+        if nested is not None:
+            nested_select, nested_prefetch = query_plan(
+                nested, f"{path}__", joinable and single
+            )
+            select |= nested_select
+            prefetch |= nested_prefetch
+
+    return select, prefetch
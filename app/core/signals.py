@@ -0,0 +1,118 @@
+from typing import Optional
+
+from core.authentication import invalidate_user
+from core.jobs import enqueue
+from core.models import (
+    Boec,
+    Competition,
+    CompetitionParticipant,
+    Event,
+    Nomination,
+    Participant,
+    Season,
+    Ticket,
+    User,
+)
+from core.utils.search import NAME_FIELDS, index_boecs
+from core.utils.seasons import refresh_boec_seasons
+from core.utils.tickets import invalidate_event
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_credentials(sender, instance, **kwargs):
+    """Drop cached VK credentials so deactivation and rights changes apply"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def invalidate_ticket_index(sender, instance, **kwargs):
+    """Reload the gate index of the event on its next scan"""
+    invalidate_event(instance.event_id)
+
+
+def queue_rating(event_id: Optional[int] = None) -> None:
+    """Recompute the rating cells of the event, or of every event, in background"""
+    enqueue(
+        "refresh_rating",
+        {} if event_id is None else {"event_id": event_id},
+        unique=True,
+    )
+
+
+def competition_event_id(competition_id: int) -> Optional[int]:
+    return (
+        Competition.objects.filter(id=competition_id)
+        .values_list("event_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+@receiver(post_save, sender=Competition)
+@receiver(post_delete, sender=Competition)
+def refresh_event_rating(sender, instance, **kwargs):
+    queue_rating(instance.id if sender is Event else instance.event_id)
+
+
+@receiver(post_save, sender=CompetitionParticipant)
+@receiver(post_delete, sender=CompetitionParticipant)
+def refresh_competition_rating(sender, instance, **kwargs):
+    # the competition is gone when deleted with it and queues the event itself
+    event_id = competition_event_id(instance.competition_id)
+    if event_id is not None:
+        queue_rating(event_id)
+
+
+@receiver(post_save, sender=Nomination)
+@receiver(post_delete, sender=Nomination)
+def refresh_nomination_rating(sender, instance, **kwargs):
+    event_id = competition_event_id(instance.competition_id)
+    if event_id is not None:
+        queue_rating(event_id)
+
+
+@receiver(m2m_changed, sender=CompetitionParticipant.brigades.through)
+@receiver(m2m_changed, sender=Nomination.owner.through)
+def refresh_owners_rating(sender, instance, action, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, (CompetitionParticipant, Nomination)):
+        event_id = competition_event_id(instance.competition_id)
+        if event_id is not None:
+            queue_rating(event_id)
+    else:
+        # a brigade changed, its competitions may belong to any event
+        queue_rating()
+
+
+@receiver(post_save, sender=Boec)
+def index_boec_name(sender, instance, update_fields=None, **kwargs):
+    """Rebuild the search tokens of the boec when its name changed"""
+    if update_fields is not None and not set(update_fields) & set(NAME_FIELDS):
+        return
+    name = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if name != instance.loaded_name:
+        index_boecs([instance.id])
+        instance.loaded_name = name
+
+
+@receiver(post_save, sender=Season)
+@receiver(post_delete, sender=Season)
+def refresh_boec_last_season(sender, instance, **kwargs):
+    """Refresh the boec of the season, and the previous one if it moved"""
+    boec_ids = {instance.boec_id, instance.loaded_boec_id} - {None}
+    refresh_boec_seasons(boec_ids)
+    instance.loaded_boec_id = instance.boec_id
+
+
+@receiver(post_save, sender=Season)
+@receiver(post_delete, sender=Season)
+def refresh_season_rating(sender, instance, **kwargs):
+    """Participants are counted for the brigade of their last season"""
+    queue_rating()
@@ -0,0 +1,77 @@
+import datetime
+from typing import Optional
+
+from core.jobs import enqueue, job
+from core.models import Event
+from core.utils.achievements import event_boec_ids, refresh_achievements
+from core.utils.notifications import refresh_permissions
+from core.utils.rating import refresh_rating
+from core.utils.sheets import EventReportGenerator, EventsRatingGenerator
+from django.conf import settings
+from django.utils import timezone
+
+
+@job("refresh_event_achievements")
+def refresh_event_achievements(event_id: int):
+    """Award achievements earned by the participants of a passed event"""
+    event = Event.objects.get(id=event_id)
+    refresh_achievements(event_boec_ids(event))
+
+
+@job("event_report")
+def event_report(event_id: int):
+    event = Event.objects.get(id=event_id)
+    EventReportGenerator(settings.REPORTS_SPREADSHEET_KEY).create(event)
+
+
+@job("events_rating")
+def events_rating():
+    EventsRatingGenerator(settings.REPORTS_SPREADSHEET_KEY).create()
+
+
+@job("refresh_rating")
+def refresh_rating_cells(event_id: Optional[int] = None):
+    """Recompute the brigade rating of the event, or of every rating event"""
+    refresh_rating(None if event_id is None else [event_id])
+
+
+@job("refresh_full_rating")
+def refresh_full_rating():
+    """
+    Recompute every rating event and queue the next run for the next local
+    midnight: cells count seasons back from the current year, so they go
+    stale at the turn of the year even when nothing else changed
+    """
+    refresh_rating()
+    tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+    enqueue(
+        "refresh_full_rating",
+        run_after=timezone.make_aware(
+            datetime.datetime.combine(tomorrow, datetime.time())
+        ),
+        unique=True,
+    )
+
+
+@job("refresh_notification_permissions")
+def refresh_notification_permissions(limit: int = 1000):
+    """
+    Re-check a batch of stale notification permissions and queue the next
+    batch, right away while stale users remain or after the check interval
+    """
+    checked = refresh_permissions(limit)
+    run_after = timezone.now()
+    if checked < limit:
+        run_after += datetime.timedelta(seconds=settings.NOTIFICATIONS_CHECK_INTERVAL)
+    enqueue(
+        "refresh_notification_permissions",
+        {"limit": limit},
+        run_after=run_after,
+        unique=True,
+    )
+
+
+def schedule_periodic_jobs():
+    """Queue the self-rescheduling jobs unless they already are"""
+    enqueue("refresh_notification_permissions", {"limit": 1000}, unique=True)
+    enqueue("refresh_full_rating", unique=True)
@@ -0,0 +1,80 @@
+from core import models
+from core.utils.achievements import collect_progress, refresh_achievements
+from django.test import TestCase
+from django.utils import timezone
+
+
+class AchievementProgressTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="area")
+        shtab = models.Shtab.objects.create(title="shtab")
+        self.brigade = models.Brigade.objects.create(
+            title="brigade", area=area, shtab=shtab
+        )
+        self.boec = models.Boec.objects.create(first_name="first", last_name="last")
+        self.other = models.Boec.objects.create(first_name="other", last_name="last")
+
+        for index in range(2):
+            event = models.Event.objects.create(
+                title=f"event {index}",
+                start_date=timezone.now(),
+                state=models.Event.EventState.PASSED,
+            )
+            models.Participant.objects.create(
+                boec=self.boec, event=event, is_approved=True
+            )
+        models.Season.objects.create(
+            boec=self.boec,
+            brigade=self.brigade,
+            year=2020,
+            is_accepted=True,
+            is_candidate=False,
+        )
+
+        self.participation = models.Achievement.objects.create(
+            type=models.Achievement.ActivityEnum.PARTICIPATION_DEFAULT,
+            title="participation",
+            description="participation",
+            goal=2,
+        )
+        self.seasons = models.Achievement.objects.create(
+            type=models.Achievement.ActivityEnum.SEASONS,
+            title="seasons",
+            description="seasons",
+            goal=1,
+        )
+        models.Achievement.objects.create(
+            type=models.Achievement.ActivityEnum.SPORT_WINS,
+            title="sport",
+            description="sport",
+            goal=1,
+        )
+
+    def test_collect_progress_for_batch(self):
+        """test counters of a batch come from one query per relation"""
+        with self.assertNumQueries(3):
+            progress = collect_progress([self.boec.id, self.other.id])
+
+        kind = models.Achievement.ActivityEnum
+        self.assertEqual(progress[self.boec.id][kind.PARTICIPATION_DEFAULT], 2)
+        self.assertEqual(progress[self.boec.id][kind.SEASONS], 1)
+        self.assertEqual(progress[self.boec.id][kind.SPORT_WINS], 0)
+        self.assertEqual(progress[self.other.id][kind.PARTICIPATION_DEFAULT], 0)
+
+    def test_refresh_awards_missing_achievements_once(self):
+        """test reached achievements are awarded and notified only once"""
+        self.assertEqual(refresh_achievements([self.boec.id, self.other.id]), 2)
+        self.assertEqual(refresh_achievements([self.boec.id, self.other.id]), 0)
+
+        self.boec.refresh_from_db()
+        self.assertEqual(self.boec.unread_activity_count, 2)
+        self.assertEqual(
+            set(self.boec.achievements.all()), {self.participation, self.seasons}
+        )
+        self.assertEqual(
+            models.Activity.objects.filter(
+                boec=self.boec, type=models.Activity.ActivityEnum.NEW_ACHIEVEMENT
+            ).count(),
+            2,
+        )
+        self.assertFalse(self.other.achievements.exists())
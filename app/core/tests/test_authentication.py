@@ -0,0 +1,83 @@
+from base64 import b64encode
+from hashlib import sha256
+from hmac import HMAC
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from core.authentication import VKAuthentication, cached_users, verified_headers
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+
+SECRET = "secret"
+
+
+def sign_header(params: dict) -> str:
+    """build an Authorization header signed the way VK signs launch params"""
+    ordered = {key: params[key] for key in sorted(params)}
+    sign = b64encode(
+        HMAC(SECRET.encode(), urlencode(ordered).encode(), sha256).digest()
+    ).decode("utf-8")
+    sign = sign.rstrip("=").replace("+", "-").replace("/", "_")
+    return urlencode({**ordered, "sign": sign})
+
+
+@patch("core.authentication.client_secret", SECRET)
+class VKAuthenticationTests(TestCase):
+    def setUp(self):
+        verified_headers.clear()
+        cached_users.clear()
+        self.user = get_user_model().objects.create_user(vk_id=494075)
+        self.header = sign_header({"vk_user_id": "494075", "vk_app_id": "6736218"})
+        self.request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=self.header)
+
+    def test_repeated_header_skips_validation(self):
+        """test a validated header is served from the cache"""
+        user, _ = VKAuthentication().authenticate(self.request)
+        self.assertEqual(user, self.user)
+
+        with patch("core.authentication.is_valid") as validator:
+            with self.assertNumQueries(0):
+                cached_user, _ = VKAuthentication().authenticate(self.request)
+            validator.assert_not_called()
+        self.assertEqual(cached_user, self.user)
+
+    def test_cached_user_is_a_copy(self):
+        """test requests don't share the cached user instance"""
+        first, _ = VKAuthentication().authenticate(self.request)
+        first.name = "changed"
+
+        second, _ = VKAuthentication().authenticate(self.request)
+
+        self.assertIsNot(first, second)
+        self.assertIsNone(second.name)
+
+    def test_deleted_user_authenticated_again(self):
+        """test a cached header of a deleted user creates the user again"""
+        VKAuthentication().authenticate(self.request)
+        self.user.delete()
+
+        user, _ = VKAuthentication().authenticate(self.request)
+
+        self.assertNotEqual(user.pk, self.user.pk)
+        self.assertEqual(get_user_model().objects.get(pk=user.pk).vk_id, 494075)
+
+    def test_deactivated_user_invalidated(self):
+        """test deactivating a user drops the cached header"""
+        VKAuthentication().authenticate(self.request)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            VKAuthentication().authenticate(self.request)
+
+    def test_invalid_sign_not_cached(self):
+        """test a header with a wrong sign is never cached"""
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=self.header.replace("6736218", "1")
+        )
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            VKAuthentication().authenticate(request)
+        self.assertEqual(len(verified_headers), 0)
@@ -1,8 +1,27 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from core.management.commands.benchmark_api import QUERY_BASELINE
+from core.management.commands.benchmark_api import Command as BenchmarkCommand
+from core.management.commands.benchmark_api import compare, compare_queries
+from core.models import (
+    Achievement,
+    Activity,
+    Area,
+    Boec,
+    Brigade,
+    Event,
+    Participant,
+    Season,
+    Shtab,
+)
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
 
 
 class CommandTests(TestCase):
@@ -20,3 +39,160 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command("wait_for_db")
             self.assertEqual(gi.call_count, 6)
+
+    def test_refresh_achievements(self):
+        """test the bulk refresh awards reached achievements to every boec"""
+        boecs = [
+            Boec.objects.create(first_name="first", last_name=f"last {index}")
+            for index in range(3)
+        ]
+        event = Event.objects.create(
+            title="event", start_date=timezone.now(), state=Event.EventState.PASSED
+        )
+        for boec in boecs[:2]:
+            Participant.objects.create(boec=boec, event=event, is_approved=True)
+        achievement = Achievement.objects.create(
+            type=Achievement.ActivityEnum.PARTICIPATION_DEFAULT,
+            title="participation",
+            description="participation",
+            goal=1,
+        )
+
+        call_command("refresh_achievements", chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(set(achievement.boec.all()), set(boecs[:2]))
+        self.assertEqual(Activity.objects.count(), 2)
+
+    def test_benchmark_api_requests_every_endpoint(self):
+        """
+        test the benchmark reaches every list and detail endpoint without
+        more queries than the committed baseline, or per row of a list
+        """
+        with open(QUERY_BASELINE) as file:
+            baseline = json.load(file)
+        command = BenchmarkCommand(stdout=StringIO())
+        results = command.run_benchmark(scale=baseline["scale"], repeat=1)
+
+        self.assertEqual(compare_queries(results, baseline["queries"]), [])
+
+        self.assertIn("page_queries", results["api/scans/"])
+        self.assertIn("api/event/{event_pk}/participants/", results)
+        self.assertIn("api/so/boec/{boec_pk}/seasons/{pk}/", results)
+        self.assertEqual(
+            {endpoint: 200 for endpoint in results},
+            {endpoint: result["status"] for endpoint, result in results.items()},
+        )
+        self.assertEqual(compare(results, results, tolerance=0), [])
+
+    def test_benchmark_api_compare(self):
+        """test query count growth is reported as a regression"""
+        baseline = {"api/event/": {"queries": 3, "time_ms": 10, "bytes": 100}}
+        results = {
+            "api/event/": {"status": 200, "queries": 4, "time_ms": 10, "bytes": 100}
+        }
+
+        self.assertEqual(
+            compare(results, baseline, tolerance=0.5),
+            ["api/event/: 4 queries, baseline 3"],
+        )
+        self.assertEqual(
+            compare_queries(results, {"api/event/": 3}),
+            ["api/event/: 4 queries, baseline 3"],
+        )
+        self.assertIn("not in the query baseline", compare_queries(results, {})[0])
+
+        results["api/event/"]["page_queries"] = [4, 23]
+        self.assertEqual(
+            compare_queries(results, {"api/event/": 4}),
+            ["api/event/: 23 queries at limit=20, 4 at limit=5"],
+        )
+
+    def test_load_seasons(self):
+        """test seasons are loaded in bulk, once, with bad rows rejected"""
+        area = Area.objects.create(title="area", short_title="a")
+        shtab = Shtab.objects.create(title="shtab")
+        brigade = Brigade.objects.create(title="Восток", area=area, shtab=shtab)
+        existing = Boec.objects.create(first_name="Иван", last_name="Иванов")
+        rows = [
+            {"name": "Иванов Иван", "brigade": "Восток", "year": 2019},
+            {"name": "Петров Пётр Петрович", "brigade": "Восток", "year": "2020"},
+            {"name": "Петров Пётр Петрович", "brigade": "Восток", "year": 2020},
+            {"name": "Сидоров", "brigade": "Восток", "year": 2020},
+            {"name": "Сидоров Сидор", "brigade": "Запад", "year": 2020},
+            {"name": "Сидоров Сидор", "brigade": "Восток", "year": "нет"},
+        ]
+        directory = tempfile.mkdtemp()
+        data_file = os.path.join(directory, "data.json")
+        rejects_file = os.path.join(directory, "rejects.jsonl")
+        with open(data_file, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False)
+
+        for _ in range(2):
+            call_command(
+                "load_seasons",
+                file=data_file,
+                rejects=rejects_file,
+                batch_size=2,
+                stdout=StringIO(),
+            )
+
+        self.assertEqual(Boec.objects.count(), 2)
+        self.assertEqual(
+            set(Season.objects.values_list("boec__last_name", "brigade_id", "year")),
+            {("Иванов", brigade.id, 2019), ("Петров", brigade.id, 2020)},
+        )
+        self.assertTrue(Season.objects.filter(boec=existing).exists())
+        with open(rejects_file, encoding="utf-8") as file:
+            reasons = [json.loads(line)["reason"] for line in file]
+        self.assertEqual(reasons, ["invalid name", "unknown brigade", "invalid year"])
+
+    def test_load_so(self):
+        """test brigades and missing dimensions are loaded in bulk"""
+        area = Area.objects.create(title="area", short_title="a")
+        shtab = Shtab.objects.create(title="shtab")
+        moved = Brigade.objects.create(title="Восток", area=area, shtab=shtab)
+        rows = [
+            {"name": "Восток", "direction": "b", "shtab": "shtab"},
+            {"name": "Запад", "direction": "a", "shtab": "Новый"},
+            {"name": "Запад", "direction": "b", "shtab": "Новый"},
+            {"name": "Юг", "direction": "c"},
+        ]
+        directory = tempfile.mkdtemp()
+        data_file = os.path.join(directory, "brigades.json")
+        rejects_file = os.path.join(directory, "rejects.jsonl")
+        with open(data_file, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False)
+
+        call_command("load_so", file=data_file, rejects=rejects_file, stdout=StringIO())
+
+        moved.refresh_from_db()
+        self.assertEqual(moved.area, area)
+        self.assertEqual(
+            set(Area.objects.values_list("short_title", flat=True)), {"a", "b"}
+        )
+        self.assertEqual(
+            set(Brigade.objects.values_list("title", "area__short_title")),
+            {("Восток", "a"), ("Запад", "a")},
+        )
+        with open(rejects_file, encoding="utf-8") as file:
+            reasons = [json.loads(line)["reason"] for line in file]
+        self.assertEqual(
+            reasons,
+            [
+                "brigade listed with another direction or shtab",
+                "missing name, direction or shtab",
+            ],
+        )
+
+        with self.assertNumQueries(6):
+            call_command(
+                "load_so",
+                file=data_file,
+                rejects=rejects_file,
+                update=True,
+                stdout=StringIO(),
+            )
+
+        moved.refresh_from_db()
+        self.assertEqual(moved.area.short_title, "b")
+        self.assertEqual(Brigade.objects.count(), 2)
@@ -0,0 +1,111 @@
+import datetime
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from core import jobs
+from core.models import Job
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.handler = Mock()
+        jobs.job("test_job", max_attempts=2)(self.handler)
+
+    def tearDown(self):
+        jobs.registry.pop("test_job")
+
+    def test_queued_job_runs(self):
+        """test the worker runs a queued job and records its outcome"""
+        job = self.handler.delay(value=1)
+
+        call_command("run_jobs", once=True, concurrency=1, stdout=StringIO())
+
+        self.handler.assert_called_once_with(value=1)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.JobState.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.duration)
+
+    def test_failed_job_retried(self):
+        """test a failing job is retried until it runs out of attempts"""
+        self.handler.side_effect = RuntimeError("boom")
+        job = self.handler.delay()
+
+        self.assertEqual(jobs.work("test", once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.JobState.QUEUED)
+        self.assertIn("boom", job.error)
+
+        # retry is due right away
+        Job.objects.filter(id=job.id).update(run_after=job.created_at)
+        jobs.work("test", once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.JobState.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_claim_is_exclusive(self):
+        """test a job can be claimed by a single worker only"""
+        job = self.handler.delay()
+
+        self.assertEqual(jobs.claim("first"), job)
+        self.assertIsNone(jobs.claim("second"))
+
+    def test_unique_job_queued_once(self):
+        """test a unique job isn't queued twice with the same arguments"""
+        job = jobs.enqueue("test_job", {"value": 1}, unique=True)
+
+        self.assertEqual(jobs.enqueue("test_job", {"value": 1}, unique=True), job)
+        self.assertNotEqual(jobs.enqueue("test_job", {"value": 2}, unique=True), job)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_requeue_only_expired_heartbeat(self):
+        """test a long running job with a fresh heartbeat isn't requeued"""
+        alive = self.handler.delay()
+        crashed = self.handler.delay()
+        jobs.claim("worker")
+        jobs.claim("worker")
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        Job.objects.update(started_at=long_ago)
+        Job.objects.filter(id=crashed.id).update(heartbeat_at=long_ago)
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+
+        states = dict(Job.objects.values_list("id", "state"))
+        self.assertEqual(states[alive.id], Job.JobState.RUNNING)
+        self.assertEqual(states[crashed.id], Job.JobState.QUEUED)
+
+    def test_heartbeat_refreshed(self):
+        """test the heartbeat of a running job moves forward"""
+        self.handler.delay()
+        job = jobs.claim("worker")
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        Job.objects.update(heartbeat_at=long_ago)
+
+        heartbeat = jobs.Heartbeat(job, 0)
+        heartbeat.stopped = Mock(wait=Mock(side_effect=[False, True]))
+        # the test connection must stay open
+        with patch("core.jobs.connection"):
+            heartbeat.beat()
+
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, long_ago)
+
+    def test_invalid_state_filter(self):
+        """test filtering jobs by an unknown state is a bad request"""
+        client = APIClient()
+        client.force_authenticate(
+            get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        )
+
+        res = client.get(reverse("event:jobs-list"), {"state": "abc"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = client.get(reverse("event:jobs-list"), {"state": Job.JobState.QUEUED})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,25 @@
+import io
+
+from core.utils.loaders import batches, iter_json_array
+from django.test import SimpleTestCase
+
+
+class LoadersTests(SimpleTestCase):
+    def test_iter_json_array(self):
+        """test items are parsed across chunk boundaries"""
+        document = ' [ {"name": "Иванов Иван", "year": 2019},\n12345, "a,]b", [1, 2] ] '
+
+        for chunk_size in (1, 2, 7, 1 << 16):
+            items = list(iter_json_array(io.StringIO(document), chunk_size=chunk_size))
+            self.assertEqual(
+                items, [{"name": "Иванов Иван", "year": 2019}, 12345, "a,]b", [1, 2]]
+            )
+
+    def test_iter_json_array_invalid(self):
+        """test documents other than a complete array are rejected"""
+        for document in ('{"a": 1}', '[{"a": 1}', "[1, {]"):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(document), chunk_size=3))
+
+    def test_batches(self):
+        self.assertEqual(list(batches(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
@@ -1,6 +1,8 @@
 from core import models
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
 from faker import Faker
 
 fake = Faker(locale="ru_RU")
@@ -96,3 +98,191 @@ class ModelTests(TestCase):
         self.assertEqual(
             str(season), f"{season.year} - {brigade.title} {boec.lastName}"
         )
+
+
+class DistributeQuotasTests(TestCase):
+    def setUp(self):
+        self.year = models.target_season_year()
+        self.area = models.Area.objects.create(title="area", short_title="a")
+        self.shtab = models.Shtab.objects.create(title="shtab")
+        self.event = models.Event.objects.create(
+            title="event",
+            start_date=timezone.now(),
+            state=models.Event.EventState.QUOTA_CALCULATION,
+        )
+
+    def create_brigade(self, people_count, state=models.Brigade.BrigadeState.MEMBER):
+        brigade = models.Brigade.objects.create(
+            title=fake.word(), area=self.area, shtab=self.shtab, state=state
+        )
+        for _ in range(people_count):
+            boec = models.Boec.objects.create(first_name="a", last_name="b")
+            models.Season.objects.create(
+                boec=boec,
+                brigade=brigade,
+                year=self.year,
+                is_accepted=True,
+                is_candidate=False,
+            )
+        return brigade
+
+    def test_quotas_add_up_to_total_count(self):
+        """test the largest remainder quotas are proportional and sum up exactly"""
+        brigades = [self.create_brigade(count) for count in (1, 1, 1)]
+        candidate = self.create_brigade(5, models.Brigade.BrigadeState.CANDIDATE)
+        self.event.quotas.create(brigade=candidate, count=100)
+
+        # aggregate, delete, insert and the transaction savepoints
+        with self.assertNumQueries(5):
+            self.event.distribute_quotas(total_count=10)
+
+        quotas = dict(self.event.quotas.values_list("brigade_id", "count"))
+        self.assertEqual(
+            quotas, {brigades[0].id: 4, brigades[1].id: 3, brigades[2].id: 3}
+        )
+
+    def test_candidates_accepted(self):
+        """test candidate brigades get quotas when they are accepted"""
+        member = self.create_brigade(3)
+        candidate = self.create_brigade(1, models.Brigade.BrigadeState.CANDIDATE)
+
+        self.event.distribute_quotas(total_count=8, candidates_accepted=True)
+
+        quotas = dict(self.event.quotas.values_list("brigade_id", "count"))
+        self.assertEqual(quotas, {member.id: 6, candidate.id: 2})
+
+    def test_no_people(self):
+        """test distribution fails when no brigade has last season people"""
+        self.create_brigade(0)
+
+        with self.assertRaises(ValueError):
+            self.event.distribute_quotas(total_count=10)
+
+    def test_negative_total_count(self):
+        """test a negative number of places is rejected"""
+        self.create_brigade(3)
+
+        with self.assertRaises(ValueError):
+            self.event.distribute_quotas(total_count=-1)
+        self.assertFalse(self.event.quotas.exists())
+
+
+class QuotaViolationsTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="a")
+        shtab = models.Shtab.objects.create(title="shtab")
+        self.brigades = [
+            models.Brigade.objects.create(
+                title=f"brigade {index}", area=area, shtab=shtab
+            )
+            for index in range(3)
+        ]
+        self.event = models.Event.objects.create(
+            title="event", start_date=timezone.now(), is_ticketed=True
+        )
+
+    def approve(self, brigade, count, **kwargs):
+        for _ in range(count):
+            boec = models.Boec.objects.create(first_name="a", last_name="b")
+            models.Participant.objects.create(
+                boec=boec, event=self.event, brigade=brigade, is_approved=True, **kwargs
+            )
+
+    def test_quota_violations(self):
+        """test only brigades with more approved participants than quota are reported"""
+        within, over, without_quota = self.brigades
+        self.event.quotas.create(brigade=within, count=2)
+        self.event.quotas.create(brigade=over, count=1)
+        self.approve(within, 2)
+        self.approve(over, 2)
+        self.approve(without_quota, 1)
+        # volunteers don't take quota places
+        self.approve(within, 3, worth=models.Participant.WorthEnum.VOLONTEER)
+
+        with self.assertNumQueries(2):
+            violations = self.event.quota_violations()
+
+        self.assertEqual(
+            violations,
+            [
+                {
+                    "brigade_id": over.id,
+                    "brigade_title": over.title,
+                    "allowed": 1,
+                    "approved": 2,
+                },
+                {
+                    "brigade_id": without_quota.id,
+                    "brigade_title": without_quota.title,
+                    "allowed": 0,
+                    "approved": 1,
+                },
+            ],
+        )
+        self.assertFalse(self.event.quotas_match_participants())
+
+    def test_quotas_match_participants(self):
+        """test the transition condition passes within quotas"""
+        self.event.quotas.create(brigade=self.brigades[0], count=2)
+        self.approve(self.brigades[0], 2)
+
+        self.assertTrue(self.event.quotas_match_participants())
+
+
+class IssueTicketsTests(TestCase):
+    def setUp(self):
+        self.event = models.Event.objects.create(
+            title="event", start_date=timezone.now(), is_ticketed=True
+        )
+        self.boecs = [
+            models.Boec.objects.create(first_name="a", last_name=f"b {index}")
+            for index in range(4)
+        ]
+
+    def test_issue_tickets(self):
+        """test approved participants get coded tickets in a few queries"""
+        for boec in self.boecs[:3]:
+            models.Participant.objects.create(
+                boec=boec, event=self.event, is_approved=True
+            )
+        models.Participant.objects.create(boec=self.boecs[3], event=self.event)
+        uncoded = models.Ticket.objects.create(boec=self.boecs[0], event=self.event)
+
+        # event lock, existing tickets, approved boecs, insert, ticket count,
+        # uncoded tickets, update and the transaction savepoints
+        with self.assertNumQueries(9):
+            counts = self.event.issue_tickets()
+
+        self.assertEqual(
+            counts, {"created_count": 2, "coded_count": 1, "ticket_count": 3}
+        )
+        tickets = models.Ticket.objects.filter(event=self.event)
+        self.assertEqual(
+            set(tickets.values_list("boec_id", flat=True)),
+            {boec.id for boec in self.boecs[:3]},
+        )
+        self.assertFalse(tickets.filter(uuid__isnull=True).exists())
+        uncoded.refresh_from_db()
+        self.assertGreater(uncoded.updated_at, uncoded.created_at)
+
+    def test_issue_tickets_twice(self):
+        """test issuing again doesn't duplicate tickets or change codes"""
+        models.Participant.objects.create(
+            boec=self.boecs[0], event=self.event, is_approved=True
+        )
+        self.event.issue_tickets()
+        code = models.Ticket.objects.get(event=self.event).uuid
+
+        counts = self.event.issue_tickets()
+
+        self.assertEqual(
+            counts, {"created_count": 0, "coded_count": 0, "ticket_count": 1}
+        )
+        self.assertEqual(models.Ticket.objects.get(event=self.event).uuid, code)
+
+    def test_ticket_unique_per_boec(self):
+        """test the database refuses a second ticket of a boec for the event"""
+        models.Ticket.objects.create(boec=self.boecs[0], event=self.event)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.Ticket.objects.create(boec=self.boecs[0], event=self.event)
@@ -0,0 +1,78 @@
+from core import models
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+SEASON_URL = reverse("so:season-list")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="area")
+        shtab = models.Shtab.objects.create(title="shtab")
+        brigade = models.Brigade.objects.create(title="b", area=area, shtab=shtab)
+        self.boec = models.Boec.objects.create(first_name="a", last_name="a", vk_id=1)
+        self.seasons = [
+            models.Season.objects.create(boec=self.boec, brigade=brigade, year=year)
+            for year in (2019, 2021, 2020, 2021, 2019, 2020, 2021)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(vk_id=1))
+
+    def pages(self, url, params):
+        ids = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.append([item["id"] for item in res.data["items"]])
+            if res.data["next"] is None:
+                return ids
+            res = self.client.get(res.data["next"])
+
+    def test_seasons_by_cursor(self):
+        """test the pages follow the composite ordering without gaps"""
+        pages = self.pages(SEASON_URL, {"cursor": "", "limit": 3})
+
+        expected = [
+            season.id for season in sorted(self.seasons, key=lambda s: (-s.year, s.id))
+        ]
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_count(self):
+        """test the count is only computed on request"""
+        res = self.client.get(SEASON_URL, {"cursor": "", "limit": 3})
+        self.assertIsNone(res.data["count"])
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                SEASON_URL, {"cursor": "", "limit": 3, "count": "true"}
+            )
+        self.assertEqual(res.data["count"], len(self.seasons))
+
+    def test_offset_without_cursor(self):
+        """test lists keep limit/offset pagination without a cursor"""
+        res = self.client.get(SEASON_URL, {"limit": 3, "offset": 3})
+
+        self.assertEqual(set(res.data), {"count", "items"})
+        self.assertEqual(res.data["count"], len(self.seasons))
+        self.assertEqual(len(res.data["items"]), 3)
+
+    def test_invalid_cursor(self):
+        """test a broken cursor is not found instead of a server error"""
+        for cursor in ("not base64!", "WyJ4Il0=", "WyJ4IiwxXQ=="):
+            res = self.client.get(SEASON_URL, {"cursor": cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_activities_by_cursor(self):
+        """test datetime keys survive the cursor"""
+        activities = [models.Activity.objects.create(boec=self.boec) for _ in range(5)]
+
+        # the mark as read route shares the name of the list
+        pages = self.pages("/api/activity/", {"cursor": "", "limit": 2})
+
+        self.assertEqual(
+            sum(pages, []), [activity.id for activity in reversed(activities)]
+        )
@@ -0,0 +1,132 @@
+import datetime
+from unittest.mock import patch
+
+from core import models
+from core.tasks import refresh_full_rating
+from core.utils.rating import APPLICATION, INVOLVEMENT, WIN, refresh_rating
+from django.test import TestCase
+from django.utils import timezone
+
+
+class BrigadeRatingTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="area")
+        shtab = models.Shtab.objects.create(title="shtab")
+        self.brigade = models.Brigade.objects.create(
+            title="brigade", area=area, shtab=shtab
+        )
+        self.other = models.Brigade.objects.create(
+            title="other", area=area, shtab=shtab
+        )
+        self.event = models.Event.objects.create(
+            title="sport", start_date=timezone.now(), worth=models.EventWorth.SPORT
+        )
+        year = timezone.now().year
+
+        self.boec = models.Boec.objects.create(first_name="a", last_name="a")
+        models.Season.objects.create(boec=self.boec, brigade=self.other, year=2015)
+        models.Season.objects.create(boec=self.boec, brigade=self.brigade, year=year)
+        old = models.Boec.objects.create(first_name="b", last_name="b")
+        models.Season.objects.create(boec=old, brigade=self.brigade, year=2015)
+
+        models.Participant.objects.create(boec=self.boec, event=self.event)
+        models.Participant.objects.create(
+            boec=self.boec,
+            event=self.event,
+            worth=models.Participant.WorthEnum.ORGANIZER,
+        )
+        # volonteers without a recent season aren't counted
+        models.Participant.objects.create(
+            boec=old, event=self.event, worth=models.Participant.WorthEnum.VOLONTEER
+        )
+
+        for index in range(2):
+            competition = models.Competition.objects.create(
+                event=self.event, title=f"competition {index}"
+            )
+            application = models.CompetitionParticipant.objects.create(
+                competition=competition
+            )
+            application.brigades.add(self.brigade, self.other)
+        self.winner = models.CompetitionParticipant.objects.create(
+            competition=competition,
+            worth=models.CompetitionParticipant.WorthEnum.INVOLVEMENT,
+        )
+        self.winner.brigades.add(self.other)
+        nomination = models.Nomination.objects.create(
+            title="first", competition=competition
+        )
+        nomination.owner.add(self.winner)
+        models.Nomination.objects.create(
+            title="unrated", competition=competition, is_rated=False
+        ).owner.add(self.winner)
+
+    def cells(self):
+        return set(
+            models.BrigadeRatingCell.objects.values_list(
+                "brigade_id", "column", "value"
+            )
+        )
+
+    def test_refresh_rating(self):
+        """test the cells of the best result in every competition are stored"""
+        with self.assertNumQueries(10):
+            refresh_rating()
+
+        self.assertEqual(
+            self.cells(),
+            {
+                (self.brigade.id, models.Participant.WorthEnum.DEFAULT, 1),
+                (self.brigade.id, models.Participant.WorthEnum.ORGANIZER, 1),
+                (self.brigade.id, APPLICATION, 2),
+                (self.other.id, APPLICATION, 1),
+                (self.other.id, WIN, 1),
+            },
+        )
+
+    def test_refresh_changes_only(self):
+        """test a refresh writes the difference of the event only"""
+        refresh_rating()
+        self.winner.nomination.clear()
+
+        self.assertEqual(refresh_rating([self.event.id]), 2)
+        self.assertIn((self.other.id, INVOLVEMENT, 1), self.cells())
+        self.assertNotIn((self.other.id, WIN, 1), self.cells())
+        self.assertEqual(refresh_rating([self.event.id]), 0)
+
+    def test_changes_queue_refresh(self):
+        """test participant changes queue one refresh of their event"""
+        models.Job.objects.all().delete()
+        models.Participant.objects.create(boec=self.boec, event=self.event)
+        models.Participant.objects.create(boec=self.boec, event=self.event)
+
+        self.assertEqual(
+            list(models.Job.objects.values_list("name", "kwargs")),
+            [("refresh_rating", {"event_id": self.event.id})],
+        )
+
+    def test_full_refresh_at_new_year(self):
+        """test the daily full refresh drops seasons too old in the new year"""
+        year = timezone.localdate().year
+        season = models.Season.objects.get(boec=self.boec, brigade=self.brigade)
+        season.year = year - 1
+        season.save()
+        refresh_rating()
+        organizer = (self.brigade.id, models.Participant.WorthEnum.ORGANIZER, 1)
+        self.assertIn(organizer, self.cells())
+        models.Job.objects.all().delete()
+        new_year = datetime.date(year + 1, 1, 1)
+
+        with patch("django.utils.timezone.localdate", return_value=new_year):
+            refresh_full_rating()
+
+        self.assertNotIn(organizer, self.cells())
+        self.assertEqual(
+            list(models.Job.objects.values_list("name", "run_after")),
+            [
+                (
+                    "refresh_full_rating",
+                    timezone.make_aware(datetime.datetime(year + 1, 1, 2)),
+                )
+            ],
+        )
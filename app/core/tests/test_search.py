@@ -0,0 +1,82 @@
+from io import StringIO
+
+from core import models
+from core.utils.search import normalize, search_boecs
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+class BoecSearchTests(TestCase):
+    def setUp(self):
+        def boec(last_name, first_name, middle_name=""):
+            return models.Boec.objects.create(
+                last_name=last_name, first_name=first_name, middle_name=middle_name
+            )
+
+        self.alena = boec("Королёва", "Алёна", "Игоревна")
+        self.ivanov = boec("Иванов", "Сергей", "Петрович")
+        self.ivanova = boec("Иванова", "Юлия")
+        self.ivan = boec("Петров", "Иван", "Иванович")
+
+    def test_normalize(self):
+        """test spellings of the same name give the same words"""
+        self.assertEqual(normalize("Алёна"), normalize("Алена"))
+        self.assertEqual(normalize("Юлия"), normalize("Yulia"))
+        self.assertEqual(normalize("Хохлов"), normalize("Hohlov"))
+        self.assertEqual(normalize("Римский-Корсаков"), ["rimski", "korsakov"])
+
+    def test_search_ranking(self):
+        """test exact words and last names rank first, every word must match"""
+        with self.assertNumQueries(1):
+            ids = search_boecs("иван")
+        self.assertEqual(ids, [self.ivan.id, self.ivanov.id, self.ivanova.id])
+
+        self.assertEqual(
+            search_boecs("Иванов"), [self.ivanov.id, self.ivanova.id, self.ivan.id]
+        )
+        self.assertEqual(search_boecs("ivanova iu"), [self.ivanova.id])
+        self.assertEqual(search_boecs("корол ален"), [self.alena.id])
+        self.assertEqual(search_boecs("korol alyo"), [])
+        self.assertEqual(search_boecs("  - "), [])
+
+    def test_tokens_follow_names(self):
+        """test renaming and deleting boecs updates the index"""
+        self.ivan.last_name = "Сидоров"
+        self.ivan.save()
+        self.assertEqual(search_boecs("петров"), [self.ivanov.id])
+        self.assertEqual(search_boecs("сидор"), [self.ivan.id])
+
+        self.ivan.delete()
+        self.assertEqual(search_boecs("сидор"), [])
+
+        models.BoecSearchToken.objects.all().delete()
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(search_boecs("алена"), [self.alena.id])
+
+    def test_tokens_kept_without_name_change(self):
+        """test saving a boec without renaming it doesn't rebuild its tokens"""
+        boec = models.Boec.objects.get(id=self.ivan.id)
+        boec.vk_id = 100
+        with self.assertNumQueries(1):
+            boec.save()
+
+        boec.first_name = "Фёдор"
+        boec.save()
+        self.assertEqual(search_boecs("федор"), [self.ivan.id])
+
+    def test_boec_list_search(self):
+        """test the boec list returns the ranked matches"""
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(vk_id=1))
+
+        res = client.get(reverse("so:boec-list"), {"search": "Ivan"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [boec["id"] for boec in res.data["items"]],
+            [self.ivan.id, self.ivanov.id, self.ivanova.id],
+        )
@@ -0,0 +1,109 @@
+from io import StringIO
+
+from core import models
+from core.utils.seasons import latest_seasons, latest_years_by_brigade, stale_boecs
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+class LatestSeasonTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="area")
+        shtab = models.Shtab.objects.create(title="shtab")
+        self.first = models.Brigade.objects.create(
+            title="first", area=area, shtab=shtab
+        )
+        self.second = models.Brigade.objects.create(
+            title="second", area=area, shtab=shtab
+        )
+        self.boec = models.Boec.objects.create(first_name="a", last_name="a")
+        self.newbie = models.Boec.objects.create(first_name="b", last_name="b")
+        self.idle = models.Boec.objects.create(first_name="c", last_name="c")
+        models.Season.objects.create(boec=self.boec, brigade=self.second, year=2021)
+        models.Season.objects.create(boec=self.boec, brigade=self.first, year=2020)
+        models.Season.objects.create(boec=self.boec, brigade=self.first, year=2018)
+        models.Season.objects.create(boec=self.newbie, brigade=self.first, year=2021)
+
+    def test_latest_seasons(self):
+        """test the latest season of every boec comes from one query"""
+        with self.assertNumQueries(1):
+            seasons = latest_seasons([self.boec.id, self.newbie.id, self.idle.id])
+
+        self.assertEqual(
+            seasons,
+            {
+                self.boec.id: (self.second.id, "second", 2021),
+                self.newbie.id: (self.first.id, "first", 2021),
+            },
+        )
+        self.assertEqual(
+            latest_years_by_brigade([self.boec.id])[self.boec.id, self.first.id], 2020
+        )
+
+    def test_participant_gets_latest_brigade(self):
+        """test a participant added without a brigade gets the latest one"""
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(vk_id=1))
+        event = models.Event.objects.create(title="event", start_date=timezone.now())
+        url = reverse("event:event-participants-list", args=[event.id])
+
+        for boec in (self.boec, self.idle):
+            res = client.post(url, {"boecId": boec.id, "worth": 0}, format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        brigades = dict(models.Participant.objects.values_list("boec_id", "brigade_id"))
+        self.assertEqual(brigades, {self.boec.id: self.second.id, self.idle.id: None})
+
+    def test_signals_keep_last_season(self):
+        """test saving and deleting seasons updates the cache on the boec"""
+        self.boec.refresh_from_db()
+        self.assertEqual(
+            (self.boec.last_season_year, self.boec.last_season_brigade_id),
+            (2021, self.second.id),
+        )
+
+        models.Season.objects.filter(boec=self.boec, year=2021).get().delete()
+        self.boec.refresh_from_db()
+        self.assertEqual(
+            (self.boec.last_season_year, self.boec.last_season_brigade_id),
+            (2020, self.first.id),
+        )
+        self.assertEqual(list(stale_boecs()), [])
+
+    def test_moved_season_refreshes_both_boecs(self):
+        """test moving a season to another boec refreshes the previous one"""
+        season = models.Season.objects.get(boec=self.boec, year=2021)
+        season.boec = self.idle
+        season.save()
+
+        self.boec.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual(
+            (self.boec.last_season_year, self.boec.last_season_brigade_id),
+            (2020, self.first.id),
+        )
+        self.assertEqual(
+            (self.idle.last_season_year, self.idle.last_season_brigade_id),
+            (2021, self.second.id),
+        )
+        self.assertEqual(list(stale_boecs()), [])
+
+    def test_rebuild_boec_cache(self):
+        """test the command reports and fixes a stale cache"""
+        models.Boec.objects.filter(id=self.newbie.id).update(
+            last_season_year=None, last_season_brigade=None
+        )
+        with self.assertRaises(CommandError):
+            call_command("rebuild_boec_cache", check=True, stdout=StringIO())
+
+        call_command("rebuild_boec_cache", stdout=StringIO())
+        self.assertEqual(list(stale_boecs()), [])
+        self.assertEqual(
+            latest_seasons([self.newbie.id]),
+            {self.newbie.id: (self.first.id, "first", 2021)},
+        )
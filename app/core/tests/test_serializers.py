@@ -0,0 +1,43 @@
+from core.serializers import query_plan
+from django.test import SimpleTestCase
+from event.serializers import (
+    CompetitionParticipantsSerializer,
+    ParticipantSerializer,
+    TicketScanSerializer,
+)
+from so.serializers import BrigadeSerializer, SeasonSerializer
+
+
+class QueryPlanTests(SimpleTestCase):
+    def test_nested_relations_selected(self):
+        """test forward relations of nested serializers are joined"""
+        select, prefetch = query_plan(SeasonSerializer())
+
+        self.assertEqual(select, {"brigade", "boec"})
+        self.assertEqual(prefetch, set())
+
+    def test_deep_nesting_followed(self):
+        """test relations of nested serializers are prefixed with their path"""
+        select, _ = query_plan(TicketScanSerializer())
+
+        self.assertEqual(
+            select, {"ticket", "ticket__event", "ticket__event__shtab", "ticket__boec"}
+        )
+
+    def test_many_relations_prefetched(self):
+        """test many-valued relations are prefetched"""
+        select, prefetch = query_plan(CompetitionParticipantsSerializer())
+
+        self.assertEqual(select, set())
+        self.assertEqual(prefetch, {"boec", "brigades", "nomination"})
+
+    def test_pruned_fields_not_loaded(self):
+        """test relations of fields dropped by `fields=` are not loaded"""
+        select, _ = query_plan(ParticipantSerializer(fields=("id", "boec")))
+        self.assertEqual(select, {"boec"})
+
+        select, _ = query_plan(BrigadeSerializer(fields=("id", "title")))
+        self.assertEqual(select, {"area"})
+
+        select, _ = query_plan(BrigadeSerializer(fields=("id",)))
+        self.assertEqual(select, set())
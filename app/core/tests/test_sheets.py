@@ -0,0 +1,116 @@
+import httplib2
+from core import models
+from core.utils.sheets import EventReportGenerator, EventsRatingGenerator
+from django.test import TestCase
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+
+class FakeSheetsAPI:
+    """Records batch updates like pygsheets' SheetAPIWrapper would send them"""
+
+    def __init__(self, fail_first=0):
+        self.calls = []
+        self.fail_first = fail_first
+
+    def batch_update(self, spreadsheet_id, requests, **kwargs):
+        self.calls.append((spreadsheet_id, requests))
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            raise HttpError(httplib2.Response({"status": 429}), b"Quota exceeded")
+        return {"spreadsheetId": spreadsheet_id}
+
+    def requests(self, kind):
+        return [
+            request[kind]
+            for _, requests in self.calls
+            for request in requests
+            if kind in request
+        ]
+
+
+class SheetsReportTests(TestCase):
+    def setUp(self):
+        area = models.Area.objects.create(title="area", short_title="area")
+        shtab = models.Shtab.objects.create(title="shtab")
+        self.brigade = models.Brigade.objects.create(
+            title="brigade", area=area, shtab=shtab
+        )
+        self.event = models.Event.objects.create(
+            title="sport",
+            start_date=timezone.now(),
+            worth=models.EventWorth.SPORT,
+            shtab=shtab,
+        )
+        for index, worth in enumerate(models.Participant.WorthEnum.values):
+            boec = models.Boec.objects.create(first_name="a", last_name=f"b{index}")
+            models.Season.objects.create(
+                boec=boec, brigade=self.brigade, year=timezone.now().year
+            )
+            models.Participant.objects.create(boec=boec, event=self.event, worth=worth)
+        conference = models.Conference.objects.create(date=timezone.now())
+        conference.brigades.add(self.brigade)
+
+    def generator(self, cls, api):
+        generator = cls("key", api=api)
+        generator.writer.backoff = 0
+        return generator
+
+    def test_event_report(self):
+        """test the report is written with one batch update"""
+        api = FakeSheetsAPI()
+        url = self.generator(EventReportGenerator, api).create(self.event)
+
+        self.assertEqual(len(api.calls), 1)
+        (sheet,) = api.requests("addSheet")
+        sheet_id = sheet["properties"]["sheetId"]
+        self.assertEqual(
+            url, f"https://docs.google.com/spreadsheets/d/key/edit#gid={sheet_id}"
+        )
+        # title, four info rows, three blocks of a header and one boec
+        self.assertEqual(sheet["properties"]["gridProperties"]["rowCount"], 18)
+        self.assertEqual(len(api.requests("setDataValidation")), 3)
+        (cells,) = api.requests("updateCells")
+        first = cells["rows"][0]["values"][0]
+        self.assertEqual(first["userEnteredValue"]["stringValue"], "sport")
+        boec_row = [
+            cell.get("userEnteredValue") for cell in cells["rows"][-1]["values"]
+        ]
+        self.assertEqual(
+            boec_row,
+            [
+                {"stringValue": "b0 a"},
+                {"stringValue": "brigade"},
+                {"numberValue": timezone.now().year},
+                {"boolValue": True},
+            ],
+        )
+
+    def test_quota_errors_are_retried(self):
+        """test a batch rejected by the quota is sent again"""
+        api = FakeSheetsAPI(fail_first=2)
+        with self.assertLogs("core.utils.sheets", "WARNING"):
+            self.generator(EventReportGenerator, api).create(self.event)
+
+        self.assertEqual(len(api.calls), 3)
+        self.assertEqual(api.calls[0], api.calls[2])
+
+    def test_events_rating(self):
+        """test rating worksheets of every worth go in one batch update"""
+        api = FakeSheetsAPI()
+        models.Event.objects.create(
+            title="art", start_date=timezone.now(), worth=models.EventWorth.ART
+        )
+        self.generator(EventsRatingGenerator, api).create()
+
+        self.assertEqual(len(api.calls), 1)
+        titles = [sheet["properties"]["title"] for sheet in api.requests("addSheet")]
+        self.assertEqual(titles, ["Творчество", "Спорт"])
+        sport = api.requests("updateCells")[1]
+        brigade_row = [
+            cell.get("userEnteredValue") for cell in sport["rows"][2]["values"]
+        ]
+        self.assertEqual(
+            brigade_row,
+            [{"stringValue": "brigade"}] + [{"numberValue": 1}] * 3 + [None] * 3,
+        )
@@ -0,0 +1,231 @@
+import datetime
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+from core.authentication import VKAuthentication
+from core.models import Area, Boec, Brigade, Season, Shtab, User
+from core.utils.notifications import refresh_permissions
+from core.utils.vk import VKClient, VKError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+
+class StubVK:
+    """Local HTTP server answering like the VK API"""
+
+    def __init__(self):
+        self.calls = []
+        self.allowed = set()
+        self.fail_first = 0
+        self.garble_first = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                params = {
+                    key: values[0]
+                    for key, values in parse_qs(
+                        self.rfile.read(length).decode()
+                    ).items()
+                }
+                method = self.path.rsplit("/", 1)[-1]
+                stub.calls.append((method, params))
+
+                if stub.fail_first > 0:
+                    stub.fail_first -= 1
+                    body = {"error": {"error_code": 6, "error_msg": "Too many"}}
+                elif method == "apps.isNotificationsAllowed":
+                    allowed = int(params["user_id"]) in stub.allowed
+                    body = {"response": {"is_allowed": allowed}}
+                elif method == "notifications.sendMessage":
+                    body = {
+                        "response": [
+                            {"user_id": int(user_id), "status": True}
+                            for user_id in params["user_ids"].split(",")
+                        ]
+                    }
+                else:
+                    body = {"error": {"error_code": 3, "error_msg": "Unknown method"}}
+
+                content = json.dumps(body).encode()
+                if stub.garble_first > 0:
+                    stub.garble_first -= 1
+                    content = b"<html>Bad gateway</html>"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/method"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sent_to(self):
+        return [
+            int(user_id)
+            for method, params in self.calls
+            if method == "notifications.sendMessage"
+            for user_id in params["user_ids"].split(",")
+        ]
+
+
+class VKClientTests(TestCase):
+    def setUp(self):
+        self.stub = StubVK()
+        self.addCleanup(self.stub.close)
+        self.client = VKClient("token", base_url=self.stub.url, rate=0, backoff=0)
+
+    def test_call_retries_transient_errors(self):
+        """test too many requests errors are retried"""
+        self.stub.allowed.add(1)
+        self.stub.fail_first = 2
+
+        self.assertTrue(self.client.is_notifications_allowed(1))
+        self.assertEqual(len(self.stub.calls), 3)
+        self.assertEqual(self.stub.calls[0][1]["access_token"], "token")
+
+    def test_call_retries_invalid_json(self):
+        """test answers which aren't JSON are retried"""
+        self.stub.allowed.add(1)
+        self.stub.garble_first = 1
+
+        self.assertTrue(self.client.is_notifications_allowed(1))
+        self.assertEqual(len(self.stub.calls), 2)
+
+    def test_call_raises_after_invalid_json(self):
+        """test answers which are never JSON raise VKError"""
+        self.stub.garble_first = 10
+
+        with self.assertRaises(VKError):
+            self.client.call("apps.isNotificationsAllowed", user_id=1)
+
+        self.assertEqual(len(self.stub.calls), self.client.max_retries + 1)
+
+    def test_call_raises_other_errors(self):
+        """test permanent errors aren't retried"""
+        with self.assertRaises(VKError) as context:
+            self.client.call("unknown.method")
+
+        self.assertEqual(context.exception.code, 3)
+        self.assertEqual(len(self.stub.calls), 1)
+
+
+class SendNotificationsTests(TestCase):
+    def setUp(self):
+        self.stub = StubVK()
+        self.addCleanup(self.stub.close)
+        self.settings = override_settings(VK_API_URL=self.stub.url, VK_API_RATE=0)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+        area = Area.objects.create(title="area", short_title="a")
+        shtab = Shtab.objects.create(title="shtab")
+        self.brigade = Brigade.objects.create(title="brigade", area=area, shtab=shtab)
+        for vk_id in range(1, 6):
+            user = User.objects.create_user(vk_id=vk_id)
+            user.notifications_allowed = vk_id != 3 if vk_id != 5 else None
+            user.save()
+            boec = Boec.objects.create(first_name="a", last_name="b", vk_id=vk_id)
+            if vk_id <= 3:
+                Season.objects.create(boec=boec, brigade=self.brigade, year=2020)
+
+    def test_send_to_brigade(self):
+        """test only brigade users allowing notifications get the message"""
+        self.stub.allowed = {3}
+        call_command(
+            "send_notifcations",
+            message="hello",
+            brigade=self.brigade.id,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(sorted(self.stub.sent_to()), [1, 2])
+        sent = [p for m, p in self.stub.calls if m == "notifications.sendMessage"]
+        self.assertEqual(sent[0]["message"], "hello")
+
+    def test_dry_run(self):
+        """test a dry run doesn't send anything"""
+        out = StringIO()
+        call_command("send_notifcations", message="hello", dry_run=True, stdout=out)
+
+        self.assertEqual(self.stub.sent_to(), [])
+        self.assertIn("3 users to notify, 1 users not checked yet", out.getvalue())
+
+    def test_resume(self):
+        """test a rerun with the state file skips notified users"""
+        state_file = os.path.join(tempfile.mkdtemp(), "state.json")
+        call_command(
+            "send_notifcations",
+            message="hello",
+            state_file=state_file,
+            stdout=StringIO(),
+        )
+        self.stub.calls.clear()
+
+        call_command(
+            "send_notifcations",
+            message="hello",
+            state_file=state_file,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(self.stub.calls, [])
+
+
+class NotificationPermissionsTests(TestCase):
+    def setUp(self):
+        self.stub = StubVK()
+        self.addCleanup(self.stub.close)
+        self.client = VKClient("token", base_url=self.stub.url, rate=0, backoff=0)
+
+    def test_refresh_permissions(self):
+        """test unchecked and outdated users are checked, oldest first"""
+        users = [User.objects.create_user(vk_id=vk_id) for vk_id in range(1, 5)]
+        User.objects.filter(id=users[0].id).update(
+            notifications_checked_at=timezone.now(), notifications_allowed=False
+        )
+        User.objects.filter(id=users[1].id).update(
+            notifications_checked_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        self.stub.allowed = {2, 3}
+
+        self.assertEqual(refresh_permissions(limit=2, client=self.client), 2)
+
+        checked = dict(
+            User.objects.filter(notifications_checked_at__isnull=False).values_list(
+                "vk_id", "notifications_allowed"
+            )
+        )
+        self.assertEqual(checked, {1: False, 2: None, 3: True, 4: False})
+        self.assertEqual(refresh_permissions(limit=10, client=self.client), 1)
+        self.assertTrue(User.objects.get(vk_id=2).notifications_allowed)
+        self.assertEqual(refresh_permissions(limit=10, client=self.client), 0)
+
+    @patch("core.authentication.is_valid", return_value=True)
+    def test_permission_from_launch_params(self, is_valid):
+        """test the flag of the launch params is stored on sign in"""
+        user = User.objects.create_user(vk_id=1)
+
+        VKAuthentication().authenticate_credentials(
+            {"vk_user_id": "1", "vk_are_notifications_enabled": "1"}
+        )
+
+        user.refresh_from_db()
+        self.assertTrue(user.notifications_allowed)
+        self.assertIsNotNone(user.notifications_checked_at)
@@ -0,0 +1,174 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from core.models import (
+    Achievement,
+    Activity,
+    Boec,
+    CompetitionParticipant,
+    Event,
+    EventWorth,
+    Participant,
+    Season,
+)
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+ActivityEnum = Achievement.ActivityEnum
+Progress = Dict[str, int]
+
+BATCH_SIZE = 500
+
+
+def empty_progress() -> Progress:
+    return {value: 0 for value in ActivityEnum.values}
+
+
+def collect_progress(boec_ids: Optional[Iterable[int]] = None) -> Dict[int, Progress]:
+    """
+    Compute achievement counters keyed by Achievement.ActivityEnum for a batch
+    of boecs (every boec with any activity when boec_ids is None).
+
+    Runs one grouped query per relation: event participation, competition
+    participation and seasons.
+    """
+    participation = Participant.objects.filter(
+        is_approved=True, event__state=Event.EventState.PASSED
+    )
+    competition = CompetitionParticipant.boec.through.objects.filter(
+        competitionparticipant__competition__ratingless=False
+    )
+    seasons = Season.objects.filter(is_candidate=False, is_accepted=True)
+
+    progress: Dict[int, Progress] = defaultdict(empty_progress)
+    if boec_ids is not None:
+        boec_ids = list(boec_ids)
+        participation = participation.filter(boec_id__in=boec_ids)
+        competition = competition.filter(boec_id__in=boec_ids)
+        seasons = seasons.filter(boec_id__in=boec_ids)
+        for boec_id in boec_ids:
+            progress[boec_id] = empty_progress()
+
+    worth = Participant.WorthEnum
+    participation = participation.values("boec_id").annotate(
+        default=Count("id", filter=Q(worth=worth.DEFAULT)),
+        volonteer=Count("id", filter=Q(worth=worth.VOLONTEER)),
+        organizer=Count("id", filter=Q(worth=worth.ORGANIZER)),
+    )
+    for row in participation:
+        counters = progress[row["boec_id"]]
+        counters[ActivityEnum.PARTICIPATION_DEFAULT] = row["default"]
+        counters[ActivityEnum.PARTICIPATION_VOLONTEER] = row["volonteer"]
+        counters[ActivityEnum.PARTICIPATION_ORGANIZER] = row["organizer"]
+
+    # просто подача заявок вместе с победами
+    playoff = Q(
+        competitionparticipant__worth=CompetitionParticipant.WorthEnum.INVOLVEMENT
+    )
+    event_worth = "competitionparticipant__competition__event__worth"
+    nomination = "competitionparticipant__nomination"
+    competition = competition.values("boec_id").annotate(
+        default=Count("competitionparticipant", distinct=True),
+        playoff=Count("competitionparticipant", filter=playoff, distinct=True),
+        nominations=Count(nomination, filter=playoff, distinct=True),
+        sport_wins=Count(
+            nomination,
+            filter=playoff & Q(**{event_worth: EventWorth.SPORT}),
+            distinct=True,
+        ),
+        art_wins=Count(
+            nomination,
+            filter=playoff & Q(**{event_worth: EventWorth.ART}),
+            distinct=True,
+        ),
+    )
+    for row in competition:
+        counters = progress[row["boec_id"]]
+        counters[ActivityEnum.COMPETITION_DEFAULT] = row["default"]
+        counters[ActivityEnum.COMPETITION_PLAYOFF] = row["playoff"]
+        counters[ActivityEnum.NOMINATIONS] = row["nominations"]
+        counters[ActivityEnum.SPORT_WINS] = row["sport_wins"]
+        counters[ActivityEnum.ART_WINS] = row["art_wins"]
+
+    for row in seasons.values("boec_id").annotate(count=Count("id")):
+        progress[row["boec_id"]][ActivityEnum.SEASONS] = row["count"]
+
+    return dict(progress)
+
+
+def award_achievements(
+    progress: Dict[int, Progress], achievements: Optional[List[Achievement]] = None
+) -> int:
+    """
+    Give boecs every achievement whose goal their progress reached and that
+    they don't own yet, notifying them through Activity. Returns the number
+    of new awards.
+    """
+    if achievements is None:
+        achievements = list(Achievement.objects.all())
+
+    owned = set(
+        Achievement.boec.through.objects.filter(boec_id__in=list(progress)).values_list(
+            "achievement_id", "boec_id"
+        )
+    )
+
+    awards = [
+        (achievement, boec_id)
+        for boec_id, counters in progress.items()
+        for achievement in achievements
+        if counters.get(achievement.type, 0) >= achievement.goal
+        and (achievement.id, boec_id) not in owned
+    ]
+    if not awards:
+        return 0
+
+    with transaction.atomic():
+        Achievement.boec.through.objects.bulk_create(
+            [
+                Achievement.boec.through(achievement_id=achievement.id, boec_id=boec_id)
+                for achievement, boec_id in awards
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Activity.objects.bulk_create(
+            [
+                Activity(
+                    type=Activity.ActivityEnum.NEW_ACHIEVEMENT,
+                    boec_id=boec_id,
+                    achievement=achievement,
+                )
+                for achievement, boec_id in awards
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        # одним запросом на каждое значение прироста счетчика
+        by_increment = defaultdict(list)
+        for boec_id, count in Counter(boec_id for _, boec_id in awards).items():
+            by_increment[count].append(boec_id)
+        for increment, boec_ids in by_increment.items():
+            Boec.objects.filter(id__in=boec_ids).update(
+                unread_activity_count=F("unread_activity_count") + increment
+            )
+
+    return len(awards)
+
+
+def refresh_achievements(boec_ids: Iterable[int]) -> int:
+    """Recompute progress for the boecs and award what they have earned"""
+    return award_achievements(collect_progress(boec_ids))
+
+
+def event_boec_ids(event: Event) -> List[int]:
+    """Boecs whose progress may change once the event has passed"""
+    boec_ids = set(
+        Participant.objects.filter(event=event).values_list("boec_id", flat=True)
+    )
+    boec_ids.update(
+        CompetitionParticipant.boec.through.objects.filter(
+            competitionparticipant__competition__event=event,
+            competitionparticipant__competition__ratingless=False,
+        ).values_list("boec_id", flat=True)
+    )
+    return sorted(boec_ids)
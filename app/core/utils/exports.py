@@ -0,0 +1,270 @@
+"""
+Reports streamed as CSV or XLSX files.
+
+Rows are read with `.iterator()` and encoded as they go, so a download
+holds one chunk of rows in memory whatever the report size. XLSX is
+written as a plain Office Open XML zip, without extra dependencies.
+"""
+import csv
+import itertools
+import re
+import zipfile
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from core.models import BrigadeRatingCell, Event, Participant
+from core.utils.rating import COLUMNS, is_counted, rating_events
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FILE_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+CHUNK_SIZE = 2000
+
+PARTICIPANT_HEADER = ["Статус", "ФИО", "Отряд", "Год выезда", "Зачтен"]
+
+
+def participant_rows(event: Event) -> Iterator[List[Any]]:
+    """
+    Participants of the event ordered by worth and name, with the brigade and
+    year of their last season and whether they count for the rating
+    """
+    participants = (
+        Participant.objects.filter(event=event)
+        .order_by("worth", "boec__last_name", "boec__first_name", "boec_id")
+        .values_list(
+            "worth",
+            "boec__last_name",
+            "boec__first_name",
+            "boec__middle_name",
+            "boec__last_season_brigade__title",
+            "boec__last_season_year",
+        )
+    )
+    event_date = event.start_date.date()
+    today = timezone.localdate()
+    for (
+        worth,
+        last_name,
+        first_name,
+        middle_name,
+        brigade,
+        year,
+    ) in participants.iterator(chunk_size=CHUNK_SIZE):
+        yield [
+            worth,
+            f"{last_name} {first_name} {middle_name}".strip(),
+            brigade,
+            year,
+            year is not None and is_counted(worth, year, event_date, today),
+        ]
+
+
+def participant_report(event: Event) -> Iterator[List[Any]]:
+    worths = dict(Participant.WorthEnum.choices)
+    yield PARTICIPANT_HEADER
+    for worth, *row in participant_rows(event):
+        yield [str(worths[worth]), *row]
+
+
+def rating_report(brigades, worth: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    The rating matrix, a column per event and rating column, a row per
+    brigade ordered by area and title
+    """
+    events = rating_events().order_by("start_date", "id")
+    if worth is not None:
+        events = events.filter(worth=worth)
+    events = list(events.only("id", "title", "worth"))
+
+    offsets = {}
+    header = ["Отряд"]
+    for event in events:
+        offsets[event.id] = len(header) - 1
+        header += [f"{event.title}: {column}" for column in COLUMNS[event.worth]]
+    yield header
+
+    # cells are merged with the brigades, both go in the same order
+    brigades = brigades.order_by("area", "title", "id")
+    cells = (
+        BrigadeRatingCell.objects.filter(
+            brigade__in=brigades, event_id__in=list(offsets)
+        )
+        .order_by("brigade__area", "brigade__title", "brigade_id")
+        .values_list("brigade_id", "event_id", "column", "value")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    by_brigade = itertools.groupby(cells, key=lambda cell: cell[0])
+    next_group = next(by_brigade, None)
+
+    for brigade_id, title in brigades.values_list("id", "title").iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        row: List[Any] = [title] + [None] * (len(header) - 1)
+        if next_group is not None and next_group[0] == brigade_id:
+            for _, event_id, column, value in next_group[1]:
+                row[1 + offsets[event_id] + column] = value
+            next_group = next(by_brigade, None)
+        yield row
+
+
+class Echo:
+    """File-like object returning what is written instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+# CSV text starting with these is read as a formula by spreadsheet programs,
+# XLSX inline strings are always text and are written as they are
+FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+
+
+def escape_formula(text: str) -> str:
+    """Prefix text a spreadsheet would evaluate with ', which shows it as is"""
+    return f"'{text}" if text.startswith(FORMULA_START) else text
+
+
+def csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        return escape_formula(value)
+    return value
+
+
+def csv_stream(rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    writer = csv.writer(Echo())
+    # the BOM makes Excel read the file as UTF-8
+    yield "\ufeff".encode()
+    for row in rows:
+        yield writer.writerow([csv_value(value) for value in row]).encode()
+
+
+class ZipBuffer:
+    """Unseekable file collecting the zip bytes between two yields"""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_FILES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" '
+        'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats'
+        '.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'relationships"><Relationship Id="rId1" Type="http://schemas.openxmlformats'
+        '.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/></Relationships>'
+    ),
+}
+
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>"
+)
+SHEET_END = "</sheetData></worksheet>"
+
+# characters XML 1.0 doesn't allow
+INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def column_letter(index: int) -> str:
+    """Spreadsheet column name of a 0-based index: A, B, ..., Z, AA, ..."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def xlsx_cell(ref: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(INVALID_XML.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_stream(rows: Iterable[Sequence[Any]], title: str = "Отчет") -> Iterator[bytes]:
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_FILES.items():
+            archive.writestr(name, content)
+        # sheet names are limited to 31 characters without []:*?/\
+        sheet_title = escape(
+            re.sub(r"[\[\]:*?/\\]", "", title)[:31] or "Sheet", {'"': "&quot;"}
+        )
+        archive.writestr("xl/workbook.xml", WORKBOOK.format(title=sheet_title))
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(SHEET_START.encode())
+            for number, row in enumerate(rows, 1):
+                cells = "".join(
+                    xlsx_cell(f"{column_letter(index)}{number}", value)
+                    for index, value in enumerate(row)
+                    if value is not None
+                )
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode())
+                if number % CHUNK_SIZE == 0:
+                    yield buffer.pop()
+            sheet.write(SHEET_END.encode())
+    yield buffer.pop()
+
+
+def streaming_export(
+    rows: Iterable[Sequence[Any]], filename: str, file_format: str, title: str = ""
+) -> StreamingHttpResponse:
+    """Download of the rows as a CSV or XLSX file"""
+    if file_format == "xlsx":
+        content = xlsx_stream(rows, title or filename)
+    else:
+        content = csv_stream(rows)
+    response = StreamingHttpResponse(content, content_type=FILE_FORMATS[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{file_format}"'
+    return response
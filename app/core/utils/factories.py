@@ -0,0 +1,332 @@
+"""
+Bulk factories for a realistic dataset, used by the API benchmark.
+
+Sizes are given for scale=1 and grow linearly with it. Rows are inserted
+with bulk_create, so model signals don't fire for seeded objects.
+"""
+import datetime
+import random
+from typing import Dict, List, Type
+
+from core import models
+from core.utils.search import index_boecs
+from core.utils.seasons import refresh_boec_seasons
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Model
+from django.utils import timezone
+from faker import Faker
+
+BATCH_SIZE = 1000
+
+SIZES = {
+    "shtabs": 20,
+    "brigades": 300,
+    "boecs": 20000,
+    "seasons": 40000,
+    "positions": 1000,
+    "events": 200,
+    "participants": 20000,
+    "competitions": 400,
+    "competition_participants": 4000,
+    "nominations": 800,
+    "tickets": 5000,
+    "ticket_scans": 3000,
+    "activities": 5000,
+}
+
+AREAS = ["ССО", "СПО", "СОП", "ССервО", "СМО", "СХО", "ОСО", "СПУО"]
+
+
+def scaled(name: str, scale: float) -> int:
+    return max(1, int(SIZES[name] * scale))
+
+
+def create(model: Type[Model], objects: List) -> List[int]:
+    """Insert objects and return the ids of all rows of the model"""
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    # bulk_create doesn't return ids on MySQL
+    return list(model.objects.order_by("id").values_list("id", flat=True))
+
+
+def create_m2m(relation, rows: List[Dict[str, int]]) -> None:
+    through = relation.through
+    through.objects.bulk_create(
+        [through(**row) for row in rows], batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+@transaction.atomic
+def seed(scale: float = 1.0, seed: int = 4321) -> Dict[str, int]:
+    """
+    Fill an empty database and return sample object ids by model name,
+    including a staff user linked to a boec with data on every endpoint.
+    """
+    fake = Faker(locale="ru_RU")
+    Faker.seed(seed)
+    rnd = random.Random(seed)
+    now = timezone.now()
+
+    area_ids = create(
+        models.Area, [models.Area(title=title, short_title=title) for title in AREAS]
+    )
+    shtab_ids = create(
+        models.Shtab,
+        [
+            models.Shtab(title=f"Штаб {fake.city()} {index}")
+            for index in range(scaled("shtabs", scale))
+        ],
+    )
+    brigade_ids = create(
+        models.Brigade,
+        [
+            models.Brigade(
+                title=f"{fake.word().capitalize()} {index}",
+                area_id=rnd.choice(area_ids),
+                shtab_id=rnd.choice(shtab_ids),
+                state=rnd.choice(models.Brigade.BrigadeState.values),
+            )
+            for index in range(scaled("brigades", scale))
+        ],
+    )
+    boec_ids = create(
+        models.Boec,
+        [
+            models.Boec(
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                middle_name=fake.middle_name(),
+                vk_id=index + 1,
+            )
+            for index in range(scaled("boecs", scale))
+        ],
+    )
+    create(
+        models.Season,
+        [
+            models.Season(
+                boec_id=rnd.choice(boec_ids),
+                brigade_id=rnd.choice(brigade_ids),
+                year=rnd.randint(2010, now.year),
+                is_accepted=rnd.random() < 0.9,
+                is_candidate=rnd.random() < 0.2,
+            )
+            for _ in range(scaled("seasons", scale))
+        ],
+    )
+    create(
+        models.Position,
+        [
+            models.Position(
+                position=rnd.choice(models.Position.PositionEnum.values),
+                boec_id=rnd.choice(boec_ids),
+                brigade_id=rnd.choice(brigade_ids) if index % 5 else None,
+                shtab_id=None if index % 5 else rnd.choice(shtab_ids),
+            )
+            for index in range(scaled("positions", scale))
+        ],
+    )
+
+    event_ids = create(
+        models.Event,
+        [
+            models.Event(
+                title=fake.sentence(nb_words=3),
+                shtab_id=rnd.choice(shtab_ids),
+                start_date=now - datetime.timedelta(days=rnd.randint(0, 700)),
+                state=rnd.choice(models.Event.EventState.values),
+                worth=rnd.choice(models.EventWorth.values),
+                visibility=True,
+                is_ticketed=rnd.random() < 0.3,
+            )
+            for _ in range(scaled("events", scale))
+        ],
+    )
+    create(
+        models.Participant,
+        [
+            models.Participant(
+                boec_id=rnd.choice(boec_ids),
+                event_id=rnd.choice(event_ids),
+                brigade_id=rnd.choice(brigade_ids),
+                worth=rnd.choice(models.Participant.WorthEnum.values),
+                is_approved=rnd.random() < 0.8,
+            )
+            for _ in range(scaled("participants", scale))
+        ],
+    )
+    create(
+        models.EventQuota,
+        [
+            models.EventQuota(
+                event_id=event_id, brigade_id=rnd.choice(brigade_ids), count=10
+            )
+            for event_id in event_ids
+        ],
+    )
+
+    competition_ids = create(
+        models.Competition,
+        [
+            models.Competition(
+                event_id=rnd.choice(event_ids),
+                title=fake.sentence(nb_words=2),
+                ratingless=rnd.random() < 0.1,
+            )
+            for _ in range(scaled("competitions", scale))
+        ],
+    )
+    competition_participant_ids = create(
+        models.CompetitionParticipant,
+        [
+            models.CompetitionParticipant(
+                competition_id=rnd.choice(competition_ids),
+                worth=rnd.choice(models.CompetitionParticipant.WorthEnum.values),
+            )
+            for _ in range(scaled("competition_participants", scale))
+        ],
+    )
+    create_m2m(
+        models.CompetitionParticipant.boec,
+        [
+            {"competitionparticipant_id": owner_id, "boec_id": rnd.choice(boec_ids)}
+            for owner_id in competition_participant_ids
+            for _ in range(rnd.randint(1, 3))
+        ],
+    )
+    create_m2m(
+        models.CompetitionParticipant.brigades,
+        [
+            {
+                "competitionparticipant_id": owner_id,
+                "brigade_id": rnd.choice(brigade_ids),
+            }
+            for owner_id in competition_participant_ids
+        ],
+    )
+    nomination_ids = create(
+        models.Nomination,
+        [
+            models.Nomination(
+                title=fake.word(),
+                competition_id=rnd.choice(competition_ids),
+                is_rated=rnd.random() < 0.8,
+            )
+            for _ in range(scaled("nominations", scale))
+        ],
+    )
+    create_m2m(
+        models.Nomination.owner,
+        [
+            {
+                "nomination_id": nomination_id,
+                "competitionparticipant_id": rnd.choice(competition_participant_ids),
+            }
+            for nomination_id in nomination_ids
+        ],
+    )
+
+    # a boec has a single ticket per event
+    ticket_pairs = dict.fromkeys(
+        (rnd.choice(boec_ids), rnd.choice(event_ids))
+        for _ in range(scaled("tickets", scale))
+    )
+    ticket_ids = create(
+        models.Ticket,
+        [
+            models.Ticket(
+                boec_id=boec_id, event_id=event_id, uuid=fake.uuid4(cast_to=None)
+            )
+            for boec_id, event_id in ticket_pairs
+        ],
+    )
+    create(
+        models.TicketScan,
+        [
+            models.TicketScan(ticket_id=rnd.choice(ticket_ids))
+            for _ in range(scaled("ticket_scans", scale))
+        ],
+    )
+
+    achievement_ids = create(
+        models.Achievement,
+        [
+            models.Achievement(type=value, title=label, description=label, goal=1)
+            for value, label in models.Achievement.ActivityEnum.choices
+        ],
+    )
+    # every awarded achievement comes with its activity, as award_achievements does
+    awards = {
+        (rnd.choice(achievement_ids), rnd.choice(boec_ids))
+        for _ in range(scaled("activities", scale))
+    }
+    create_m2m(
+        models.Achievement.boec,
+        [
+            {"achievement_id": achievement_id, "boec_id": boec_id}
+            for achievement_id, boec_id in awards
+        ],
+    )
+    create(
+        models.Activity,
+        [
+            models.Activity(
+                boec_id=boec_id,
+                type=models.Activity.ActivityEnum.NEW_ACHIEVEMENT,
+                achievement_id=achievement_id,
+            )
+            for achievement_id, boec_id in awards
+        ],
+    )
+
+    conference = models.Conference.objects.create(date=now)
+    create_m2m(
+        models.Conference.brigades,
+        [{"conference_id": conference.id, "brigade_id": id} for id in brigade_ids],
+    )
+
+    # the requesting user owns the busiest boec so nested endpoints return data
+    boec_id = (
+        models.Participant.objects.values("boec_id")
+        .annotate(count=Count("id"))
+        .order_by("-count")
+        .values_list("boec_id", flat=True)
+        .first()
+    )
+    models.Season.objects.bulk_create(
+        [
+            models.Season(
+                boec_id=boec_id,
+                brigade_id=rnd.choice(brigade_ids),
+                year=year,
+                is_accepted=True,
+                is_candidate=False,
+            )
+            for year in range(now.year - 2, now.year + 1)
+        ]
+    )
+    # bulk_create skips the signals keeping the latest season and the search
+    # tokens of boecs
+    refresh_boec_seasons()
+    index_boecs()
+    models.Position.objects.create(
+        position=models.Position.PositionEnum.KOMANDIR,
+        boec_id=boec_id,
+        brigade_id=rnd.choice(brigade_ids),
+    )
+    vk_id = models.Boec.objects.values_list("vk_id", flat=True).get(id=boec_id)
+    user = get_user_model().objects.create_user(vk_id=vk_id, is_staff=True)
+
+    return {
+        "user": user.id,
+        "area": area_ids[0],
+        "shtab": rnd.choice(shtab_ids),
+        "brigade": rnd.choice(brigade_ids),
+        "boec": boec_id,
+        "event": models.Participant.objects.filter(boec_id=boec_id)
+        .values_list("event_id", flat=True)
+        .first(),
+        "competition": rnd.choice(competition_ids),
+        "ticket": rnd.choice(ticket_ids),
+        "conference": conference.id,
+    }
@@ -0,0 +1,119 @@
+"""Helpers shared by the bulk data import commands"""
+import json
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+decoder = json.JSONDecoder()
+
+
+# returned by scan_item when the item may continue in the next chunk
+INCOMPLETE = object()
+
+
+def refill(file: IO[str], buffer: str, position: int, chunk_size: int):
+    """
+    Drop the consumed start of the buffer and append the next chunk, returns
+    the buffer, the position in it and whether the file ended
+    """
+    chunk = file.read(chunk_size)
+    return buffer[position:] + chunk, 0, not chunk
+
+
+def scan_item(buffer: str, position: int, eof: bool) -> Tuple[Any, int]:
+    """Decode the item at the position, returns it and the position after it"""
+    try:
+        item, end = decoder.raw_decode(buffer, position)
+    except json.JSONDecodeError:
+        if eof:
+            raise
+        return INCOMPLETE, position
+    # a number may be cut in the middle by the chunk boundary
+    if end == len(buffer) and not eof:
+        return INCOMPLETE, position
+    return item, end
+
+
+def iter_json_array(file: IO[str], chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yield the items of a top level JSON array one by one, reading the file
+    in chunks instead of loading the whole document
+    """
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # skip whitespace and separators, read more when the buffer runs out
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer) and not eof:
+            buffer, position, eof = refill(file, buffer, position, chunk_size)
+            continue
+
+        if not started:
+            if buffer[position : position + 1] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position : position + 1] == "]":
+            return
+        if eof and position >= len(buffer):
+            raise ValueError("Unexpected end of the JSON array")
+
+        item, position = scan_item(buffer, position, eof)
+        if item is INCOMPLETE:
+            buffer, position, eof = refill(file, buffer, position, chunk_size)
+            continue
+        yield item
+
+
+def batches(items: Iterator[T], size: int) -> Iterator[List[T]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unique_map(rows) -> Tuple[Dict, set]:
+    """Map keys to ids, keys met more than once are returned separately"""
+    ids: Dict = {}
+    duplicates = set()
+    for key, id in rows:
+        if key in ids:
+            duplicates.add(key)
+        ids[key] = id
+    for key in duplicates:
+        del ids[key]
+    return ids, duplicates
+
+
+class Rejects:
+    """JSON lines file of the rows that couldn't be imported and why"""
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.file = open(path, "w", encoding="utf-8") if path else None
+        self.count = 0
+
+    def add(self, row: Dict[str, Any], reason: str) -> None:
+        self.count += 1
+        if self.file is not None:
+            self.file.write(
+                json.dumps({"reason": reason, "row": row}, ensure_ascii=False) + "\n"
+            )
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self) -> "Rejects":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
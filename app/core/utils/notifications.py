@@ -0,0 +1,75 @@
+"""
+Cached answers of VK's apps.isNotificationsAllowed.
+
+Broadcasts read `User.notifications_allowed` instead of asking VK about
+every user. The flag is refreshed from the launch params on sign in and by
+the refresh_notification_permissions job, oldest checks first.
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from core.models import User
+from core.utils.vk import VKClient, VKError
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def stale_users(now: Optional[datetime.datetime] = None):
+    """Users never checked or checked longer than the check interval ago"""
+    now = now or timezone.now()
+    outdated = now - datetime.timedelta(seconds=settings.NOTIFICATIONS_CHECK_INTERVAL)
+    return User.objects.filter(
+        Q(notifications_checked_at__isnull=True)
+        | Q(notifications_checked_at__lt=outdated),
+        is_active=True,
+    )
+
+
+def refresh_permissions(limit: int, client: Optional[VKClient] = None) -> int:
+    """Re-check up to `limit` stale users, returns the number checked"""
+    now = timezone.now()
+    users = list(
+        stale_users(now)
+        .order_by(F("notifications_checked_at").asc(nulls_first=True), "id")
+        .only("id", "vk_id", "notifications_allowed")[:limit]
+    )
+    if not users:
+        return 0
+
+    client = client or VKClient(pool_size=settings.NOTIFICATIONS_CHECK_WORKERS)
+
+    def check(user: User) -> Optional[bool]:
+        try:
+            return client.is_notifications_allowed(user.vk_id)
+        except VKError as e:
+            logger.warning("Checking notifications of %s failed: %s", user, e)
+            return None
+
+    with ThreadPoolExecutor(settings.NOTIFICATIONS_CHECK_WORKERS) as executor:
+        for user, allowed in zip(users, executor.map(check, users)):
+            # failed checks keep the old flag and are retried next interval
+            if allowed is not None:
+                user.notifications_allowed = allowed
+            user.notifications_checked_at = now
+
+    User.objects.bulk_update(
+        users, ["notifications_allowed", "notifications_checked_at"], batch_size=500
+    )
+    return len(users)
+
+
+def remember_permission(user: User, allowed: bool) -> None:
+    """Store the flag reported by the VK launch params when it changed"""
+    if user.notifications_allowed == allowed:
+        return
+    now = timezone.now()
+    User.objects.filter(pk=user.pk).update(
+        notifications_allowed=allowed, notifications_checked_at=now
+    )
+    user.notifications_allowed = allowed
+    user.notifications_checked_at = now
@@ -0,0 +1,27 @@
+from typing import Dict, Hashable, TypeVar
+
+Key = TypeVar("Key", bound=Hashable)
+
+
+def apportion(total: int, weights: Dict[Key, int]) -> Dict[Key, int]:
+    """
+    Split `total` between keys proportionally to their weights with the
+    largest remainder method, so the parts always add up to `total`.
+    Ties for the leftover units go to the larger weight, then the smaller key.
+    """
+    weight_sum = sum(weights.values())
+    if weight_sum <= 0:
+        raise ValueError("Can't apportion between zero weights")
+
+    parts = {}
+    remainders = {}
+    for key, weight in weights.items():
+        parts[key], remainders[key] = divmod(total * weight, weight_sum)
+
+    leftover = total - sum(parts.values())
+    by_remainder = sorted(
+        weights, key=lambda key: (-remainders[key], -weights[key], key)
+    )
+    for key in by_remainder[:leftover]:
+        parts[key] += 1
+    return parts
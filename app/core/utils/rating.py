@@ -0,0 +1,275 @@
+"""
+Brigade rating of the events since the last festival.
+
+Every event of the rating gets a row of points per brigade, one cell per
+column of `COLUMNS[event.worth]`. The cells are computed with a few grouped
+queries and stored in `BrigadeRatingCell`, which the Sheets export, the admin
+and the API read. Changes of participants, competitions and nominations
+queue a `refresh_rating` job for their event, and the `refresh_full_rating`
+job recomputes every event daily since the counted seasons depend on the
+current year.
+"""
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pytz
+from core.models import (
+    BrigadeRatingCell,
+    CompetitionParticipant,
+    Event,
+    EventWorth,
+    Nomination,
+    Participant,
+)
+from core.utils.seasons import latest_seasons, latest_years_by_brigade
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+LAST_FESTIVAL = datetime.datetime(2020, 12, 10, tzinfo=pytz.UTC)
+
+# volonteers of the events till then are counted with two seasons old boecs
+EXTENDED_VOLONTEERS_UNTIL = datetime.date(2021, 7, 1)
+
+# participants, volonteers and organizers go to the column of their worth
+APPLICATION, INVOLVEMENT, WIN = 3, 4, 5
+
+COLUMNS = {
+    EventWorth.UNSET: ["", "Волонтеры", "Организаторы"],
+    EventWorth.ART: [
+        "[Участники (чел)]",
+        "Волонтеры",
+        "Организаторы",
+        "Подача заявки",
+        "Участие в конкурсной программе",
+        "Победа в номинации",
+    ],
+    EventWorth.SPORT: [
+        "[Участники (чел)]",
+        "Волонтеры",
+        "Организаторы",
+        "Участие в соревновании",
+        "Выход в плей-офф",
+        "Победа",
+    ],
+    EventWorth.VOLUNTEER: ["Участие (чел)", "Волонтеры", "Организаторы"],
+    EventWorth.CITY: ["[Участие (чел)]", "Волонтеры", "Организаторы"],
+}
+
+# (event_id, brigade_id, column) -> points
+Cells = Dict[Tuple[int, int, int], int]
+
+
+def rating_events():
+    return Event.objects.filter(start_date__gte=LAST_FESTIVAL)
+
+
+def is_counted(worth: int, year: int, event_date: datetime.date, today) -> bool:
+    """Volonteers and organizers count only with a recent season"""
+    if worth == Participant.WorthEnum.DEFAULT:
+        return True
+    seasons_ago = (
+        2
+        if LAST_FESTIVAL.date() < event_date < EXTENDED_VOLONTEERS_UNTIL
+        and worth == Participant.WorthEnum.VOLONTEER
+        else 1
+    )
+    return year >= today.year - seasons_ago
+
+
+def participant_cells(events: List[Event], today) -> Cells:
+    """People of each worth, counted for the brigade of their last season"""
+    dates = {event.id: event.start_date.date() for event in events}
+    participants = list(
+        Participant.objects.filter(event_id__in=list(dates)).values_list(
+            "event_id", "boec_id", "brigade_id", "worth"
+        )
+    )
+
+    boec_ids = {boec_id for _, boec_id, _, _ in participants}
+    last_seasons = latest_seasons(boec_ids)
+    last_in_brigade = latest_years_by_brigade(boec_ids)
+
+    cells: Cells = defaultdict(int)
+    for event_id, boec_id, brigade_id, worth in participants:
+        if brigade_id is not None:
+            year = last_in_brigade.get((boec_id, brigade_id))
+        elif boec_id in last_seasons:
+            brigade_id, _, year = last_seasons[boec_id]
+        else:
+            year = None
+        if year is None or not is_counted(worth, year, dates[event_id], today):
+            continue
+        cells[event_id, brigade_id, worth] += 1
+    return cells
+
+
+def competition_cells(events: List[Event]) -> Cells:
+    """
+    Points of art and sport competitions. A brigade gets points for its best
+    result in a competition only: the application, the involvement (playoff)
+    or the rated nominations won. Sport counts every competition, art gives
+    one point for the application or the involvement per event.
+    """
+    worths = {
+        event.id: event.worth
+        for event in events
+        if event.worth in (EventWorth.ART, EventWorth.SPORT)
+    }
+    competition = "competitionparticipant__competition"
+    applications = CompetitionParticipant.brigades.through.objects.filter(
+        **{f"{competition}__event_id__in": list(worths)},
+        **{f"{competition}__ratingless": False},
+    ).values_list(
+        f"{competition}__event_id",
+        f"{competition}_id",
+        "competitionparticipant_id",
+        "competitionparticipant__worth",
+        "brigade_id",
+    )
+    wins = dict(
+        Nomination.owner.through.objects.filter(
+            nomination__is_rated=True,
+            **{f"{competition}__event_id__in": list(worths)},
+            **{f"{competition}__ratingless": False},
+        )
+        .values("competitionparticipant_id")
+        .annotate(count=Count("nomination_id"))
+        .values_list("competitionparticipant_id", "count")
+    )
+
+    # (event_id, competition_id, brigade_id) -> [involved, nominations won]
+    results: Dict[Tuple[int, int, int], List[int]] = defaultdict(lambda: [0, 0])
+    for event_id, competition_id, participant_id, worth, brigade_id in applications:
+        result = results[event_id, competition_id, brigade_id]
+        if worth == CompetitionParticipant.WorthEnum.INVOLVEMENT:
+            result[0] = 1
+            result[1] += wins.get(participant_id, 0)
+
+    cells: Cells = defaultdict(int)
+    for (event_id, _, brigade_id), (involved, won) in results.items():
+        if won:
+            cells[event_id, brigade_id, WIN] += won
+        elif involved:
+            cells[event_id, brigade_id, INVOLVEMENT] += 1
+        else:
+            cells[event_id, brigade_id, APPLICATION] += 1
+
+    for (event_id, brigade_id, column), value in list(cells.items()):
+        if worths[event_id] != EventWorth.ART or column == WIN:
+            continue
+        if column == APPLICATION and (event_id, brigade_id, INVOLVEMENT) in cells:
+            del cells[event_id, brigade_id, column]
+        else:
+            cells[event_id, brigade_id, column] = 1
+    return cells
+
+
+def compute_cells(events: List[Event], today=None) -> Cells:
+    today = today or timezone.localdate()
+    cells = participant_cells(events, today)
+    for key, value in competition_cells(events).items():
+        cells[key] = value
+    return {key: value for key, value in cells.items() if value}
+
+
+def refresh_rating(event_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the cells of the events (all rating events when None) and
+    write only the differences. Returns the number of changed cells.
+    """
+    events = rating_events()
+    stored = BrigadeRatingCell.objects.all()
+    if event_ids is not None:
+        event_ids = list(event_ids)
+        events = events.filter(id__in=event_ids)
+        stored = stored.filter(event_id__in=event_ids)
+
+    cells = compute_cells(list(events.only("id", "worth", "start_date")))
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            (event_id, brigade_id, column): (id, value)
+            for id, event_id, brigade_id, column, value in stored.select_for_update().values_list(
+                "id", "event_id", "brigade_id", "column", "value"
+            )
+        }
+        removed = [id for key, (id, _) in existing.items() if key not in cells]
+        changed = [
+            BrigadeRatingCell(id=existing[key][0], value=value, updated_at=now)
+            for key, value in cells.items()
+            if key in existing and existing[key][1] != value
+        ]
+        created = [
+            BrigadeRatingCell(
+                event_id=event_id, brigade_id=brigade_id, column=column, value=value
+            )
+            for (event_id, brigade_id, column), value in cells.items()
+            if (event_id, brigade_id, column) not in existing
+        ]
+        BrigadeRatingCell.objects.filter(id__in=removed).delete()
+        BrigadeRatingCell.objects.bulk_update(
+            changed, ["value", "updated_at"], batch_size=500
+        )
+        BrigadeRatingCell.objects.bulk_create(created, batch_size=500)
+
+    return len(removed) + len(changed) + len(created)
+
+
+def rating_rows(
+    events: List[Event], brigade_ids: List[int]
+) -> Dict[int, List[List[Optional[int]]]]:
+    """Stored cells of every event as rows of the brigades in the given order"""
+    rows = {
+        event.id: {
+            brigade_id: [None] * len(COLUMNS[event.worth]) for brigade_id in brigade_ids
+        }
+        for event in events
+    }
+    for event_id, brigade_id, column, value in BrigadeRatingCell.objects.filter(
+        event_id__in=list(rows), brigade_id__in=brigade_ids
+    ).values_list("event_id", "brigade_id", "column", "value"):
+        rows[event_id][brigade_id][column] = value
+    return {
+        event_id: [by_brigade[brigade_id] for brigade_id in brigade_ids]
+        for event_id, by_brigade in rows.items()
+    }
+
+
+def rating_version() -> Tuple[int, Optional[datetime.datetime]]:
+    """Number of stored cells and the last change, which version the rating"""
+    state = BrigadeRatingCell.objects.aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    return state["count"], state["updated_at"]
+
+
+def brigade_events(
+    brigade_ids: List[int], worth: Optional[int] = None
+) -> Dict[int, List[dict]]:
+    """Points of every brigade per event, in the order of the events"""
+    cells = BrigadeRatingCell.objects.filter(brigade_id__in=brigade_ids)
+    if worth is not None:
+        cells = cells.filter(event__worth=worth)
+
+    events: Dict[int, Dict[int, dict]] = defaultdict(dict)
+    for brigade_id, event_id, title, event_worth, column, value in cells.order_by(
+        "event__start_date", "event_id", "column"
+    ).values_list(
+        "brigade_id", "event_id", "event__title", "event__worth", "column", "value"
+    ):
+        event = events[brigade_id].setdefault(
+            event_id,
+            {
+                "event_id": event_id,
+                "title": title,
+                "worth": event_worth,
+                "points": 0,
+                "cells": [None] * len(COLUMNS[event_worth]),
+            },
+        )
+        event["points"] += value
+        event["cells"][column] = value
+    return {brigade_id: list(events[brigade_id].values()) for brigade_id in brigade_ids}
@@ -0,0 +1,163 @@
+"""
+Search of boecs by name.
+
+Every word of a boec name is stored in `BoecSearchToken` in a normal form:
+lowercase latin, with cyrillic transliterated (ё is written as е) and the
+usual spelling variants of transliteration folded, so "Алёна" and "Алена",
+"Юлия" and "Yulia", "Хохлов" and "Hohlov" give the same token. A query is
+normalized the same way and every word of it must prefix a token of the
+boec. Matches are ranked with a
+single grouped query over the token index, exact words and last names
+first. The tokens are kept by the Boec signals and rebuilt with
+`manage.py rebuild_search_index`.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+from typing import Iterable, List, Optional, Tuple
+
+from core.models import Boec, BoecSearchToken
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Q, QuerySet, Value, When
+
+TOKEN_LENGTH = BoecSearchToken._meta.get_field("token").max_length
+
+# boecs returned for a query and query words taken into account
+SEARCH_LIMIT = 50
+MAX_TERMS = 4
+
+NAME_FIELDS = ("last_name", "first_name", "middle_name")
+
+# passport transliteration, ё is written as е
+CYRILLIC = dict(
+    zip(
+        "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+        [
+            *("a", "b", "v", "g", "d", "e", "e", "zh", "z", "i", "i", "k", "l"),
+            *("m", "n", "o", "p", "r", "s", "t", "u", "f", "kh", "ts", "ch", "sh"),
+            *("shch", "", "y", "", "e", "iu", "ia"),
+        ],
+    )
+)
+
+# spellings transliterations disagree on, e.g. "ya"/"ia", "iia"/"ia", "h"/"kh"
+VARIANTS = [
+    (re.compile("[jy]"), "i"),
+    (re.compile("ii+"), "i"),
+    (re.compile("(?<![zkcs])h"), "kh"),
+]
+
+SEPARATOR = re.compile("[^a-z0-9]+")
+
+
+def normalize(text: str) -> List[str]:
+    """Words of the text in the normal form of the search tokens"""
+    latin = "".join(CYRILLIC.get(char, char) for char in text.lower())
+    # drop accents of latin letters
+    latin = unicodedata.normalize("NFKD", latin).encode("ascii", "ignore").decode()
+    words = []
+    for word in SEPARATOR.split(latin):
+        for pattern, replacement in VARIANTS:
+            word = pattern.sub(replacement, word)
+        if word:
+            words.append(word[:TOKEN_LENGTH])
+    return words
+
+
+def name_tokens(
+    last_name: str, first_name: str, middle_name: str
+) -> List[Tuple[int, str]]:
+    """(field, token) pairs of a boec name"""
+    tokens = []
+    for field, value in zip(
+        BoecSearchToken.FieldEnum.values, (last_name, first_name, middle_name)
+    ):
+        for token in normalize(value or ""):
+            if (field, token) not in tokens:
+                tokens.append((field, token))
+    return tokens
+
+
+def index_boecs(boec_ids: Optional[Iterable[int]] = None, batch_size=2000) -> int:
+    """
+    Rebuild the tokens of the boecs (of every boec when None), returns the
+    number of tokens written
+    """
+    boecs = Boec.objects.order_by("id")
+    tokens = BoecSearchToken.objects.all()
+    if boec_ids is not None:
+        boec_ids = list(boec_ids)
+        boecs = boecs.filter(id__in=boec_ids)
+        tokens = tokens.filter(boec_id__in=boec_ids)
+
+    written = 0
+    with transaction.atomic():
+        tokens.delete()
+        batch: List[BoecSearchToken] = []
+        for boec_id, *name in boecs.values_list("id", *NAME_FIELDS).iterator(
+            chunk_size=batch_size
+        ):
+            batch += [
+                BoecSearchToken(boec_id=boec_id, field=field, token=token)
+                for field, token in name_tokens(*name)
+            ]
+            if len(batch) >= batch_size:
+                BoecSearchToken.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        BoecSearchToken.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def term_score(term: str) -> Max:
+    """Best match of a query word among the tokens of a boec, 0 without one"""
+    last_name = BoecSearchToken.FieldEnum.LAST_NAME
+    # istartswith is a plain LIKE which uses the index on MySQL, tokens are
+    # lowercase anyway
+    return Max(
+        Case(
+            When(token=term, field=last_name, then=Value(4)),
+            When(token=term, then=Value(3)),
+            When(token__istartswith=term, field=last_name, then=Value(2)),
+            When(token__istartswith=term, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def search_boecs(
+    query: str, boecs: Optional[QuerySet] = None, limit: int = SEARCH_LIMIT
+) -> List[int]:
+    """Ids of the boecs matching every word of the query, best matches first"""
+    terms = list(dict.fromkeys(normalize(query)))[:MAX_TERMS]
+    if not terms:
+        return []
+
+    tokens = BoecSearchToken.objects.filter(
+        reduce(or_, (Q(token__istartswith=term) for term in terms))
+    )
+    if boecs is not None:
+        tokens = tokens.filter(boec__in=boecs.values("id"))
+
+    scores = {f"term{index}": term_score(term) for index, term in enumerate(terms)}
+    ranked = (
+        tokens.values("boec_id")
+        .annotate(**scores)
+        .filter(**{f"{name}__gt": 0 for name in scores})
+        .annotate(score=reduce(lambda a, b: a + b, (F(name) for name in scores)))
+        .order_by("-score", "boec__last_name", "boec_id")
+        .values_list("boec_id", flat=True)
+    )
+    return list(ranked[:limit])
+
+
+def search_queryset(queryset: QuerySet, query: str) -> QuerySet:
+    """The best matches of the query among the boecs, in the order of the rank"""
+    ids = search_boecs(query, queryset)
+    rank = Case(
+        *(When(id=id, then=Value(position)) for position, id in enumerate(ids)),
+        output_field=IntegerField(),
+    )
+    return Boec.objects.filter(id__in=ids).order_by(rank) if ids else queryset.none()
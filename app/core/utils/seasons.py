@@ -0,0 +1,85 @@
+"""
+Latest season of boecs, the season their brigade is taken from.
+
+It is cached on `Boec.last_season_year` and `Boec.last_season_brigade`,
+refreshed by the Season signals and the bulk loaders, and checked or
+rebuilt with `manage.py rebuild_boec_cache`.
+"""
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from core.models import Boec, Season
+from django.db.models import Max, OuterRef, Subquery
+
+
+class LastSeason(NamedTuple):
+    brigade_id: int
+    brigade_title: str
+    year: int
+
+
+def last_season(field: str, boec: str = "boec_id") -> Subquery:
+    """
+    Correlated subquery of a field of the latest season of the boec the
+    outer query refers to by `boec`, to annotate querysets with
+    """
+    seasons = Season.objects.filter(boec=OuterRef(boec)).order_by("-year", "-id")
+    return Subquery(seasons.values(field)[:1])
+
+
+def latest_seasons(boec_ids: Iterable[int]) -> Dict[int, LastSeason]:
+    """Latest season of every boec that has one, from the cache"""
+    boec_ids = list(boec_ids)
+    if not boec_ids:
+        return {}
+    boecs = Boec.objects.filter(
+        id__in=boec_ids, last_season_brigade__isnull=False
+    ).values_list(
+        "id", "last_season_brigade_id", "last_season_brigade__title", "last_season_year"
+    )
+    return {
+        boec_id: LastSeason(brigade_id, brigade_title, year)
+        for boec_id, brigade_id, brigade_title, year in boecs
+    }
+
+
+def refresh_boec_seasons(boec_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the cached latest season of the boecs (of every boec when
+    None) with a single UPDATE, returns the number of boecs updated
+    """
+    boecs = Boec.objects.all()
+    if boec_ids is not None:
+        boecs = boecs.filter(id__in=list(boec_ids))
+    return boecs.update(
+        last_season_year=last_season("year", boec="id"),
+        last_season_brigade=last_season("brigade_id", boec="id"),
+    )
+
+
+def stale_boecs() -> Iterator[Tuple[int, Optional[int], Optional[int]]]:
+    """Boecs whose cache differs from their seasons, with the right values"""
+    boecs = Boec.objects.annotate(
+        year=last_season("year", boec="id"),
+        brigade_id=last_season("brigade_id", boec="id"),
+    ).values_list(
+        "id", "last_season_year", "last_season_brigade_id", "year", "brigade_id"
+    )
+    for boec_id, cached_year, cached_brigade_id, year, brigade_id in boecs.iterator(
+        chunk_size=2000
+    ):
+        if (cached_year, cached_brigade_id) != (year, brigade_id):
+            yield boec_id, year, brigade_id
+
+
+def latest_years_by_brigade(boec_ids: Iterable[int]) -> Dict[Tuple[int, int], int]:
+    """Year of the latest season of every boec in each of their brigades"""
+    boec_ids = list(boec_ids)
+    if not boec_ids:
+        return {}
+    years = (
+        Season.objects.filter(boec_id__in=boec_ids)
+        .values("boec_id", "brigade_id")
+        .annotate(year=Max("year"))
+        .values_list("boec_id", "brigade_id", "year")
+    )
+    return {(boec_id, brigade_id): year for boec_id, brigade_id, year in years}
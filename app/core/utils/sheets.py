@@ -1,666 +1,415 @@
-import datetime
+"""
+Google Sheets reports.
+
+A report is rendered into `SheetModel`s, in-memory worksheets holding the
+values, merges, formats and validations, which `SheetsWriter` turns into
+Sheets API requests and flushes in as few `batchUpdate` calls as possible.
+"""
 import logging
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
 import pygsheets
-import pytz
-from core.models import Boec, Conference, Event, EventWorth, Season
-from pygsheets.cell import Cell
-from pygsheets.custom_types import HorizontalAlignment, VerticalAlignment
-from pygsheets.datarange import DataRange
-
-
-class ReportGenerator:
-    def __init__(self, sheet) -> None:
-        self.client = pygsheets.authorize(
-            service_file="striking-ensign-271319-aa930e7c5b50.json"
-        )
-        self.sht = self.client.open_by_key(sheet)
-
-    def enable_batch(self, status):
-        if not status:
-            self.commit()
-
-        self.client.set_batch_mode(status)
-
-    def commit(self):
-        self.client.run_batch()
-
-    def get_wks_url(self):
-        return self.wks.url
-
-    def get_sht_url(self):
-        return self.sht.url
-
-    def create_worksheet(self, title, cols=26, rows=1000):
-        wks = self.sht.add_worksheet(title, cols=cols, rows=rows)
-        self.wks = wks
-        return wks
-
-
-class EventReportGenerator(ReportGenerator):
-    columns = 4
-    zeroCell = (1, 1)
-    headeing_height = 2
-
-    last_festival = datetime.datetime(2020, 12, 10, tzinfo=pytz.UTC)
-
-    current_row = zeroCell[1]
-
-    def create(self, event):
-        self.object = event
-
-        wks = self.create_worksheet(title=str(self.object), cols=self.columns)
+from core.models import Conference, EventWorth, Participant
+from core.utils.exports import participant_rows
+from core.utils.rating import COLUMNS, rating_events, rating_rows, refresh_rating
+from django.conf import settings
+from googleapiclient.errors import HttpError
 
-        wks.adjust_column_width(1, None, 300)
-
-        self.past_header(str(event.title), self.zeroCell)
-        nextRow = self.current_row + 1
+logger = logging.getLogger(__name__)
 
-        volonteers = Boec.objects.filter(
-            event_participation__worth=1, event_participation__event=event
-        )
-        organizers = Boec.objects.filter(
-            event_participation__worth=2, event_participation__event=event
-        )
-        participants = Boec.objects.filter(
-            event_participation__worth=0, event_participation__event=event
-        )
+# 1-based (row, column), as in the Sheets UI
+Coords = Tuple[int, int]
+
+
+def color(red: float, green: float, blue: float) -> Dict[str, float]:
+    return {"red": red, "green": green, "blue": blue, "alpha": 1}
+
+
+def cell_format(
+    background: Dict[str, float],
+    font_size: Optional[int] = None,
+    bold: bool = False,
+    border: str = "SOLID",
+    horizontal: str = "CENTER",
+) -> Dict[str, Any]:
+    text_format: Dict[str, Any] = {"fontFamily": "Roboto", "bold": bold}
+    if font_size is not None:
+        text_format["fontSize"] = font_size
+    return {
+        "horizontalAlignment": horizontal,
+        "verticalAlignment": "MIDDLE",
+        "wrapStrategy": "OVERFLOW_CELL",
+        "textFormat": text_format,
+        "borders": {
+            side: {"style": border} for side in ("top", "bottom", "left", "right")
+        },
+        # borders aren't shown without a background
+        "backgroundColor": background,
+    }
+
+
+def cell_value(value: Any) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+class SheetModel:
+    """A worksheet to be added to a spreadsheet, built in memory"""
+
+    def __init__(self, title: str, rows: int, cols: int) -> None:
+        self.title = title
+        self.rows = rows
+        self.cols = cols
+        self.frozen_rows = 0
+        self.frozen_cols = 0
+        self.values: Dict[Coords, Any] = {}
+        self.merges: List[Tuple[Coords, Coords]] = []
+        self.formats: List[Tuple[Coords, Coords, Dict[str, Any]]] = []
+        self.validations: List[Tuple[Coords, Coords, Dict[str, Any]]] = []
+        self.sizes: List[Tuple[str, int, int, int]] = []
+
+    def set_values(self, start: Coords, rows: List[List[Any]]) -> None:
+        for row_index, row in enumerate(rows):
+            for col_index, value in enumerate(row):
+                self.values[start[0] + row_index, start[1] + col_index] = value
+
+    def merge(self, start: Coords, end: Coords) -> None:
+        self.merges.append((start, end))
+
+    def format(self, start: Coords, end: Coords, style: Dict[str, Any]) -> None:
+        self.formats.append((start, end, style))
+
+    def validate_boolean(self, start: Coords, end: Coords) -> None:
+        self.validations.append((start, end, {"condition": {"type": "BOOLEAN"}}))
+
+    def column_width(self, start: int, end: int, pixels: int) -> None:
+        self.sizes.append(("COLUMNS", start, end, pixels))
+
+    def row_height(self, start: int, end: int, pixels: int) -> None:
+        self.sizes.append(("ROWS", start, end, pixels))
+
+    def grid_range(self, sheet_id: int, start: Coords, end: Coords) -> Dict[str, int]:
+        return {
+            "sheetId": sheet_id,
+            "startRowIndex": start[0] - 1,
+            "endRowIndex": end[0],
+            "startColumnIndex": start[1] - 1,
+            "endColumnIndex": end[1],
+        }
 
-        info_values = [
-            [["Штаб-организатор"], [event.shtab.title if event.shtab else "Без штаба"]],
-            [["Волонтеров"], [volonteers.count()]],
-            [["Организаторов"], [organizers.count()]],
-            [["Блок"], [event.get_worth_display()]],
+    def requests(self, sheet_id: int) -> List[Dict[str, Any]]:
+        """Sheets API requests adding the worksheet with all its content"""
+        requests: List[Dict[str, Any]] = [
+            {
+                "addSheet": {
+                    "properties": {
+                        "sheetId": sheet_id,
+                        "title": self.title,
+                        "gridProperties": {
+                            "rowCount": self.rows,
+                            "columnCount": self.cols,
+                            "frozenRowCount": self.frozen_rows,
+                            "frozenColumnCount": self.frozen_cols,
+                        },
+                    }
+                }
+            }
         ]
-        self.past_info_cells(nextRow, info_values)
-        nextRow = self.current_row + 2
-
-        if len(organizers) > 0:
-            self.past_header("Организаторы", (nextRow, self.zeroCell[1]))
-            nextRow = self.current_row + 1
-            self.past_boec(nextRow, organizers, 2)
-            nextRow = self.current_row + 2
-
-        if len(volonteers) > 0:
-            self.past_header("Волонтеры", (nextRow, self.zeroCell[1]))
-            nextRow = self.current_row + 1
-            self.past_boec(nextRow, volonteers, 1)
-            nextRow = self.current_row + 2
-
-        if len(participants) > 0:
-            self.past_header("Участники", (nextRow, self.zeroCell[1]))
-            nextRow = self.current_row + 1
-            self.past_boec(nextRow, participants, 0)
-
-        self.wks.rows = self.current_row
-
-        url = self.get_wks_url()
-        return url
-
-    def check_is_accepted(self, worth, year, eventDate):
-
-        currentYear = datetime.datetime.now().year
-
-        yearKoef = (
-            2
-            if (
-                self.last_festival.date() < eventDate < datetime.date(2021, 7, 1)
-                and worth == 1
-            )
-            else 1
-        )
-        acceptedYear = currentYear - yearKoef
-
-        if worth != 0:
-            return year >= acceptedYear
-
-        return True
-
-    def past_boec(self, nextRow, queryset, worth=0):
-        params = queryset.values_list("id", "lastName", "firstName", "middleName")
-
-        data = []
-        for boec in params:
-            fullName = f"{boec[1]} {boec[2]} {boec[3]}"
-            lastSeason = Season.objects.filter(boec=boec[0]).order_by("year").first()
-            isAccepted = self.check_is_accepted(
-                worth=worth,
-                year=lastSeason.year,
-                eventDate=self.object.startDate.date(),
+        for dimension, start, end, pixels in self.sizes:
+            requests.append(
+                {
+                    "updateDimensionProperties": {
+                        "range": {
+                            "sheetId": sheet_id,
+                            "dimension": dimension,
+                            "startIndex": start - 1,
+                            "endIndex": end,
+                        },
+                        "properties": {"pixelSize": pixels},
+                        "fields": "pixelSize",
+                    }
+                }
             )
-            row = [
-                fullName,
-                lastSeason.brigade.title,
-                lastSeason.year,
-                isAccepted,
-            ]
-
-            data.append(row)
-
-        if len(data) != 0:
-            self.enable_batch(True)
-            style_cell = Cell((nextRow, self.zeroCell[1]), worksheet=self.wks)
-            self.set_info_styles(style_cell)
-
-            style_range = DataRange(
-                start=(nextRow, self.zeroCell[1]),
-                end=(nextRow + len(data) - 1, self.zeroCell[1] + self.columns - 1),
-                worksheet=self.wks,
+        for start, end, style in self.formats:
+            requests.append(
+                {
+                    "repeatCell": {
+                        "range": self.grid_range(sheet_id, start, end),
+                        "cell": {"userEnteredFormat": style},
+                        "fields": "userEnteredFormat",
+                    }
+                }
             )
-            style_range.apply_format(style_cell)
-            self.enable_batch(False)
-            self.wks.update_values_batch(
-                ranges=[
-                    (
-                        (nextRow, self.zeroCell[1]),
-                        (nextRow + len(data) - 1, self.zeroCell[1] + self.columns - 1),
-                    )
-                ],
-                values=[data],
-                majordim="ROWS",
+        for start, end in self.merges:
+            requests.append(
+                {
+                    "mergeCells": {
+                        "range": self.grid_range(sheet_id, start, end),
+                        "mergeType": "MERGE_ALL",
+                    }
+                }
             )
-            self.wks.set_data_validation(
-                start=(nextRow, self.zeroCell[1] + self.columns - 1),
-                end=(nextRow + len(data) - 1, self.zeroCell[1] + self.columns - 1),
-                condition_type="BOOLEAN",
+        for start, end, rule in self.validations:
+            requests.append(
+                {
+                    "setDataValidation": {
+                        "range": self.grid_range(sheet_id, start, end),
+                        "rule": rule,
+                    }
+                }
             )
-
-            self.current_row = style_range.end_addr[0]
-
-    def past_info_cells(self, nextRow, values):
-        style_cell = Cell((nextRow, self.zeroCell[1]), worksheet=self.wks)
-
-        self.enable_batch(True)
-
-        self.set_info_styles(style_cell)
-
-        style_range = DataRange(
-            start=(style_cell.row, style_cell.col),
-            end=(style_cell.row + len(values) - 1, style_cell.col + self.columns - 1),
-            worksheet=self.wks,
-        )
-        style_range.apply_format(style_cell)
-
-        ranges = []
-        for index, _ in enumerate(values):
-            info_cell = Cell(
-                (style_cell.row + index, style_cell.col + 1), worksheet=self.wks
+        if self.values:
+            # one block from the first to the last filled cell
+            first_row = min(row for row, _ in self.values)
+            last_row = max(row for row, _ in self.values)
+            first_col = min(col for _, col in self.values)
+            last_col = max(col for _, col in self.values)
+            requests.append(
+                {
+                    "updateCells": {
+                        "range": self.grid_range(
+                            sheet_id, (first_row, first_col), (last_row, last_col)
+                        ),
+                        "rows": [
+                            {
+                                "values": [
+                                    cell_value(self.values.get((row, col)))
+                                    for col in range(first_col, last_col + 1)
+                                ]
+                            }
+                            for row in range(first_row, last_row + 1)
+                        ],
+                        "fields": "userEnteredValue",
+                    }
+                }
             )
+        return requests
+
+
+class SheetsWriter:
+    """
+    Add worksheets to a spreadsheet with as few batchUpdate calls as the
+    request limit allows, retrying quota and server errors with backoff
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503}
+
+    def __init__(
+        self,
+        api,
+        spreadsheet_id: str,
+        max_requests: int = 1000,
+        max_retries: int = 5,
+        backoff: float = 1,
+    ) -> None:
+        # pygsheets' SheetAPIWrapper or anything with the same batch_update
+        self.api = api
+        self.spreadsheet_id = spreadsheet_id
+        self.max_requests = max_requests
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    @property
+    def url(self) -> str:
+        return f"https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}"
+
+    def sheet_url(self, sheet_id: int) -> str:
+        return f"{self.url}/edit#gid={sheet_id}"
+
+    def write(self, *sheets: SheetModel) -> List[int]:
+        """Add the worksheets, returns their ids"""
+        sheet_ids = [random.randint(1, 2**31 - 1) for _ in sheets]
+        requests = [
+            request
+            for sheet, sheet_id in zip(sheets, sheet_ids)
+            for request in sheet.requests(sheet_id)
+        ]
+        for start in range(0, len(requests), self.max_requests):
+            self.batch_update(requests[start : start + self.max_requests])
+        return sheet_ids
+
+    def batch_update(self, requests: List[Dict[str, Any]]) -> None:
+        attempt = 0
+        while True:
+            try:
+                self.api.batch_update(
+                    self.spreadsheet_id, requests, fields="spreadsheetId"
+                )
+                return
+            except HttpError as e:
+                attempt += 1
+                if (
+                    int(e.resp.status) not in self.RETRY_STATUSES
+                    or attempt > self.max_retries
+                ):
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.warning("Sheets API error %s, retry in %s s", e, delay)
+                time.sleep(delay)
 
-            value_range = DataRange(
-                start=(info_cell.row, info_cell.col),
-                end=(info_cell.row, info_cell.col + self.columns - 2),
-                worksheet=self.wks,
-            )
-            value_range.merge_cells("MERGE_ALL")
 
-            ranges.append(
-                [
-                    (style_cell.row + index, style_cell.col),
-                    (info_cell.row, info_cell.col),
-                ]
-            )
+class ReportGenerator:
+    def __init__(self, sheet, api=None) -> None:
+        if api is None:
+            client = pygsheets.authorize(service_file=settings.SHEETS_SERVICE_FILE)
+            # writes are batched here, don't let pygsheets retry on its own
+            client.sheet.check = False
+            api = client.sheet
+        self.writer = SheetsWriter(api, sheet)
 
-            self.current_row = style_cell.row + index
+    def get_sht_url(self):
+        return self.writer.url
 
-        self.enable_batch(False)
 
-        self.wks.update_values_batch(ranges=ranges, values=values, majordim="COLUMNS")
+HEADER_FORMAT = cell_format(
+    color(0.937, 0.937, 0.937), font_size=14, bold=True, border="SOLID_THICK"
+)
+INFO_FORMAT = cell_format(color(1, 1, 1))
 
-    def past_header(self, title, zeroCell):
-        self.enable_batch(True)
 
-        style_cell = Cell(zeroCell, worksheet=self.wks)
-        self.set_header_styles(style_cell)
+class EventReportGenerator(ReportGenerator):
+    columns = 4
+    heading_height = 2
 
-        drange = DataRange(
-            start=zeroCell,
-            end=(
-                zeroCell[0] + self.headeing_height - 1,
-                zeroCell[1] + self.columns - 1,
-            ),
-            worksheet=self.wks,
-        )
-        drange.merge_cells("MERGE_ALL")
-        drange.apply_format(style_cell)
-
-        self.enable_batch(False)
-
-        style_cell.value = title
-
-        self.current_row = drange.end_addr[0]
-
-    def set_header_styles(self, cell):
-        cell.set_horizontal_alignment(HorizontalAlignment.CENTER)
-        cell.set_vertical_alignment(VerticalAlignment.MIDDLE)
-        cell.wrap_strategy = "OVERFLOW_CELL"
-        cell.set_text_format("fontFamily", "Roboto")
-        cell.set_text_format("fontSize", 14)
-        cell.set_text_format("bold", True)
-        cell.borders = {
-            "top": {"style": "SOLID_THICK"},
-            "bottom": {"style": "SOLID_THICK"},
-            "left": {"style": "SOLID_THICK"},
-            "right": {"style": "SOLID_THICK"},
-        }
-        cell.color = (0.937, 0.937, 0.937, 1)
-
-    def set_info_styles(self, cell):
-        cell.set_horizontal_alignment(HorizontalAlignment.CENTER)
-        cell.set_vertical_alignment(VerticalAlignment.MIDDLE)
-        cell.wrap_strategy = "OVERFLOW_CELL"
-        cell.set_text_format("fontFamily", "Roboto")
-
-        cell.borders = {
-            "top": {"style": "SOLID"},
-            "bottom": {"style": "SOLID"},
-            "left": {"style": "SOLID"},
-            "right": {"style": "SOLID"},
-        }
-        # color is required for border
-        cell.color = (1, 1, 1, 1)
+    def create(self, event):
+        participants = self.participants(event)
+        organizers = participants[Participant.WorthEnum.ORGANIZER]
+        volonteers = participants[Participant.WorthEnum.VOLONTEER]
 
+        sheet = SheetModel(str(event), rows=1, cols=self.columns)
+        sheet.column_width(1, self.columns, 300)
 
-logger = logging.getLogger(__name__)
+        last_row = self.past_header(sheet, 1, str(event.title))
+        info_values = [
+            ["Штаб-организатор", event.shtab.title if event.shtab else "Без штаба"],
+            ["Волонтеров", len(volonteers)],
+            ["Организаторов", len(organizers)],
+            ["Блок", event.get_worth_display()],
+        ]
+        last_row = self.past_info_cells(sheet, last_row + 1, info_values)
+
+        for title, rows in [
+            ("Организаторы", organizers),
+            ("Волонтеры", volonteers),
+            ("Участники", participants[Participant.WorthEnum.DEFAULT]),
+        ]:
+            if rows:
+                last_row = self.past_header(sheet, last_row + 2, title)
+                last_row = self.past_boec(sheet, last_row + 1, rows)
+        sheet.rows = last_row
+
+        (sheet_id,) = self.writer.write(sheet)
+        return self.writer.sheet_url(sheet_id)
+
+    def participants(self, event) -> Dict[int, List[list]]:
+        """Rows of name, last season brigade and year, accepted flag by worth"""
+        rows: Dict[int, List[list]] = defaultdict(list)
+        for worth, *row in participant_rows(event):
+            rows[worth].append(row)
+        return rows
+
+    def past_boec(self, sheet: SheetModel, row: int, rows: List[list]) -> int:
+        end = (row + len(rows) - 1, self.columns)
+        sheet.format((row, 1), end, INFO_FORMAT)
+        sheet.set_values((row, 1), rows)
+        sheet.validate_boolean((row, self.columns), end)
+        return end[0]
+
+    def past_info_cells(self, sheet: SheetModel, row: int, rows: List[list]) -> int:
+        sheet.format((row, 1), (row + len(rows) - 1, self.columns), INFO_FORMAT)
+        for index, values in enumerate(rows):
+            sheet.merge((row + index, 2), (row + index, self.columns))
+        sheet.set_values((row, 1), rows)
+        return row + len(rows) - 1
+
+    def past_header(self, sheet: SheetModel, row: int, title: str) -> int:
+        end = (row + self.heading_height - 1, self.columns)
+        sheet.format((row, 1), end, HEADER_FORMAT)
+        sheet.merge((row, 1), end)
+        sheet.set_values((row, 1), [[title]])
+        return end[0]
+
+
+RATING_HEADER_FORMAT = cell_format(
+    color(0.9882352941176471, 0.8980392156862745, 0.803921568627451), font_size=12
+)
+RATING_BRIGADE_FORMAT = cell_format(
+    color(0.8509803921568627, 0.9176470588235294, 0.8274509803921569),
+    font_size=12,
+    horizontal="LEFT",
+)
+RATING_DATA_FORMAT = cell_format(color(1, 1, 1), font_size=12)
 
 
 class EventsRatingGenerator(ReportGenerator):
 
-    last_festival = datetime.datetime(2020, 12, 10, tzinfo=pytz.UTC)
-    cursor = 1
     header_height = 2
 
-    def check_is_accepted(self, worth, year, eventDate):
-
-        currentYear = datetime.datetime.now().year
-
-        yearKoef = (
-            2
-            if (
-                self.last_festival.date() < eventDate < datetime.date(2021, 7, 1)
-                and worth == 1
-            )
-            else 1
-        )
-        acceptedYear = currentYear - yearKoef
-
-        if worth != 0:
-            return year >= acceptedYear
-
-        return True
-
     def create(self):
-        self.events = Event.objects.filter(startDate__gte=self.last_festival)
+        refresh_rating()
+        events = list(rating_events().order_by("start_date", "id"))
 
         conference = Conference.objects.last()
-        self.brigades = (
+        self.brigades = list(
             conference.brigades.all()
             .order_by("area", "title")
             .values_list("id", "title")
         )
+        rows = rating_rows(events, [brigade[0] for brigade in self.brigades])
 
-        rows = len(self.brigades) + self.header_height
-
+        sheets = []
         for value, text in EventWorth.choices:
-            events_by_worth = self.events.filter(worth=value)
-
-            if events_by_worth.count() == 0:
+            events_by_worth = [event for event in events if event.worth == value]
+            if not events_by_worth:
                 continue
+            sheets.append(self.render_events(str(text), events_by_worth, rows))
+
+        self.writer.write(*sheets)
+        return self.get_sht_url()
+
+    def render_events(self, title, events, rows) -> SheetModel:
+        columns = COLUMNS[events[0].worth]
+        last_row = self.header_height + len(self.brigades)
+        last_col = 1 + len(events) * len(columns)
+
+        sheet = SheetModel(title, rows=last_row, cols=last_col)
+        sheet.frozen_rows = self.header_height
+        sheet.frozen_cols = 1
+        sheet.row_height(1, 1, 50)
+        sheet.row_height(2, self.header_height, 75)
+        sheet.column_width(1, 1, 200)
+        sheet.column_width(2, last_col, 150)
+
+        # first column
+        sheet.format((1, 1), (self.header_height, 1), RATING_HEADER_FORMAT)
+        sheet.set_values((1, 1), [["Название мероприятия"], ["Участник/статус"]])
+        if self.brigades:
+            sheet.format(
+                (self.header_height + 1, 1), (last_row, 1), RATING_BRIGADE_FORMAT
+            )
+            sheet.set_values(
+                (self.header_height + 1, 1),
+                [[brigade_title] for _, brigade_title in self.brigades],
+            )
 
-            self.cursor = 2
-
-            wks = self.create_worksheet(title=str(text), rows=rows)
-
-            wks.frozen_cols = 1
-            wks.frozen_rows = 2
-
-            self.createFirstColumn(wks=wks)
-
-            self.render_events(events=events_by_worth, worth=value, wks=wks)
-
-        url = self.get_sht_url()
-        return url
-
-    def createFirstColumn(self, wks):
-        self.enable_batch(True)
-
-        zeroCoords = (1, 1)
-        style_cell = Cell(zeroCoords, worksheet=wks)
-        self.set_header_styles(style_cell)
-
-        drange = DataRange(
-            start=zeroCoords,
-            end=(
-                zeroCoords[0] + self.header_height - 1,
-                zeroCoords[1],
-            ),
-            worksheet=self.wks,
-        )
-        drange.apply_format(style_cell)
-
-        brigade_zeroCoords = (self.header_height + 1, 1)
-        brigade_cell = Cell(brigade_zeroCoords, worksheet=wks)
-        self.set_brigade_style(brigade_cell)
-
-        drange = DataRange(
-            start=brigade_zeroCoords,
-            end=(
-                brigade_zeroCoords[0] + len(self.brigades) - 1,
-                brigade_zeroCoords[1],
-            ),
-            worksheet=self.wks,
-        )
-        drange.apply_format(brigade_cell)
-
-        wks.adjust_row_height(1, None, 50)
-        wks.adjust_row_height(2, self.header_height, 75)
-        wks.adjust_column_width(1, None, 200)
-
-        self.enable_batch(False)
-
-        values = [
-            [["Название мероприятия", "Участник/статус"]],
-        ]
-
-        brigades_titles = [brigade[1] for brigade in self.brigades]
-
-        ranges = [
-            (zeroCoords, (zeroCoords[0] + self.header_height - 1, zeroCoords[1])),
-            (
-                brigade_zeroCoords,
-                (brigade_zeroCoords[0] + len(self.brigades) - 1, brigade_zeroCoords[1]),
-            ),
-        ]
-
-        values.append([brigades_titles])
-        self.wks.update_values_batch(ranges=ranges, values=values, majordim="COLUMNS")
-
-    def set_header_styles(self, cell):
-        cell.set_horizontal_alignment(HorizontalAlignment.CENTER)
-        cell.set_vertical_alignment(VerticalAlignment.MIDDLE)
-        cell.wrap_strategy = "OVERFLOW_CELL"
-        cell.set_text_format("fontFamily", "Roboto")
-        cell.set_text_format("fontSize", 12)
-        cell.borders = {
-            "top": {"style": "SOLID"},
-            "bottom": {"style": "SOLID"},
-            "left": {"style": "SOLID"},
-            "right": {"style": "SOLID"},
-        }
-        cell.color = (0.9882352941176471, 0.8980392156862745, 0.803921568627451, 1)
-
-    def set_brigade_style(self, cell):
-        cell.set_horizontal_alignment(HorizontalAlignment.LEFT)
-        cell.set_vertical_alignment(VerticalAlignment.MIDDLE)
-        cell.wrap_strategy = "OVERFLOW_CELL"
-        cell.set_text_format("fontFamily", "Roboto")
-        cell.set_text_format("fontSize", 12)
-        cell.borders = {
-            "top": {"style": "SOLID"},
-            "bottom": {"style": "SOLID"},
-            "left": {"style": "SOLID"},
-            "right": {"style": "SOLID"},
-        }
-        cell.color = (0.8509803921568627, 0.9176470588235294, 0.8274509803921569, 1)
-
-    def set_data_style(self, cell):
-        cell.set_horizontal_alignment(HorizontalAlignment.CENTER)
-        cell.set_vertical_alignment(VerticalAlignment.MIDDLE)
-        cell.wrap_strategy = "OVERFLOW_CELL"
-        cell.set_text_format("fontFamily", "Roboto")
-        cell.set_text_format("fontSize", 12)
-        cell.borders = {
-            "top": {"style": "SOLID"},
-            "bottom": {"style": "SOLID"},
-            "left": {"style": "SOLID"},
-            "right": {"style": "SOLID"},
-        }
-        cell.color = (1, 1, 1, 1)
-
-    def get_columns(self, worth):
-
-        values = [
-            # не учитываются
-            ["", "Волонтеры", "Организаторы"],
-            # творчество
-            [
-                "[Участники (чел)]",
-                "Волонтеры",
-                "Организаторы",
-                "Подача заявки",
-                "Участие в конкурсной программе",
-                "Победа в номинации",
-            ],
-            # спорт
-            [
-                "[Участники (чел)]",
-                "Волонтеры",
-                "Организаторы",
-                "Участие в соревновании",
-                "Выход в плей-офф",
-                "Победа",
-            ],
-            # волонтерство
-            ["Участие (чел)", "Волонтеры", "Организаторы"],
-            # городские
-            ["[Участие (чел)]", "Волонтеры", "Организаторы"],
-        ]
-
-        return values[worth]
-
-    def render_events(self, events, worth, wks):
-        columns = self.get_columns(worth=worth)
-
-        # форматирование
-        self.enable_batch(True)
-
-        zeroCoords = (1, 2)
-        style_cell = Cell(zeroCoords, worksheet=wks)
-        self.set_header_styles(style_cell)
-
-        drange = DataRange(
-            start=zeroCoords,
-            end=(
-                zeroCoords[0] + self.header_height - 1,
-                zeroCoords[1] + (len(events) * len(columns)) - 1,
-            ),
-            worksheet=self.wks,
-        )
-        drange.apply_format(style_cell)
-
-        data_zeroCoords = (self.header_height + 1, 2)
-        data_cell = Cell(data_zeroCoords, worksheet=wks)
-        self.set_data_style(data_cell)
-
-        drange = DataRange(
-            start=data_zeroCoords,
-            end=(
-                data_zeroCoords[0] + len(self.brigades) - 1,
-                data_zeroCoords[1] + (len(events) * len(columns)) - 1,
-            ),
-            worksheet=self.wks,
-        )
-        drange.apply_format(data_cell)
-        wks.adjust_column_width(
-            data_zeroCoords[1],
-            data_zeroCoords[1] + (len(events) * len(columns)) - 1,
-            150,
-        )
-
-        self.enable_batch(False)
-
-        # значения
-
-        ranges = []
-        values = []
+        sheet.format((1, 2), (self.header_height, last_col), RATING_HEADER_FORMAT)
+        if self.brigades:
+            sheet.format(
+                (self.header_height + 1, 2), (last_row, last_col), RATING_DATA_FORMAT
+            )
 
-        self.enable_batch(True)
+        cursor = 2
         for event in events:
-            title_range = DataRange(
-                start=(1, self.cursor),
-                end=(1, self.cursor + len(columns) - 1),
-                worksheet=self.wks,
-            )
-            title_range.merge_cells("MERGE_ALL")
-
-            ranges.append([(1, self.cursor), (1, self.cursor + len(columns) - 1)])
-            ranges.append([(2, self.cursor), (2, self.cursor + len(columns) - 1)])
-            title_values = [""] * len(columns)
-            title_values[0] = event.title
-
-            values.append([title_values])
-            values.append([columns])
-
-            data = {}
-            event_participants = event.participant.all()
-
-            eventDate = event.startDate.date()
-
-            for participant in event_participants:
-                ### Перебираем участников/волонтеров/оргов ###
-                if brigade in participant:
-                    boec_last_season = (
-                        Season.objects.filter(
-                            boec=participant.boec, brigade=participant.brigade
-                        )
-                        .order_by("year")
-                        .first()
-                    )
-                else:
-                    boec_last_season = (
-                        Season.objects.filter(boec=participant.boec)
-                        .order_by("year")
-                        .first()
-                    )
-                # проверяем можно ли зачесть ему
-                is_accepted = self.check_is_accepted(
-                    worth=participant.worth,
-                    year=boec_last_season.year,
-                    eventDate=eventDate,
-                )
-                if not is_accepted:
-                    continue
-
-                brigade_id = boec_last_season.brigade.id
-
-                if brigade_id not in data:
-                    data[brigade_id] = [None] * len(columns)
-                # плсюуем в нужное место
-                current_value = data[brigade_id][participant.worth]
-                data[brigade_id][participant.worth] = (
-                    current_value if current_value != None else 0
-                ) + 1
-
-            # если спорт или творчество, ищем конкурсы
-            if 1 <= event.worth <= 2:
-                # убираем, где не нужно учитывать рейтинг
-                competitions = event.competitions.filter(ratingless=False)
-
-                for competition in competitions:
-                    competition_participants = (
-                        competition.competition_participation.all()
-                    )
-
-                    brigade_participant_added = []
-                    brigade_involvement_added = []
-                    for competition_participant in competition_participants:
-                        # отряды этой заявки
-                        brigades = competition_participant.brigades.all()
-
-                        # сначала добавим подачу заявок или участие
-                        if competition_participant.worth == 0:
-                            for brigade in brigades:
-                                if brigade.id not in data:
-                                    data[brigade.id] = [None] * len(columns)
-
-                                # баллы за участие в спорте суммируются, а в творческих нет
-                                if (
-                                    event.worth == 2
-                                    and brigade.id not in brigade_participant_added
-                                ):
-                                    current_value = data[brigade.id][3]
-                                    data[brigade.id][3] = (
-                                        current_value if current_value != None else 0
-                                    ) + 1
-                                    brigade_participant_added.append(brigade.id)
-                                    continue
-
-                                data[brigade.id][3] = 1
-
-                        # добавляем прошедших в плей-офф, либо участников конкурсной программы
-                        if competition_participant.worth == 1:
-                            nominations_count = (
-                                competition_participant.nomination.filter(
-                                    isRated=True
-                                ).count()
-                            )
-                            if nominations_count == 0:
-                                for brigade in brigades:
-                                    if brigade.id not in data:
-                                        data[brigade.id] = [None] * len(columns)
-
-                                    # баллы за участие в спорте суммируются, а в творческих нет
-                                    if (
-                                        event.worth == 2
-                                        and brigade.id not in brigade_involvement_added
-                                    ):
-                                        current_value = data[brigade.id][4]
-
-                                        data[brigade.id][4] = (
-                                            current_value
-                                            if current_value != None
-                                            else 0
-                                        ) + 1
-                                        brigade_involvement_added.append(brigade.id)
-                                    else:
-
-                                        data[brigade.id][4] = 1
-
-                                    # затираем этому отряду участие
-                                    if data[brigade.id][3]:
-                                        new_value = data[brigade.id][3] - 1
-                                        data[brigade.id][3] = (
-                                            new_value if new_value > 0 else 0
-                                        )
-
-                            # добавляем победы
-                            else:
-                                for brigade in brigades:
-                                    logger.error(brigade)
-                                    if brigade.id not in data:
-                                        data[brigade.id] = [None] * len(columns)
-                                    current_value = data[brigade.id][5]
-
-                                    data[brigade.id][5] = (
-                                        current_value if current_value != None else 0
-                                    ) + nominations_count
-
-                                    # затираем этому отряду плей-офф
-                                    if data[brigade.id][4]:
-                                        new_value = data[brigade.id][4] - 1
-                                        data[brigade.id][4] = (
-                                            new_value if new_value > 0 else 0
-                                        )
-
-                            continue
-
-            # формируем данные для того, чтобы отправить их
-            # извелкаем id из словаря. нужен чтобы знать строку в таблице
-            brigades_ids = [brigade[0] for brigade in self.brigades]
-
-            for key, value in data.items():
-                try:
-                    current_index = brigades_ids.index(key)
-                    values.append([value])
-
-                    row = self.header_height + current_index + 1
-                    ranges.append(
-                        [(row, self.cursor), (row, self.cursor + len(columns) - 1)]
-                    )
-                except Exception as e:
-                    logger.exception("render_events() error: ", exc_info=e)
-
-            self.cursor = self.cursor + len(columns)
-        self.enable_batch(False)
-
-        self.wks.update_values_batch(ranges=ranges, values=values, majordim="ROWS")
+            sheet.merge((1, cursor), (1, cursor + len(columns) - 1))
+            sheet.set_values((1, cursor), [[event.title], columns])
+            sheet.set_values((self.header_height + 1, cursor), rows[event.id])
+            cursor += len(columns)
+        return sheet
@@ -0,0 +1,194 @@
+"""
+Fast path for scanning tickets at the event gate.
+
+Ticket codes of an event are loaded once into an in-process index mapping
+uuid to ticket id, so a scan needs a single statement: an insert of the
+final scan, which the unique `TicketScan.final_ticket` refuses when the
+ticket already has one. Indexes are dropped after TICKET_INDEX_TTL
+seconds and when a ticket of the event changes in this process. A missing
+code reloads the index at most every TICKET_INDEX_RELOAD_INTERVAL seconds,
+so junk codes don't reload it on every scan.
+
+Offline gate devices validate codes against an exported snapshot of the
+index and upload their scans in batches later on.
+"""
+import contextlib
+import datetime
+import uuid
+from time import monotonic
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.models import Ticket, TicketScan
+from core.utils.cache import LRUCache
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
+
+# attempts to store a batch of offline scans
+SYNC_ATTEMPTS = 3
+
+# (load time, index) by event id
+ticket_indexes = LRUCache(
+    max_size=getattr(settings, "TICKET_INDEX_CACHE_SIZE", 32),
+    ttl=getattr(settings, "TICKET_INDEX_TTL", 600),
+)
+
+
+def load_index(event_id: int) -> Dict[uuid.UUID, int]:
+    index = dict(
+        Ticket.objects.filter(event_id=event_id, uuid__isnull=False).values_list(
+            "uuid", "id"
+        )
+    )
+    ticket_indexes.set(event_id, (monotonic(), index))
+    return index
+
+
+def get_index(event_id: int, codes) -> Dict[uuid.UUID, int]:
+    """
+    Index of the event, reloaded when a code is missing in case tickets were
+    issued since, but not more often than TICKET_INDEX_RELOAD_INTERVAL
+    """
+    cached = ticket_indexes.get(event_id)
+    if cached is None:
+        return load_index(event_id)
+    loaded_at, index = cached
+    interval = getattr(settings, "TICKET_INDEX_RELOAD_INTERVAL", 5)
+    if monotonic() - loaded_at >= interval and any(code not in index for code in codes):
+        return load_index(event_id)
+    return index
+
+
+def find_ticket(event_id: int, code: uuid.UUID) -> Optional[int]:
+    """Id of the event ticket with the code, None if there is no such ticket"""
+    return get_index(event_id, [code]).get(code)
+
+
+def invalidate_event(event_id: int) -> None:
+    ticket_indexes.delete(event_id)
+
+
+def scan_ticket(ticket_id: int) -> bool:
+    """
+    Record a final scan unless the ticket already has one, in a single
+    insert. Returns whether the scan was recorded.
+    """
+    # a failed insert only spoils an enclosing transaction, outside of one
+    # autocommit needs no savepoint
+    savepoint = (
+        transaction.atomic() if connection.in_atomic_block else contextlib.nullcontext()
+    )
+    try:
+        with savepoint:
+            TicketScan.objects.create(ticket_id=ticket_id, is_final=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def scanned_at(ticket_id: int) -> Optional[datetime.datetime]:
+    """Time of the final scan of the ticket"""
+    return (
+        TicketScan.objects.filter(ticket_id=ticket_id, is_final=True)
+        .annotate(time=Coalesce("scanned_at", "created_at"))
+        .order_by("time")
+        .values_list("time", flat=True)
+        .first()
+    )
+
+
+def export_version(event_id: int) -> str:
+    """Stamp changing whenever a ticket of the event is added, coded or removed"""
+    stats = Ticket.objects.filter(event_id=event_id, uuid__isnull=False).aggregate(
+        count=Count("id"), updated_at=Max("updated_at")
+    )
+    updated_at = stats["updated_at"].timestamp() if stats["updated_at"] else 0
+    return f"{stats['count']}-{updated_at:.6f}"
+
+
+def export_codes(event_id: int) -> Iterator[bytes]:
+    """Codes of the event tickets as a sorted array of 16 byte uuids"""
+    codes = (
+        Ticket.objects.filter(event_id=event_id, uuid__isnull=False)
+        .order_by("uuid")
+        .values_list("uuid", flat=True)
+    )
+    batch = []
+    for code in codes.iterator(chunk_size=2000):
+        batch.append(code.bytes)
+        if len(batch) == 2000:
+            yield b"".join(batch)
+            batch = []
+    yield b"".join(batch)
+
+
+def sync_scans(
+    event_id: int, scans: List[Tuple[uuid.UUID, datetime.datetime]]
+) -> Dict[str, object]:
+    """
+    Store scans uploaded by a gate device. The earliest scan of a ticket,
+    wherever it was made, stays final; later ones are stored as not final.
+    """
+    index = get_index(event_id, [code for code, _ in scans])
+
+    unknown = sorted({str(code) for code, _ in scans if code not in index})
+    resolved = sorted(
+        ((index[code], time) for code, time in scans if code in index),
+        key=lambda scan: scan[1],
+    )
+
+    # a scan made at another gate in the meantime breaks the unique final
+    # scan, the batch is then merged again with it
+    for attempt in range(SYNC_ATTEMPTS):
+        try:
+            accepted, duplicates = store_scans(resolved)
+            break
+        except IntegrityError:
+            if attempt == SYNC_ATTEMPTS - 1:
+                raise
+
+    return {"accepted": accepted, "duplicates": duplicates, "unknown": unknown}
+
+
+def store_scans(resolved: List[Tuple[int, datetime.datetime]]) -> Tuple[int, int]:
+    """Store scans sorted by time, returns the accepted and duplicate counts"""
+    accepted = duplicates = 0
+    with transaction.atomic():
+        finals = {
+            ticket_id: (scan_id, time)
+            for ticket_id, scan_id, time in TicketScan.objects.select_for_update()
+            .filter(
+                ticket_id__in={ticket_id for ticket_id, _ in resolved}, is_final=True
+            )
+            .annotate(time=Coalesce("scanned_at", "created_at"))
+            .values_list("ticket_id", "id", "time")
+        }
+
+        demoted = []
+        new_scans = []
+        for ticket_id, time in resolved:
+            final = finals.get(ticket_id)
+            is_final = final is None or time < final[1]
+            if is_final:
+                if final is not None and final[0] is not None:
+                    demoted.append(final[0])
+                # scans of this batch are sorted, later ones can't win
+                finals[ticket_id] = (None, time)
+                accepted += 1
+            else:
+                duplicates += 1
+            new_scans.append(
+                TicketScan(
+                    ticket_id=ticket_id,
+                    is_final=is_final,
+                    final_ticket_id=ticket_id if is_final else None,
+                    scanned_at=time,
+                )
+            )
+
+        TicketScan.objects.filter(id__in=demoted).update(
+            is_final=False, final_ticket=None
+        )
+        TicketScan.objects.bulk_create(new_scans, batch_size=1000)
+    return accepted, duplicates
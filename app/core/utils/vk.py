@@ -0,0 +1,123 @@
+"""
+Minimal VK API client for server side calls made with the service token.
+
+Requests go through a pooled `requests.Session`, are spread to stay within
+VK's requests-per-second limit, and are retried with exponential backoff
+on network failures, 5xx and non JSON answers and VK's transient errors.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Too many requests per second, flood control, internal server error
+RETRYABLE_ERRORS = {6, 9, 10}
+
+
+class VKError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(f"VK error {code}: {message}")
+        self.code = code
+
+
+class RateLimiter:
+    """Space calls shared between threads to at most `rate` per second"""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class VKClient:
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        base_url: Optional[str] = None,
+        rate: Optional[float] = None,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        timeout: float = 10,
+    ) -> None:
+        self.access_token = access_token or settings.VK_SERVICE_TOKEN
+        self.base_url = (base_url or settings.VK_API_URL).rstrip("/")
+        self.limiter = RateLimiter(rate if rate is not None else settings.VK_API_RATE)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount(self.base_url, adapter)
+
+    def call(self, method: str, **params) -> Any:
+        """Call an API method and return its response, raise VKError on failure"""
+        data = {
+            **params,
+            "access_token": self.access_token,
+            "v": settings.VK_API_VERSION,
+        }
+        error = VKError(0, "No attempts made")
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self.limiter.wait()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/{method}", data=data, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                error = VKError(0, str(e))
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                error = VKError(response.status_code, response.reason)
+                continue
+
+            try:
+                payload = response.json()
+            except ValueError:
+                # a proxy or VK itself may answer 200 with an html error page
+                error = VKError(response.status_code, "Invalid JSON response")
+                logger.warning(
+                    "%s failed on attempt %s: %s", method, attempt + 1, error
+                )
+                continue
+            if "error" not in payload:
+                return payload["response"]
+            error = VKError(
+                payload["error"].get("error_code", 0),
+                payload["error"].get("error_msg", ""),
+            )
+            if error.code not in RETRYABLE_ERRORS:
+                raise error
+            logger.warning("%s failed on attempt %s: %s", method, attempt + 1, error)
+        raise error
+
+    def is_notifications_allowed(self, user_id: int) -> bool:
+        response = self.call("apps.isNotificationsAllowed", user_id=user_id)
+        return bool(response.get("is_allowed", False))
+
+    def send_notification(
+        self, user_ids: Iterable[int], message: str
+    ) -> List[Dict[str, Any]]:
+        """Send the message to at most 100 users, returns per user statuses"""
+        return self.call(
+            "notifications.sendMessage",
+            user_ids=",".join(str(user_id) for user_id in user_ids),
+            message=message,
+        )
@@ -7,9 +7,9 @@ from core.models import (
     CompetitionParticipant,
     Event,
     EventQuota,
+    Job,
     Nomination,
     Participant,
-    Season,
     Shtab,
     Ticket,
     TicketScan,
@@ -33,22 +33,32 @@ class EventSerializer(DynamicFieldsModelSerializer):
     is_participant = serializers.SerializerMethodField("get_participant_status")
 
     def get_participant_status(self, obj):
+        # EventViewSet annotates the flag for the whole page at once
+        if hasattr(obj, "participant_status"):
+            return obj.participant_status
+
         request = self.context.get("request")
 
         if request and hasattr(request, "user"):
-            user = request.user
+            return obj.id in self.get_participant_event_ids(request.user)
+
+        return False
+
+    def get_participant_event_ids(self, user):
+        """
+        Events of the user's boec, loaded once per request for the nested
+        events of tickets, scans and quotas
+        """
+        if "participant_event_ids" not in self.context:
             try:
                 boec = Boec.objects.get(vk_id=user.vk_id)
             except (Boec.DoesNotExist):
                 msg = _("Boec not found")
                 raise serializers.ValidationError({"error": msg})
-
-            participant = Participant.objects.filter(boec=boec, event=obj.id)
-
-            if participant.count() != 0:
-                return True
-
-        return False
+            self.context["participant_event_ids"] = set(
+                Participant.objects.filter(boec=boec).values_list("event_id", flat=True)
+            )
+        return self.context["participant_event_ids"]
 
     class Meta:
         model = Event
@@ -132,16 +142,22 @@ class CompetitionSerializer(DynamicFieldsModelSerializer):
     participant_count = serializers.SerializerMethodField("get_participant_count")
 
     def get_participant_count(self, obj):
+        if hasattr(obj, "participant_count"):
+            return obj.participant_count
         return obj.competition_participation.filter(worth=0).count()
 
     involvement_count = serializers.SerializerMethodField("get_involvement_count")
 
     def get_involvement_count(self, obj):
+        if hasattr(obj, "involvement_count"):
+            return obj.involvement_count
         return obj.competition_participation.filter(worth=1).count()
 
     winner_count = serializers.SerializerMethodField("get_winner_count")
 
     def get_winner_count(self, obj):
+        if hasattr(obj, "winner_count"):
+            return obj.winner_count
         return obj.competition_participation.filter(
             worth=1, nomination__isnull=False, nomination__is_rated=True
         ).count()
@@ -149,6 +165,8 @@ class CompetitionSerializer(DynamicFieldsModelSerializer):
     notwinner_count = serializers.SerializerMethodField("get_notwinner_count")
 
     def get_notwinner_count(self, obj):
+        if hasattr(obj, "notwinner_count"):
+            return obj.notwinner_count
         return obj.competition_participation.filter(
             worth=1, nomination__isnull=False, nomination__is_rated=False
         ).count()
@@ -222,17 +240,14 @@ class CompetitionParticipantsSerializer(DynamicFieldsModelSerializer):
         if len(boec_list) > 0:
             instance.boec.set(boec_list)
             if len(brigades_list) == 0:
-                brigade_list = set()
-                for boec in boec_list:
-                    boec_last_season = (
-                        # getting the last boec's Season
-                        Season.objects.filter(boec=boec)
-                        .order_by("year")
-                        .last()
-                    )
-
-                    brigade_list.add(boec_last_season.brigade)
-                instance.brigades.set(brigade_list)
+                # brigades of the boecs' latest seasons
+                instance.brigades.set(
+                    {
+                        boec.last_season_brigade_id
+                        for boec in boec_list
+                        if boec.last_season_brigade_id is not None
+                    }
+                )
 
         return instance
 
@@ -344,6 +359,27 @@ class TicketScanSerializer(DynamicFieldsModelSerializer):
         read_only_fields = ("id",)
 
 
+class GateScanSerializer(serializers.Serializer):
+    """Serializer for ticket codes scanned at the gate"""
+
+    uuid = serializers.UUIDField()
+
+
+class GateSyncScanSerializer(serializers.Serializer):
+    """Serializer for a ticket scan made on an offline gate device"""
+
+    uuid = serializers.UUIDField()
+    scanned_at = serializers.DateTimeField()
+
+
+class GateSyncSerializer(serializers.Serializer):
+    """Serializer for a batch of offline ticket scans"""
+
+    scans = serializers.ListField(
+        child=GateSyncScanSerializer(), allow_empty=False, max_length=5000
+    )
+
+
 class EventQuotaSerializer(DynamicFieldsModelSerializer):
     """Serializer for event quotas"""
 
@@ -354,3 +390,47 @@ class EventQuotaSerializer(DynamicFieldsModelSerializer):
         model = EventQuota
         fields = ("id", "boec", "event", "count")
         read_only_fields = ("id",)
+
+
+class RatingEventSerializer(serializers.Serializer):
+    """Serializer for the points of a brigade in one event"""
+
+    event_id = serializers.IntegerField()
+    title = serializers.CharField()
+    worth = serializers.IntegerField()
+    points = serializers.IntegerField()
+    cells = serializers.ListField(child=serializers.IntegerField(allow_null=True))
+
+
+class RatingSerializer(serializers.ModelSerializer):
+    """Serializer for the rating standing of a brigade"""
+
+    points = serializers.IntegerField(read_only=True)
+    events = RatingEventSerializer(source="rating_events", many=True, read_only=True)
+
+    class Meta:
+        model = Brigade
+        fields = ("id", "title", "area", "shtab", "points", "events")
+        read_only_fields = fields
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background jobs"""
+
+    class Meta:
+        model = Job
+        fields = (
+            "id",
+            "name",
+            "kwargs",
+            "state",
+            "attempts",
+            "max_attempts",
+            "run_after",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "duration",
+            "error",
+        )
+        read_only_fields = fields
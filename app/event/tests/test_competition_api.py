@@ -0,0 +1,56 @@
+from core.models import Competition, CompetitionParticipant, Event, Nomination
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+def competitions_url(event_id):
+    return reverse("event:competitions-list", args=[event_id])
+
+
+class CompetitionCountersApiTest(TestCase):
+    """test the participant counters of the competition list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.event = Event.objects.create(title="event", start_date=timezone.now())
+
+    def create_competition(self, title):
+        competition = Competition.objects.create(event=self.event, title=title)
+        worth = CompetitionParticipant.WorthEnum
+        CompetitionParticipant.objects.create(competition=competition)
+        CompetitionParticipant.objects.create(competition=competition)
+        involved = CompetitionParticipant.objects.create(
+            competition=competition, worth=worth.INVOLVEMENT
+        )
+        winner = CompetitionParticipant.objects.create(
+            competition=competition, worth=worth.INVOLVEMENT
+        )
+        rated = Nomination.objects.create(title="rated", competition=competition)
+        unrated = Nomination.objects.create(
+            title="unrated", competition=competition, is_rated=False
+        )
+        rated.owner.add(winner)
+        unrated.owner.add(winner, involved)
+        return competition
+
+    def test_counters_annotated(self):
+        """test counters come from the list query instead of a query per row"""
+        for index in range(3):
+            self.create_competition(f"competition {index}")
+
+        with self.assertNumQueries(2):
+            res = self.client.get(competitions_url(self.event.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for item in res.data["items"]:
+            self.assertEqual(item["participant_count"], 2)
+            self.assertEqual(item["involvement_count"], 2)
+            self.assertEqual(item["winner_count"], 1)
+            self.assertEqual(item["notwinner_count"], 2)
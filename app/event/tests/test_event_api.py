@@ -1,9 +1,10 @@
 import uuid
 
-from core.models import Event
+from core.models import Area, Boec, Brigade, Event, Participant, Shtab
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 from event.serializers import EventSerializer
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -67,3 +68,122 @@ class PrivateEventApiTest(TestCase):
         res = self.client.post(EVENT_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EventParticipantStatusApiTest(TestCase):
+    """test the is_participant flag of the event list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1)
+        self.boec = Boec.objects.create(first_name="first", last_name="last", vk_id=1)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_participant_status_resolved_per_page(self):
+        """test the flag costs the same number of queries for any page size"""
+        events = [
+            Event.objects.create(title=f"event {index}", start_date=timezone.now())
+            for index in range(5)
+        ]
+        Participant.objects.create(boec=self.boec, event=events[0])
+
+        # boec lookup, count and the page itself
+        with self.assertNumQueries(3):
+            res = self.client.get(EVENT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        statuses = {item["id"]: item["is_participant"] for item in res.data["items"]}
+        self.assertTrue(statuses[events[0].id])
+        self.assertFalse(any(statuses[event.id] for event in events[1:]))
+
+
+class EventQuotaReportApiTest(TestCase):
+    """test quota violations are reported by the api"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        area = Area.objects.create(title="area", short_title="a")
+        shtab = Shtab.objects.create(title="shtab")
+        self.brigade = Brigade.objects.create(title="brigade", area=area, shtab=shtab)
+        self.event = Event.objects.create(
+            title="event",
+            start_date=timezone.now(),
+            is_ticketed=True,
+            state=Event.EventState.REGISTRATION,
+        )
+        self.event.quotas.create(brigade=self.brigade, count=1)
+        for index in range(2):
+            boec = Boec.objects.create(first_name="first", last_name=f"last {index}")
+            Participant.objects.create(
+                boec=boec, event=self.event, brigade=self.brigade, is_approved=True
+            )
+
+    def test_quota_report(self):
+        """test the report lists brigades over their quota"""
+        url = reverse("event:event-quota_report", args=[self.event.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data["is_valid"])
+        self.assertEqual(
+            res.data["violations"],
+            [
+                {
+                    "brigade_id": self.brigade.id,
+                    "brigade_title": "brigade",
+                    "allowed": 1,
+                    "approved": 2,
+                }
+            ],
+        )
+
+    def test_complete_registration_over_quota(self):
+        """test registration can't be completed while quotas are exceeded"""
+        url = reverse("event:event-detail", args=[self.event.id])
+        res = self.client.patch(
+            url, {"state": Event.EventState.REGISTRATION_COMPLETE}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["violations"]), 1)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.state, Event.EventState.REGISTRATION)
+
+
+class EventTicketsApiTest(TestCase):
+    """test ticket generation through the api"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_generate_tickets(self):
+        """test tickets are issued for approved participants"""
+        event = Event.objects.create(
+            title="event", start_date=timezone.now(), is_ticketed=True
+        )
+        for index in range(3):
+            boec = Boec.objects.create(first_name="first", last_name=f"last {index}")
+            Participant.objects.create(boec=boec, event=event, is_approved=True)
+
+        url = reverse("event:event-generate_tickets", args=[event.id])
+        res = self.client.post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created_count"], 3)
+        self.assertEqual(res.data["ticket_count"], 3)
+        self.assertIn("elapsed_ms", res.data)
+
+    def test_generate_tickets_not_ticketed(self):
+        """test tickets can't be issued for an event without tickets"""
+        event = Event.objects.create(title="event", start_date=timezone.now())
+
+        url = reverse("event:event-generate_tickets", args=[event.id])
+        res = self.client.post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
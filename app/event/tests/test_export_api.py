@@ -0,0 +1,122 @@
+import csv
+import io
+import zipfile
+
+from core.models import (
+    Area,
+    Boec,
+    Brigade,
+    BrigadeRatingCell,
+    Conference,
+    Event,
+    EventWorth,
+    Participant,
+    Season,
+    Shtab,
+)
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RATING_EXPORT_URL = reverse("event:rating-export")
+
+
+def read_csv(response):
+    content = b"".join(response.streaming_content).decode("utf-8-sig")
+    return list(csv.reader(io.StringIO(content)))
+
+
+class ExportApiTest(TestCase):
+    """test reports downloaded as files"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        area = Area.objects.create(title="area", short_title="a")
+        shtab = Shtab.objects.create(title="shtab")
+        self.brigade = Brigade.objects.create(title="Восток", area=area, shtab=shtab)
+        self.idle = Brigade.objects.create(title="Запад", area=area, shtab=shtab)
+        conference = Conference.objects.create(date=timezone.now())
+        conference.brigades.add(self.brigade, self.idle)
+
+        self.event = Event.objects.create(
+            title="sport", start_date=timezone.now(), worth=EventWorth.SPORT
+        )
+        boec = Boec.objects.create(first_name="Иван", last_name="Иванов")
+        Season.objects.create(boec=boec, brigade=self.idle, year=2015)
+        Season.objects.create(boec=boec, brigade=self.brigade, year=2016)
+        Participant.objects.create(
+            boec=boec, event=self.event, worth=Participant.WorthEnum.VOLONTEER
+        )
+        Participant.objects.create(
+            boec=Boec.objects.create(first_name="Петр", last_name="Петров"),
+            event=self.event,
+        )
+        BrigadeRatingCell.objects.create(
+            event=self.event, brigade=self.brigade, column=5, value=2
+        )
+        self.report_url = reverse("event:event-report", args=[self.event.id])
+
+    def test_event_report_csv(self):
+        """test participants are streamed with their last season"""
+        res = self.client.get(self.report_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('filename="event-', res["Content-Disposition"])
+        self.assertEqual(
+            read_csv(res)[1:],
+            [
+                ["Участник", "Петров Петр", "", "", "0"],
+                ["Волонтер", "Иванов Иван", "Восток", "2016", "0"],
+            ],
+        )
+
+    def test_event_report_xlsx(self):
+        """test the xlsx download is a workbook with the participants"""
+        res = self.client.get(self.report_url, {"file_format": "xlsx"})
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(res.streaming_content)))
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn('<t xml:space="preserve">Иванов Иван</t>', sheet)
+        self.assertIn('<c r="D3"><v>2016</v></c>', sheet)
+        self.assertIn("workbook.xml", " ".join(archive.namelist()))
+
+    def test_formulas_escaped(self):
+        """test CSV values a spreadsheet would evaluate are exported as text"""
+        Boec.objects.filter(last_name="Петров").update(last_name="=HYPERLINK(1)")
+        self.idle.title = "@SUM(A1)"
+        self.idle.save()
+
+        rows = read_csv(self.client.get(self.report_url))
+        self.assertEqual(rows[1][1], "'=HYPERLINK(1) Петр")
+        rows = read_csv(self.client.get(RATING_EXPORT_URL))
+        self.assertEqual(rows[1][0], "'@SUM(A1)")
+
+        res = self.client.get(RATING_EXPORT_URL, {"file_format": "xlsx"})
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(res.streaming_content)))
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        # inline strings are never evaluated, they are written as is
+        self.assertIn('<t xml:space="preserve">@SUM(A1)</t>', sheet)
+
+    def test_rating_export(self):
+        """test the rating matrix has a row for every conference brigade"""
+        rows = read_csv(self.client.get(RATING_EXPORT_URL))
+
+        self.assertEqual(rows[0][1], "sport: [Участники (чел)]")
+        self.assertEqual(rows[1], ["Восток", "", "", "", "", "", "2"])
+        self.assertEqual(rows[2], ["Запад"] + [""] * 6)
+
+    def test_export_validation(self):
+        """test unknown formats are rejected and exports are for staff only"""
+        res = self.client.get(self.report_url, {"file_format": "pdf"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.is_staff = False
+        self.user.save()
+        res = self.client.get(RATING_EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,210 @@
+import datetime
+import uuid
+
+from core.models import Boec, Event, Ticket, TicketScan
+from core.utils.tickets import ticket_indexes
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from reversion.models import Version
+
+
+class GateScanApiTest(TestCase):
+    """test scanning tickets at the gate"""
+
+    def setUp(self):
+        ticket_indexes.clear()
+        self.user = get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.event = Event.objects.create(
+            title="event", start_date=timezone.now(), is_ticketed=True
+        )
+        self.boec = Boec.objects.create(first_name="first", last_name="last")
+        self.ticket = Ticket.objects.create(
+            boec=self.boec, event=self.event, uuid=uuid.uuid4()
+        )
+        self.url = reverse("event:gate-scan", args=[self.event.id])
+
+    def test_scan(self):
+        """test a scan is a single insert once the event is indexed"""
+        self.client.post(self.url, {"uuid": str(uuid.uuid4())})
+
+        # savepoints aside, which the test transaction needs
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(self.url, {"uuid": str(self.ticket.uuid)})
+
+        statements = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("INSERT"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["ticket_id"], self.ticket.id)
+        self.assertTrue(TicketScan.objects.filter(ticket=self.ticket).exists())
+
+    def test_scan_creates_no_revision(self):
+        """test the scan endpoint opts out of revisions, other views don't"""
+        self.client.post(self.url, {"uuid": str(self.ticket.uuid)})
+        self.assertFalse(Version.objects.exists())
+
+        Boec.objects.create(first_name="a", last_name="b", vk_id=self.user.vk_id)
+        res = self.client.patch(
+            reverse("event:event-detail", args=[self.event.id]), {"title": "new"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(Version.objects.get_for_object(self.event).exists())
+
+    def test_scan_used_ticket(self):
+        """test the second scan of a ticket is rejected"""
+        self.client.post(self.url, {"uuid": str(self.ticket.uuid)})
+        res = self.client.post(self.url, {"uuid": str(self.ticket.uuid)})
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertIsNotNone(res.data["scanned_at"])
+        self.assertEqual(TicketScan.objects.filter(ticket=self.ticket).count(), 1)
+
+    def test_second_final_scan_refused(self):
+        """test the database keeps a single final scan per ticket"""
+        self.ticket.scan()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TicketScan.objects.create(ticket=self.ticket, is_final=True)
+
+        TicketScan.objects.create(ticket=self.ticket, is_final=False)
+        self.assertEqual(self.ticket.ticket_scans.filter(is_final=True).count(), 1)
+
+    def test_scan_unknown_ticket(self):
+        """test codes of other events aren't accepted"""
+        other = Event.objects.create(title="other", start_date=timezone.now())
+        ticket = Ticket.objects.create(boec=self.boec, event=other, uuid=uuid.uuid4())
+
+        res = self.client.post(self.url, {"uuid": str(ticket.uuid)})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_scan_junk_codes(self):
+        """test unknown codes don't reload the index on every scan"""
+        self.client.post(self.url, {"uuid": str(uuid.uuid4())})
+
+        with self.assertNumQueries(0):
+            res = self.client.post(self.url, {"uuid": str(uuid.uuid4())})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(TICKET_INDEX_RELOAD_INTERVAL=0)
+    def test_scan_ticket_issued_later(self):
+        """test tickets issued after the index was loaded are found"""
+        self.client.post(self.url, {"uuid": str(self.ticket.uuid)})
+        boec = Boec.objects.create(first_name="first", last_name="other")
+        self.event.tickets.bulk_create(
+            [Ticket(boec=boec, event=self.event, uuid=uuid.uuid4())]
+        )
+        code = Ticket.objects.get(boec=boec).uuid
+
+        res = self.client.post(self.url, {"uuid": str(code)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_scan_invalid_code(self):
+        """test malformed codes are rejected"""
+        res = self.client.post(self.url, {"uuid": "not a code"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GateOfflineApiTest(TestCase):
+    """test code export and scan upload for offline gate devices"""
+
+    def setUp(self):
+        ticket_indexes.clear()
+        self.user = get_user_model().objects.create_user(vk_id=1, is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.event = Event.objects.create(
+            title="event", start_date=timezone.now(), is_ticketed=True
+        )
+        self.tickets = [
+            Ticket.objects.create(
+                boec=Boec.objects.create(first_name="first", last_name=f"{index}"),
+                event=self.event,
+                uuid=uuid.uuid4(),
+            )
+            for index in range(3)
+        ]
+
+    def test_export(self):
+        """test codes are exported sorted and versioned"""
+        url = reverse("event:gate-export", args=[self.event.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            b"".join(res.streaming_content),
+            b"".join(sorted(ticket.uuid.bytes for ticket in self.tickets)),
+        )
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        version = res["ETag"]
+        self.tickets[0].generate_uuid()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=version)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], version)
+
+    def test_sync(self):
+        """test the earliest scan of a ticket stays final"""
+        now = timezone.now()
+        online = self.tickets[0].ticket_scans.create(
+            scanned_at=now - datetime.timedelta(minutes=5)
+        )
+        early = now - datetime.timedelta(minutes=10)
+        scans = [
+            {"uuid": str(self.tickets[0].uuid), "scanned_at": early.isoformat()},
+            {"uuid": str(self.tickets[1].uuid), "scanned_at": now.isoformat()},
+            {"uuid": str(self.tickets[1].uuid), "scanned_at": early.isoformat()},
+            {"uuid": str(uuid.uuid4()), "scanned_at": now.isoformat()},
+        ]
+
+        url = reverse("event:gate-sync", args=[self.event.id])
+        res = self.client.post(url, {"scans": scans}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["accepted"], 2)
+        self.assertEqual(res.data["duplicates"], 1)
+        self.assertEqual(res.data["unknown"], [scans[3]["uuid"]])
+
+        online.refresh_from_db()
+        self.assertFalse(online.is_final)
+        for ticket in self.tickets[:2]:
+            final = ticket.ticket_scans.get(is_final=True)
+            self.assertEqual(final.scanned_at, early)
+        self.assertEqual(self.tickets[1].ticket_scans.count(), 2)
+
+    def test_sync_later_than_online_scan(self):
+        """test an offline scan made after an online one isn't final"""
+        self.tickets[0].ticket_scans.create(scanned_at=timezone.now())
+        scans = [
+            {
+                "uuid": str(self.tickets[0].uuid),
+                "scanned_at": (
+                    timezone.now() + datetime.timedelta(minutes=1)
+                ).isoformat(),
+            }
+        ]
+
+        url = reverse("event:gate-sync", args=[self.event.id])
+        res = self.client.post(url, {"scans": scans}, format="json")
+
+        self.assertEqual(res.data["duplicates"], 1)
+        self.assertEqual(self.tickets[0].ticket_scans.filter(is_final=True).count(), 1)
@@ -0,0 +1,110 @@
+from core.models import (
+    Area,
+    Brigade,
+    BrigadeRatingCell,
+    Conference,
+    Event,
+    EventWorth,
+    Shtab,
+)
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RATING_URL = reverse("event:rating-list")
+
+
+class RatingApiTest(TestCase):
+    """test the brigade rating standings"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(vk_id=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.area = Area.objects.create(title="area", short_title="a")
+        other_area = Area.objects.create(title="other", short_title="o")
+        shtab = Shtab.objects.create(title="shtab")
+        self.first = Brigade.objects.create(title="first", area=self.area, shtab=shtab)
+        self.second = Brigade.objects.create(
+            title="second", area=other_area, shtab=shtab
+        )
+        outsider = Brigade.objects.create(title="outsider", area=self.area, shtab=shtab)
+        self.conference = Conference.objects.create(date=timezone.now())
+        self.conference.brigades.add(self.first, self.second)
+
+        sport = Event.objects.create(
+            title="sport", start_date=timezone.now(), worth=EventWorth.SPORT
+        )
+        art = Event.objects.create(
+            title="art", start_date=timezone.now(), worth=EventWorth.ART
+        )
+        for event, brigade, column, value in [
+            (sport, self.first, 3, 2),
+            (sport, self.first, 5, 1),
+            (art, self.second, 4, 1),
+            (sport, outsider, 5, 10),
+        ]:
+            BrigadeRatingCell.objects.create(
+                event=event, brigade=brigade, column=column, value=value
+            )
+
+    def test_rating(self):
+        """test brigades of the conference are ordered by their points"""
+        res = self.client.get(RATING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 2)
+        first, second = res.data["items"]
+        self.assertEqual((first["id"], first["points"]), (self.first.id, 3))
+        self.assertEqual((second["id"], second["points"]), (self.second.id, 1))
+        self.assertEqual(first["events"][0]["cells"], [None, None, None, 2, None, 1])
+
+    def test_rating_filters(self):
+        """test the rating is filtered by worth and area"""
+        res = self.client.get(RATING_URL, {"worth": EventWorth.ART})
+        self.assertEqual(res.data["items"][0]["id"], self.second.id)
+        self.assertEqual(res.data["items"][1]["events"], [])
+
+        res = self.client.get(RATING_URL, {"area": self.area.id})
+        self.assertEqual([item["id"] for item in res.data["items"]], [self.first.id])
+
+        res = self.client.get(RATING_URL, {"worth": "sport"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rating_not_modified(self):
+        """test unchanged standings answer 304 until a cell changes"""
+        res = self.client.get(RATING_URL)
+        etag = res["ETag"]
+        self.assertNotIn("Last-Modified", res)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RATING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        BrigadeRatingCell.objects.filter(brigade=self.second).delete()
+        res = self.client.get(RATING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_rating_versioned_by_brigades(self):
+        """test conference and brigade changes change the ETag"""
+        etag = self.client.get(RATING_URL)["ETag"]
+
+        self.conference.brigades.remove(self.second)
+        res = self.client.get(RATING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 1)
+
+        etag = res["ETag"]
+        self.first.title = "renamed"
+        self.first.save()
+        res = self.client.get(RATING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res["ETag"]
+        Conference.objects.create(date=timezone.now()).brigades.add(self.first)
+        res = self.client.get(RATING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -17,6 +17,8 @@ event_router.register(
     r"competitions", views.EventCompetitionListCreate, basename="competitions"
 )
 
+event_router.register(r"gate", views.GateViewSet, basename="gate")
+
 
 router.register(
     r"competition", views.EventCompetitionRetrieveUpdateDestroy, basename="competition"
@@ -41,6 +43,10 @@ router.register(r"scans", views.TicketScanViewSet, basename="scans")
 
 router.register(r"quotas", views.EventQuotaViewSet, basename="quotas")
 
+router.register(r"rating", views.RatingViewSet, basename="rating")
+
+router.register(r"jobs", views.JobViewSet, basename="jobs")
+
 app_name = "event"
 
 urlpatterns = [
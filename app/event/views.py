@@ -1,34 +1,56 @@
+import hashlib
 import logging
-from threading import Thread
+import time
 
+from core import tasks
 from core.authentication import VKAuthentication
+from core.mixins import QueryPlanMixin
 from core.models import (
     Activity,
+    Boec,
+    Brigade,
     Competition,
     CompetitionParticipant,
+    Conference,
     Event,
     EventQuota,
+    EventWorth,
+    Job,
     Nomination,
     Participant,
-    Season,
     Ticket,
     TicketScan,
     UsedTicketScanException,
     Warning,
 )
-from core.utils.sheets import EventReportGenerator, EventsRatingGenerator
+from core.pagination import KeysetPagination
+from core.utils import exports, rating, tickets
 from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from event import serializers
-from rest_framework import filters, mixins, viewsets
+from rest_framework import exceptions, filters, mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from reversion.views import RevisionMixin
-from so.views import refresh_boec_achievements
 
 logger = logging.getLogger(__name__)
 
 
+def get_file_format(request) -> str:
+    file_format = request.query_params.get("file_format", "csv")
+    if file_format not in exports.FILE_FORMATS:
+        raise exceptions.ValidationError(
+            {"file_format": f"Expected one of {', '.join(exports.FILE_FORMATS)}"}
+        )
+    return file_format
+
+
 class CreateListAndDestroyViewSet(
     mixins.CreateModelMixin,
     mixins.DestroyModelMixin,
@@ -39,6 +61,7 @@ class CreateListAndDestroyViewSet(
 
 
 class EventViewSet(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -67,27 +90,43 @@ class EventViewSet(
         if visibility == "true":
             queryset = queryset.filter(visibility=True)
 
-        return queryset
-
-    def iterate_over_boecs(self, event: Event):
-        for boec in event.event_participation.all():
-            refresh_boec_achievements(boec=boec)
-
-        competitions_participants = CompetitionParticipant.objects.filter(
-            competition__event=event, competition__ratingless=False
+        # resolve the caller's boec once instead of once per serialized event
+        boec_id = (
+            Boec.objects.filter(vk_id=self.request.user.vk_id)
+            .values_list("id", flat=True)
+            .first()
         )
-        for item in competitions_participants.all():
-            for boec in item.boec.all():
-                refresh_boec_achievements(boec=boec)
+        if boec_id is not None:
+            queryset = queryset.annotate(
+                participant_status=Exists(
+                    Participant.objects.filter(boec_id=boec_id, event=OuterRef("pk"))
+                )
+            )
+
+        return queryset
 
     def perform_update(self, serializer):
         event = self.get_object()
         state = serializer.validated_data.get("state", None)
 
-        if state == Event.EventState.PASSED:
-            Thread(target=self.iterate_over_boecs, args=(event,)).start()
+        if (
+            state == Event.EventState.REGISTRATION_COMPLETE
+            and event.state != state
+            and event.is_ticketed
+        ):
+            violations = event.quota_violations()
+            if violations:
+                raise exceptions.ValidationError(
+                    {
+                        "error": "Approved participants exceed brigade quotas",
+                        "violations": violations,
+                    }
+                )
+
+        super().perform_update(serializer)
 
-        return super().perform_update(serializer)
+        if state == Event.EventState.PASSED:
+            tasks.refresh_event_achievements.delay(event_id=event.id)
 
     @action(
         methods=["post"],
@@ -99,10 +138,25 @@ class EventViewSet(
     )
     def generate_report(self, request, pk):
         event = Event.objects.get(id=pk)
-        reporter = EventReportGenerator("1s_NVTmYxG5GloDaOOw4d7eh7P_zAcobTmIRseYHsg3g")
-        Thread(target=reporter.create, args=[event]).start()
+        job = tasks.event_report.delay(event_id=event.id)
 
-        return Response({})
+        return Response({"job_id": job.id})
+
+    @generate_report.mapping.get
+    def export_report(self, request, pk):
+        """
+        Participants of the event as a CSV or XLSX file, `file_format` picks
+        which
+        """
+        file_format = get_file_format(request)
+        event = get_object_or_404(Event, id=pk)
+
+        return exports.streaming_export(
+            exports.participant_report(event),
+            f"event-{event.id}",
+            file_format,
+            title=event.title,
+        )
 
     @action(
         methods=["post"],
@@ -117,16 +171,33 @@ class EventViewSet(
         Generate tickets for all approved requests
         """
         event = Event.objects.get(id=pk)
-        if not event.isTicketed:
-            raise ValueError(f"Event {event} is not ticketed")
+        if not event.is_ticketed:
+            raise exceptions.ValidationError(
+                {"error": f"Event {event} is not ticketed"}
+            )
 
-        if event.tickets.count() == 0:
-            raise ValueError(f"Event {event} has no tickets")
+        started = time.perf_counter()
+        counts = event.issue_tickets()
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
 
-        for ticket in event.tickets.all():
-            ticket.generate_uuid()
+        return Response({"event_id": event.id, "elapsed_ms": elapsed_ms, **counts})
+
+    @action(
+        methods=["get"],
+        detail=True,
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        url_path="quota_report",
+        url_name="quota_report",
+        authentication_classes=(VKAuthentication,),
+    )
+    def quota_report(self, request, pk):
+        """
+        Brigades whose approved participants exceed their quotas
+        """
+        event = self.get_object()
+        violations = event.quota_violations()
 
-        return Response({"event_id": event.id, "ticket_count": event.tickets.count()})
+        return Response({"is_valid": not violations, "violations": violations})
 
     @action(
         methods=["post"],
@@ -137,10 +208,9 @@ class EventViewSet(
         authentication_classes=(VKAuthentication,),
     )
     def generate_rating(self, request):
-        reporter = EventsRatingGenerator("1s_NVTmYxG5GloDaOOw4d7eh7P_zAcobTmIRseYHsg3g")
-        Thread(target=reporter.create).start()
+        job = tasks.events_rating.delay()
 
-        return Response({})
+        return Response({"job_id": job.id})
 
     @action(
         methods=["post"],
@@ -156,23 +226,29 @@ class EventViewSet(
         """
         event = Event.objects.get(id=pk)
 
-        total_count = self.request.query_params.get("total_count")
+        try:
+            total_count = int(self.request.query_params.get("total_count"))
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError({"error": "total_count must be a number"})
         candidates_accepted = (
             self.request.query_params.get("candidates_accepted", "false") == "true"
         )
         shtab_id = self.request.query_params.get("shtab_id", None)
         area_id = self.request.query_params.get("area_id", None)
 
-        event.distribute_quotas(
-            total_count=total_count,
-            candidates_accepted=candidates_accepted,
-            shtab_id=shtab_id,
-            area_id=area_id,
-        )
+        try:
+            event.distribute_quotas(
+                total_count=total_count,
+                candidates_accepted=candidates_accepted,
+                shtab_id=shtab_id,
+                area_id=area_id,
+            )
+        except ValueError as e:
+            raise exceptions.ValidationError({"error": str(e)})
         return Response()
 
 
-class EventParticipant(RevisionMixin, CreateListAndDestroyViewSet):
+class EventParticipant(QueryPlanMixin, RevisionMixin, CreateListAndDestroyViewSet):
     """manage participants in the database"""
 
     serializer_class = serializers.ParticipantSerializer
@@ -214,13 +290,10 @@ class EventParticipant(RevisionMixin, CreateListAndDestroyViewSet):
             is_approved = True
 
         if "brigade" not in serializer.validated_data:
-            boec_last_season = (
-                Season.objects.filter(boec=serializer.validated_data["boec"])
-                .order_by("-year")
-                .first()
-            )
             serializer.save(
-                event=event, brigade=boec_last_season.brigade, is_approved=is_approved
+                event=event,
+                brigade_id=serializer.validated_data["boec"].last_season_brigade_id,
+                is_approved=is_approved,
             )
 
         else:
@@ -272,6 +345,7 @@ class EventParticipant(RevisionMixin, CreateListAndDestroyViewSet):
 
 
 class EventCompetitionListCreate(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
@@ -284,9 +358,10 @@ class EventCompetitionListCreate(
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
+        queryset = Competition.objects.with_counters()
         if "event_pk" in self.kwargs:
-            return Competition.objects.filter(event=self.kwargs["event_pk"])
-        return Competition.objects.all()
+            return queryset.filter(event=self.kwargs["event_pk"])
+        return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -304,6 +379,7 @@ class EventCompetitionListCreate(
 
 
 class EventCompetitionRetrieveUpdateDestroy(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -315,10 +391,12 @@ class EventCompetitionRetrieveUpdateDestroy(
     serializer_class = serializers.CompetitionSerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = [IsAuthenticated]
-    queryset = Competition.objects.all()
+    queryset = Competition.objects.with_counters()
 
 
-class EventCompetitionParticipants(RevisionMixin, viewsets.ModelViewSet):
+class EventCompetitionParticipants(
+    QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet
+):
     """manage event competitions in the database"""
 
     serializer_class = serializers.CompetitionParticipantsSerializer
@@ -363,7 +441,7 @@ class EventCompetitionParticipants(RevisionMixin, viewsets.ModelViewSet):
         serializer.save(competition=competition)
 
 
-class NominationView(RevisionMixin, viewsets.ModelViewSet):
+class NominationView(QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet):
     """manage event competitions in the database"""
 
     serializer_class = serializers.NominationSerializer
@@ -407,6 +485,7 @@ class NominationView(RevisionMixin, viewsets.ModelViewSet):
 
 
 class TicketViewSet(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -464,6 +543,7 @@ class TicketViewSet(
 
 
 class TicketScanViewSet(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
@@ -471,13 +551,95 @@ class TicketScanViewSet(
     serializer_class = serializers.TicketScanSerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-id",)
 
     def get_queryset(self):
         queryset = TicketScan.objects.filter(is_final=True)
         return queryset
 
 
-class EventQuotaViewSet(RevisionMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+class GateViewSet(viewsets.ViewSet):
+    """scan tickets at the event gate"""
+
+    authentication_classes = (VKAuthentication,)
+    permission_classes = (IsAuthenticated, IsAdminUser)
+    # scans are single inserts, there is nothing to keep a revision of
+    creates_revision = False
+
+    @action(methods=["post"], detail=False, url_path="scan", url_name="scan")
+    def scan(self, request, event_pk):
+        """
+        Mark the ticket with the code as used, in a single query once the
+        event tickets are indexed
+        """
+        serializer = serializers.GateScanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        ticket_id = None
+        if event_pk.isdigit():
+            ticket_id = tickets.find_ticket(
+                int(event_pk), serializer.validated_data["uuid"]
+            )
+        if ticket_id is None:
+            return Response(
+                {"error": "Ticket not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        if not tickets.scan_ticket(ticket_id):
+            return Response(
+                {
+                    "error": "Ticket already scanned",
+                    "ticket_id": ticket_id,
+                    "scanned_at": tickets.scanned_at(ticket_id),
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"ticket_id": ticket_id})
+
+    @action(methods=["get"], detail=False, url_path="export", url_name="export")
+    def export(self, request, event_pk):
+        """
+        Ticket codes of the event for offline validation: a sorted array of
+        16 byte uuids, versioned by the ETag header
+        """
+        if not event_pk.isdigit():
+            raise Http404
+        version = f'"{tickets.export_version(int(event_pk))}"'
+        if request.headers.get("If-None-Match") == version:
+            response = HttpResponseNotModified()
+        else:
+            response = StreamingHttpResponse(
+                tickets.export_codes(int(event_pk)),
+                content_type="application/octet-stream",
+            )
+        response["ETag"] = version
+        return response
+
+    @action(methods=["post"], detail=False, url_path="sync", url_name="sync")
+    def sync(self, request, event_pk):
+        """
+        Store a batch of scans made offline, the earliest scan of a ticket
+        is the final one
+        """
+        serializer = serializers.GateSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not event_pk.isdigit():
+            raise Http404
+
+        result = tickets.sync_scans(
+            int(event_pk),
+            [
+                (scan["uuid"], scan["scanned_at"])
+                for scan in serializer.validated_data["scans"]
+            ],
+        )
+        return Response(result)
+
+
+class EventQuotaViewSet(
+    QueryPlanMixin, RevisionMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     serializer_class = serializers.EventQuotaSerializer
 
     authentication_classes = (VKAuthentication,)
@@ -486,3 +648,154 @@ class EventQuotaViewSet(RevisionMixin, mixins.ListModelMixin, viewsets.GenericVi
     def get_queryset(self):
         queryset = EventQuota.objects.all()
         return queryset
+
+
+class RatingViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """festival rating standings of the conference brigades"""
+
+    serializer_class = serializers.RatingSerializer
+    authentication_classes = (VKAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get_param(self, name):
+        value = self.request.query_params.get(name, None)
+        if value is not None and not value.isdigit():
+            raise exceptions.ValidationError({name: "A number is required"})
+        return None if value is None else int(value)
+
+    def get_worth(self):
+        worth = self.get_param("worth")
+        if worth is not None and worth not in EventWorth.values:
+            raise exceptions.ValidationError({"worth": "Unknown worth"})
+        return worth
+
+    def get_conference_id(self):
+        """Id of the requested conference or of the last one, None without any"""
+        if not hasattr(self, "conference_id"):
+            conference_id = self.get_param("conference")
+            if conference_id is not None:
+                get_object_or_404(Conference.objects.only("id"), id=conference_id)
+            else:
+                conference_id = (
+                    Conference.objects.order_by("id")
+                    .values_list("id", flat=True)
+                    .last()
+                )
+            self.conference_id = conference_id
+        return self.conference_id
+
+    def get_brigades(self):
+        """Brigades of the requested conference or of the last one"""
+        conference_id = self.get_conference_id()
+        if conference_id is None:
+            return Brigade.objects.none()
+        return Brigade.objects.filter(conference=conference_id)
+
+    def get_queryset(self):
+        queryset = self.get_brigades()
+
+        worth = self.get_worth()
+        queryset = queryset.annotate(
+            points=Coalesce(
+                Sum(
+                    "rating_cells__value",
+                    filter=None
+                    if worth is None
+                    else Q(rating_cells__event__worth=worth),
+                ),
+                0,
+            )
+        )
+
+        area = self.get_param("area")
+        if area is not None:
+            queryset = queryset.filter(area_id=area)
+
+        shtab = self.get_param("shtab")
+        if shtab is not None:
+            queryset = queryset.filter(shtab_id=shtab)
+        return queryset.order_by("-points", "title", "id")
+
+    @action(
+        methods=["get"],
+        detail=False,
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        url_path="export",
+        url_name="export",
+    )
+    def export(self, request):
+        """The rating matrix as a CSV or XLSX file, `file_format` picks which"""
+        file_format = get_file_format(request)
+        brigades = self.get_brigades()
+
+        area = self.get_param("area")
+        if area is not None:
+            brigades = brigades.filter(area_id=area)
+        shtab = self.get_param("shtab")
+        if shtab is not None:
+            brigades = brigades.filter(shtab_id=shtab)
+
+        return exports.streaming_export(
+            exports.rating_report(brigades, self.get_worth()),
+            "rating",
+            file_format,
+            title="Рейтинг",
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Brigades by their points, with the points of every event. Versioned
+        by the stored rating cells and the conference brigades, so unchanged
+        standings answer 304. There is no Last-Modified: the latest change of
+        the cells can't tell when cells were deleted, the ETag counts them.
+        """
+        brigades = list(
+            self.get_brigades().order_by("id").values_list("id", "updated_at")
+        )
+        count, updated_at = rating.rating_version()
+        etag = quote_etag(
+            hashlib.md5(
+                f"{self.get_conference_id()}|{brigades}|{count}|{updated_at}|"
+                f"{request.get_full_path()}".encode()
+            ).hexdigest()
+        )
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        events = rating.brigade_events(
+            [brigade.id for brigade in page], self.get_worth()
+        )
+        for brigade in page:
+            brigade.rating_events = events[brigade.id]
+        response = self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+        response["ETag"] = etag
+        return response
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """inspect background jobs"""
+
+    serializer_class = serializers.JobSerializer
+    authentication_classes = (VKAuthentication,)
+    permission_classes = (IsAuthenticated, IsAdminUser)
+
+    def get_queryset(self):
+        queryset = Job.objects.order_by("-created_at")
+
+        state = self.request.query_params.get("state", None)
+        if state is not None:
+            if state not in map(str, Job.JobState.values):
+                raise exceptions.ValidationError(
+                    {"state": f"Expected one of {Job.JobState.values}"}
+                )
+            queryset = queryset.filter(state=state)
+
+        name = self.request.query_params.get("name", None)
+        if name is not None:
+            queryset = queryset.filter(name=name)
+        return queryset
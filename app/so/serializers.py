@@ -125,6 +125,8 @@ class BrigadeSerializer(DynamicFieldsModelSerializer):
         model = Brigade
         fields = ("id", "title", "shtab", "area", "date_of_birth", "state")
         read_only_fields = ("id",)
+        # the title is built by Brigade.__str__
+        prefetch = {"title": ("area",)}
 
 
 class PositionSerializer(serializers.ModelSerializer):
@@ -3,9 +3,9 @@ import os
 import re
 
 from core.authentication import VKAuthentication
+from core.mixins import QueryPlanMixin
 from core.models import (
     Achievement,
-    Activity,
     Area,
     Boec,
     Brigade,
@@ -16,6 +16,9 @@ from core.models import (
     Season,
     Shtab,
 )
+from core.pagination import KeysetPagination
+from core.utils.achievements import collect_progress
+from core.utils.search import search_queryset
 from django.core.exceptions import FieldDoesNotExist
 from django.utils.translation import ugettext_lazy as _
 from event.serializers import ParticipantHistorySerializer, ParticipantSerializer
@@ -31,7 +34,7 @@ from user.serializers import ActivitySerializer
 logger = logging.getLogger(__name__)
 
 
-class ShtabViewSet(RevisionMixin, viewsets.ModelViewSet):
+class ShtabViewSet(QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet):
     """manage shtabs in the database"""
 
     serializer_class = serializers.ShtabSerializer
@@ -75,14 +78,20 @@ class BoecTelegramView(RevisionMixin, viewsets.ViewSet):
             raise ValidationError({"error": msg}, code="validation")
 
 
-class BoecViewSet(RevisionMixin, viewsets.ModelViewSet):
+class BoecViewSet(QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet):
     """manage boecs in the database"""
 
     queryset = Boec.objects.all()
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
-    filter_backends = [filters.SearchFilter]
-    search_fields = ("^last_name", "first_name", "middle_name")
+    pagination_class = KeysetPagination
+
+    @property
+    def keyset_ordering(self):
+        # ranked search results keep their order and fit a page or two
+        if self.request.query_params.get("search", "").strip():
+            return None
+        return ("last_name", "id")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -96,6 +105,11 @@ class BoecViewSet(RevisionMixin, viewsets.ModelViewSet):
         brigade_id = self.request.query_params.get("brigade_id", None)
         if brigade_id is not None:
             queryset = queryset.filter(brigades=brigade_id)
+
+        # the best matches of the name index, ranked
+        search = self.request.query_params.get("search", "")
+        if self.action == "list" and search.strip():
+            queryset = search_queryset(queryset, search)
         return queryset
 
     def perform_create(self, serializer):
@@ -112,7 +126,7 @@ class BoecViewSet(RevisionMixin, viewsets.ModelViewSet):
     #     return Response(serializer.data)
 
 
-class BoecPositions(RevisionMixin, viewsets.ReadOnlyModelViewSet):
+class BoecPositions(QueryPlanMixin, RevisionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = serializers.PositionSerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -122,7 +136,7 @@ class BoecPositions(RevisionMixin, viewsets.ReadOnlyModelViewSet):
         return Position.objects.filter(boec=self.kwargs["boec_pk"])
 
 
-class BoecSeasons(RevisionMixin, viewsets.ReadOnlyModelViewSet):
+class BoecSeasons(QueryPlanMixin, RevisionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = serializers.SeasonSerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -160,59 +174,23 @@ class BoecParticipantHistory(RevisionMixin, viewsets.GenericViewSet):
         )
 
 
-def generate_boec_progress(boec: Boec):
-    event_participant = boec.event_participation.filter(
-        is_approved=True, event__status=1
-    )
-    participation_default = event_participant.filter(worth=0).count()
-    participation_volonteer = event_participant.filter(worth=1).count()
-    participation_organizer = event_participant.filter(worth=2).count()
-
-    competition_participant = boec.competition_participation.filter(
-        competition__ratingless=False
-    )
-
-    # просто подача заявок вместе с победами
-    competition_default = competition_participant.count()
-    competition_playoff = competition_participant.filter(worth=1).count()
-
-    with_nomination = competition_participant.filter(worth=1, nomination__isnull=False)
+# keys of the progress endpoint response by achievement type
+PROGRESS_FIELDS = {
+    "participationCount": Achievement.ActivityEnum.PARTICIPATION_DEFAULT,
+    "volonteerCount": Achievement.ActivityEnum.PARTICIPATION_VOLONTEER,
+    "organizerCount": Achievement.ActivityEnum.PARTICIPATION_ORGANIZER,
+    "competitionDefault": Achievement.ActivityEnum.COMPETITION_DEFAULT,
+    "competitionPlayoff": Achievement.ActivityEnum.COMPETITION_PLAYOFF,
+    "nominations": Achievement.ActivityEnum.NOMINATIONS,
+    "seasons": Achievement.ActivityEnum.SEASONS,
+    "sportWins": Achievement.ActivityEnum.SPORT_WINS,
+    "artWins": Achievement.ActivityEnum.ART_WINS,
+}
 
-    nominations_count = with_nomination.count()
 
-    sport_wins = with_nomination.filter(competition__event__worth=2).count()
-    art_wins = with_nomination.filter(competition__event__worth=1).count()
-
-    seasons = boec.seasons.filter(is_candidate=False, is_accepted=True).count()
-
-    return {
-        "participationCount": participation_default,
-        "volonteerCount": participation_volonteer,
-        "organizerCount": participation_organizer,
-        "competitionDefault": competition_default,
-        "competitionPlayoff": competition_playoff,
-        "nominations": nominations_count,
-        "seasons": seasons,
-        "sportWins": sport_wins,
-        "artWins": art_wins,
-    }
-
-
-def refresh_boec_achievements(boec: Boec):
-    progress = generate_boec_progress(boec)
-    achievements = Achievement.objects.all()
-
-    for ach in achievements:
-        user_progress = progress.get(ach.type, 0)
-
-        # если достижение еще не выдано юзеру, то выдаем и генерим уведомление
-        # и обновляем счетчик
-        if user_progress >= ach.goal and not ach.boec.filter(id=boec.id).exists():
-            ach.boec.add(boec)
-            Activity.objects.create(type=2, boec=boec, achievement=ach)
-            boec.unread_activity_count += 1
-
-    boec.save()
+def generate_boec_progress(boec: Boec):
+    progress = collect_progress([boec.id])[boec.id]
+    return {field: progress[kind] for field, kind in PROGRESS_FIELDS.items()}
 
 
 class BoecProgress(RevisionMixin, viewsets.ViewSet):
@@ -236,7 +214,7 @@ class BoecProgress(RevisionMixin, viewsets.ViewSet):
         return Response(progress)
 
 
-class BrigadeViewSet(RevisionMixin, viewsets.ModelViewSet):
+class BrigadeViewSet(QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet):
     """manage brigades in the database"""
 
     queryset = Brigade.objects.all()
@@ -258,6 +236,7 @@ class BrigadeViewSet(RevisionMixin, viewsets.ModelViewSet):
 
 
 class SubjectPositions(
+    QueryPlanMixin,
     RevisionMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
@@ -308,7 +287,7 @@ class SubjectPositions(
             )
 
 
-class BrigadeSeasons(RevisionMixin, viewsets.ReadOnlyModelViewSet):
+class BrigadeSeasons(QueryPlanMixin, RevisionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = serializers.SeasonSerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
@@ -321,20 +300,23 @@ class BrigadeSeasons(RevisionMixin, viewsets.ReadOnlyModelViewSet):
         )
 
 
-class SeasonViewSet(RevisionMixin, viewsets.ModelViewSet):
+class SeasonViewSet(QueryPlanMixin, RevisionMixin, viewsets.ModelViewSet):
     """manage seasons in the database"""
 
     serializer_class = serializers.SeasonSerializer
     queryset = Season.objects.all()
     authentication_classes = (VKAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-year", "id")
 
     def get_queryset(self):
         """Return objects"""
-        return self.queryset.order_by("-year")
+        # the order of the keyset pages, which the ("-year", "id") index serves
+        return self.queryset.order_by(*self.keyset_ordering)
 
 
-class ConferenceViewSet(RevisionMixin, viewsets.ReadOnlyModelViewSet):
+class ConferenceViewSet(QueryPlanMixin, RevisionMixin, viewsets.ReadOnlyModelViewSet):
     """manage conferences in the database"""
 
     queryset = Conference.objects.all()
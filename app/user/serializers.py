@@ -130,33 +130,42 @@ class AchievementSerializer(DynamicFieldsModelSerializer):
 
     achieved_at = serializers.SerializerMethodField("check_status")
 
+    def get_boec(self, request) -> Boec:
+        boec_id = request.query_params.get("boec_id", None)
+        if boec_id is None:
+            return Boec.objects.get(vk_id=request.user.vk_id)
+        try:
+            return Boec.objects.get(id=boec_id)
+        except (Boec.DoesNotExist):
+            msg = _("Boec not found")
+            raise serializers.ValidationError({"error": msg})
+
+    def get_achieved(self, request):
+        """
+        Achievements of the requested boec and when they were got, loaded
+        once per request rather than per row
+        """
+        if "achieved" not in self.context:
+            boec = self.get_boec(request)
+            achieved = set(boec.achievements.values_list("id", flat=True))
+            achieved_at = dict(
+                Activity.objects.filter(boec=boec, achievement_id__in=achieved)
+                .order_by("-created_at")
+                .values_list("achievement_id", "created_at")
+            )
+            self.context["achieved"] = (achieved, achieved_at)
+        return self.context["achieved"]
+
     def check_status(self, obj):
         request = self.context.get("request")
         if request:
-            boec_id = self.context["request"].query_params.get("boec_id", None)
-
-            if boec_id == None:
-                user = request.user
-                boec: Boec = Boec.objects.get(vk_id=user.vk_id)
-            else:
-                try:
-                    boec: Boec = Boec.objects.get(id=boec_id)
-                except (Boec.DoesNotExist):
-                    msg = _("Boec not found")
-                    raise serializers.ValidationError({"error": msg})
-
-            is_achieved = obj.boec.filter(id=boec.id).exists()
-            if not is_achieved:
+            achieved, achieved_at = self.get_achieved(request)
+            if obj.id not in achieved:
                 return None
-
-            try:
-                activity = Activity.objects.get(boec=boec, achievement=obj)
-
-            except (Activity.DoesNotExist):
+            if obj.id not in achieved_at:
                 msg = _("Activity not found")
                 raise serializers.ValidationError({"error": msg})
-
-            return activity.created_at
+            return achieved_at[obj.id]
 
         return None
 
@@ -1,5 +1,7 @@
 from core.authentication import VKAuthentication
+from core.mixins import QueryPlanMixin
 from core.models import Achievement, Activity, Boec
+from core.pagination import KeysetPagination
 from django.db.models import Count
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import generics, permissions, viewsets
@@ -36,21 +38,27 @@ class ManageUserView(generics.RetrieveAPIView):
         return self.request.user
 
 
-class ActivityView(RevisionMixin, viewsets.GenericViewSet):
+class ActivityView(QueryPlanMixin, RevisionMixin, viewsets.GenericViewSet):
     """manage the activities"""
 
     serializer_class = ActivitySerializer
     authentication_classes = (VKAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
     queryset = Activity.objects.all()
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-created_at", "-id")
 
     def retrieve(self, request, pk=None):
         try:
             boec = Boec.objects.get(vk_id=self.request.user.vk_id)
 
             seen = self.request.query_params.get("seen", False)
-            activities = Activity.objects.filter(boec=boec, seen=bool(seen)).order_by(
-                "-created_at"
+            # ordered like keyset pages so offset pages are served by the
+            # (boec, seen, created_at, id) index as well
+            activities = self.filter_queryset(
+                Activity.objects.filter(boec=boec, seen=bool(seen)).order_by(
+                    *self.keyset_ordering
+                )
             )
             page = self.paginate_queryset(activities)
             if page is not None: